@@ -17,5 +17,61 @@ app.config.from_object(app_settings)
 bcrypt = Bcrypt(app)
 db = SQLAlchemy(app)
 
+from main.auth.hashing import PasswordHasher
+password_hasher = PasswordHasher(
+    bcrypt,
+    app.config['BCRYPT_WORKERS'],
+    app.config['BCRYPT_MAX_PENDING']
+)
+
+from main.model.sqlite import enable_sqlite_pragmas
+enable_sqlite_pragmas(app)
+
+from main.metrics import RequestMetrics, cache_collector
+request_metrics = RequestMetrics()
+request_metrics.watch_queries()
+
+from main.catalog.catalog import FoodCatalog
+catalog = FoodCatalog(
+    app.config['CATALOG_DIR'],
+    app.config['CATALOG_FILES'],
+    app.config['CATALOG_DEFAULT'],
+    app.config['CATALOG_COMPILED_DIR']
+)
+if app.config.get('CATALOG_PRELOAD'):
+    catalog.load()
+if app.config.get('CATALOG_WATCH_INTERVAL'):
+    catalog.start_watcher(app.config['CATALOG_WATCH_INTERVAL'])
+
+from main.cache import TTLCache
+recommendation_cache = TTLCache(
+    app.config['RECOMMEND_CACHE_SIZE'],
+    app.config['RECOMMEND_CACHE_TTL']
+)
+# verified auth tokens and tokens known to be blacklisted, see User.verify_auth_token
+token_cache = TTLCache(
+    app.config['AUTH_TOKEN_CACHE_SIZE'],
+    app.config['AUTH_TOKEN_CACHE_TTL']
+)
+blacklist_cache = TTLCache(
+    app.config['AUTH_TOKEN_CACHE_SIZE'],
+    app.config['AUTH_TOKEN_MAX_AGE']
+)
+
+from main.recommend.jobs import GAJobQueue
+job_queue = GAJobQueue(
+    catalog,
+    app.config['RECOMMEND_JOB_WORKERS'],
+    app.config['RECOMMEND_JOB_MAX_PENDING'],
+    app.config['RECOMMEND_JOB_TTL'],
+    app.config['RECOMMEND_JOB_MAX_FINISHED']
+)
+
+request_metrics.add_collector(cache_collector(dict(
+    recommendation=recommendation_cache,
+    token=token_cache,
+    blacklist=blacklist_cache,
+)))
+
 from main.auth.api import auth_blueprint
 app.register_blueprint(auth_blueprint)
\ No newline at end of file
@@ -0,0 +1,130 @@
+import numpy as np
+
+## Batched fitness evaluation
+#
+# The whole population is evaluated at once: it is represented as a
+# (population x dishes) matrix of quantities and every per-cuisine sum that
+# Fitness.calcFitness accumulates dish by dish is obtained with one matrix
+# product against precomputed per-dish arrays.
+
+
+class MenuArrays:
+    """
+    Array form of menuData shared by every chromosome of a run
+
+    ids -> dish ids, index matches the position of the gene in a chromosome
+    price -> price per dish
+    rating -> rating per dish
+    cuisineIdx -> index into cuisines of the cuisine of each dish
+    cuisines -> ordered list of cuisine names
+    weights -> prebuilt weights matrix, e.g. one living in shared memory
+    ratingWeight -> weight of the mean rating of a chromosome added to
+                    its fitness; the cuisine terms only compare cuisines
+                    with each other, so with a single cuisine the ratings
+                    would not matter at all. 0 keeps Fitness.calcFitness
+    """
+
+    def __init__(self, ids, price, rating, cuisineIdx, cuisines, weights=None, ratingWeight=0.0):
+        self.ids = ids if isinstance(ids, range) else list(ids)
+        self.cuisines = list(cuisines)
+        self.ratingWeight = float(ratingWeight)
+        self.price = np.asarray(price, dtype=np.float64)
+        self.rating = np.asarray(rating, dtype=np.float64)
+        self.cuisineIdx = np.asarray(cuisineIdx, dtype=np.intp)
+        if weights is not None:
+            self.weights = weights
+            return
+
+        # (dishes x 3*cuisines) weights so that qty @ weights gives the
+        # qty, rating and cost sum of every cuisine in a single product
+        noOfCuisines = len(self.cuisines)
+        oneHot = np.zeros((len(self.ids), noOfCuisines))
+        oneHot[np.arange(len(self.ids)), self.cuisineIdx] = 1.0
+        self.weights = np.hstack((
+            oneHot,
+            oneHot*self.rating[:, None],
+            oneHot*self.price[:, None],
+        ))
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def buildMenuArrays(menuData, cuisines):
+    """
+    Precompute the arrays used by populationFitness
+
+    menuData -> object of dishes keyed by dish id, each having
+                cuisine, rating and price
+    cuisines -> list of cuisine names (genInfo["cuisines"])
+
+    returns MenuArrays with dishes in menuData iteration order, which is
+    the order createChromosome assigns genes in
+    """
+    cuisinePos = {cuisine: i for i, cuisine in enumerate(cuisines)}
+    ids = list(menuData)
+    return MenuArrays(
+        ids,
+        [menuData[dishId]["price"] for dishId in ids],
+        [menuData[dishId]["rating"] for dishId in ids],
+        [cuisinePos[menuData[dishId]["cuisine"]] for dishId in ids],
+        cuisines,
+    )
+
+
+def _share(part, total):
+    return np.divide(part, total[:, None], out=np.zeros_like(part),
+                     where=total[:, None] != 0)
+
+
+def populationFitness(qtyMatrix, cuisineScore, maxQtyToBeOrdered, menuArrays):
+    """
+    Calculate the fitness of every chromosome of a population at once,
+    giving the same values as Fitness.calcFitness plus, when
+    menuArrays.ratingWeight is set, the weighted mean rating
+
+    qtyMatrix -> (population x dishes) array of quantities
+    cuisineScore -> object consisting of score that is rated
+                    by users with key as cuisine name
+    maxQtyToBeOrdered -> chromosomes ordering more than this are penalised
+    menuArrays -> MenuArrays of the menu the chromosomes are drawn from
+
+    returns array of fitness values, one per chromosome
+    """
+    qty = np.asarray(qtyMatrix, dtype=np.float64)
+    if qty.ndim == 1:
+        qty = qty[None, :]
+    noOfCuisines = len(menuArrays.cuisines)
+
+    sums = qty @ menuArrays.weights
+    cuisineQty = sums[:, :noOfCuisines]
+    cuisineRating = sums[:, noOfCuisines:2*noOfCuisines]
+    cuisineCost = sums[:, 2*noOfCuisines:]
+    totalQty = qty.sum(axis=1)
+
+    scores = np.array([cuisineScore.get(c, 0.0) for c in menuArrays.cuisines],
+                      dtype=np.float64)
+    totCuisineScore = float(sum(cuisineScore.values()))
+    scoreFit = scores/totCuisineScore if totCuisineScore else np.zeros_like(scores)
+
+    qtyFit = 1.0/(1.0 + np.exp(-1.0*(cuisineQty - 1.0)))
+    ratingFit = _share(cuisineRating, cuisineRating.sum(axis=1))
+    costFit = _share(cuisineCost, cuisineCost.sum(axis=1))
+
+    fitness = ((-2*costFit + 3*ratingFit + 2*qtyFit)*scoreFit).sum(axis=1)
+    if menuArrays.ratingWeight:
+        meanRating = np.divide(qty @ menuArrays.rating, totalQty,
+                               out=np.zeros_like(totalQty), where=totalQty != 0)
+        fitness += menuArrays.ratingWeight*meanRating
+    fitness[totalQty == 0] = 0.0
+    return np.where(totalQty > maxQtyToBeOrdered, -fitness, fitness)
+
+
+def rankFitness(fitness):
+    """
+    returns list of (chromosome index, fitness) pairs in sorted order
+    (chromosome with max fitness at 0th index, ties keep population order)
+    """
+    fitness = np.asarray(fitness)
+    order = np.argsort(-fitness, kind="stable")
+    return [(int(i), float(fitness[i])) for i in order]
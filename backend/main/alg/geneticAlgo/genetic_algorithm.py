@@ -1,10 +1,12 @@
 import json
-import random
-from copy import deepcopy
 import numpy as np
-import pandas as pd
 import math
 import os
+
+from main.alg.geneticAlgo.fitness import (
+    MenuArrays, buildMenuArrays, populationFitness, rankFitness)
+from main.alg.geneticAlgo.selection import SELECTION_METHODS
+from main.alg.geneticAlgo.termination import StopCriteria
 # import matplotlib.pyplot as plt
 
 def setMenuData(file_name):
@@ -15,21 +17,45 @@ def setMenuData(file_name):
 with open('genInfo.json') as gen_Data:
         genInfo = json.load(gen_Data)
 
+
+def asMenuArrays(menuData):
+    """
+    returns MenuArrays for menuData, building them if menuData is
+    still the menu database
+    """
+    if isinstance(menuData, MenuArrays):
+        return menuData
+    return buildMenuArrays(menuData, genInfo["cuisines"])
+
+
+def makeRng(seed=None):
+    """
+    Random generator used by every genetic operator
+
+    seed -> None for fresh entropy, an int to replay a run, or an
+            existing numpy Generator which is returned as is
+
+    Each run owns its generator, so concurrent runs never share
+    random state
+    """
+    return np.random.default_rng(seed)
+
 ## This part creates the chromosome
 
 # NOT USING THIS FUNCTION CURRENTLY
 # This function limits to starting dishes more so I am not using it currently
-def randSeq(n, a, b, sum):
+def randSeq(n, a, b, sum, rng=None):
     """
     Generate the random sequence of quantities for the dishes
     """
+    rng = makeRng(rng)
     found = False
     while not found:
         totalNum = 0
         numSum = 0
         sequence = []
         while totalNum < n and numSum < sum:
-            r = random.randint(a,b)
+            r = int(rng.integers(a, b+1))
             numSum += r
             totalNum += 1
             sequence.append(r)
@@ -41,127 +67,112 @@ def randSeq(n, a, b, sum):
     return sequence
 
 # This function gives a more distributed result so using this currently
-def randSeq2(n, sum):
+def randSeq2(n, sum, rng=None):
     """
     Generate the random sequence of quantities for the dishes
 
     n -> total number of dishes in menu
     sum -> total number of dishes that can be ordered
+    rng -> random generator, see makeRng
 
-    returns a list containing quantity of dish to be ordered
+    returns an array containing quantity of dish to be ordered
     with each index matching the index of corresponding dish 
     in menu database
     """
-    sequence = [0]*n
-    i=0
-    while i < sum:
-        r = random.randint(1,n)
-        sequence[r-1]+=1
-        i+=1
-    return sequence
+    rng = makeRng(rng)
+    return np.bincount(rng.integers(0, n, size=sum), minlength=n)
 
 
-def createChromosome( totQty, menuData ):
+def createChromosome( totQty, menuData, rng=None ):
     """
     Creates the chromosome with Qty assigned to Each Dish such that
     sum of all Qty equals to the number of dishes to be ordered
 
     totQty = Number of Dishes to be Ordered
 
-    returns chromosome of dish id and corresponding quantity
+    returns chromosome as an int array of quantities, the gene at
+    index i being the quantity of the i-th dish of menuData
+    """
+    return randSeq2(len(menuData), totQty, rng)
+
+
+def decodeChromosome(chromosome, menuData):
     """
-    chromosome = []
-    qtySeq = randSeq2(len(menuData),totQty)
-    i=0
-    for key in menuData:
-        chromosome.append(Dish(key,qtySeq[i]))
-        i+=1
-    return chromosome
+    Converts a chromosome back to the dishes it orders
+
+    returns list of Dish for every dish with quantity > 0
+    """
+    ids = asMenuArrays(menuData).ids
+    return [Dish(ids[i], int(chromosome[i])) for i in np.flatnonzero(chromosome)]
 
 ## This part does the mutation
 
-def mutate(individual, mutationRate):
+def mutate(individual, mutationRate, rng=None):
     """
-    This function performs scramble mutation in an individual
+    This function performs scramble mutation in an individual,
+    in place
 
     individual -> chromosome 
     mutationRate -> the rate at which mutation is supposed to occur
+    rng -> random generator, see makeRng
 
     returns chromosome after mutation if mutation occurs, else returns
     original chromosome
     """
+    rng = makeRng(rng)
     chromosomeLength = len(individual)
-    k = random.random()
-    # print(k)
+    k = rng.random()
     if(k <= mutationRate):
-        startPtr = random.randint(0, chromosomeLength-1)
-        # print (startPtr)
-        endPtr = random.randint(0, chromosomeLength-1)
-        # print (endPtr)
+        startPtr, endPtr = rng.integers(0, chromosomeLength, size=2)
         if(endPtr < startPtr):
-            temp = endPtr
-            endPtr = startPtr
-            startPtr = temp
-        tempArrQty = []
-        for i in range(startPtr,endPtr+1):
-            tempArrQty.append(individual[i].qty)
-        tempArrQty = random.sample(tempArrQty,len(tempArrQty))
-        for i in range(startPtr,endPtr+1):
-            individual[i].qty = tempArrQty[i-startPtr]
+            startPtr, endPtr = endPtr, startPtr
+        segment = individual[startPtr:endPtr+1]
+        segment[:] = rng.permutation(segment)
     return individual
 
-def mutatePopulation ( population, noOfElite, mutationRate):
+def mutatePopulation ( population, noOfElite, mutationRate, rng=None):
     """
     This function performs mutation on entire population
 
-    population -> pool of chromosomes of current generation
+    population -> pool of chromosomes of current generation, as
+                  produced by crossover (rows are mutated in place)
     mutationRate -> rate at which mutation is supposed to occur
+    rng -> random generator, see makeRng
 
-    returns new population pool after mutation of original pool
+    returns population pool after mutation, elites left untouched
     """
-    popuLen = len(population)
-    newPopu = []
-    for i in range(0,noOfElite):
-        newPopu.append(deepcopy(population[i]))
-    for i in range(noOfElite,popuLen):
-        mutantIndi = mutate(population[i],mutationRate)
-        newPopu.append(mutantIndi)
-    return newPopu
+    rng = makeRng(rng)
+    for i in range(noOfElite, len(population)):
+        mutate(population[i], mutationRate, rng)
+    return population
 
 ## This part does the selection
 
-def selection(population, noOfElite):
+def selection(population, noOfElite, method="roulette", rng=None):
     """
-    This selection algorithm uses Roulette Wheel Algorithm to
-    determine mating pool for selection
+    This selection algorithm uses Roulette Wheel Algorithm (or the
+    given method) to determine mating pool for selection
 
     population -> pool of population of chromosomes in sorted order
                   (max fitness chromosome at 0th index)
     noOfElite -> Number of chromosomes that we want to persist in
                  next generation due to elitism
+    method -> "roulette", "sus" (stochastic universal sampling)
+              or "tournament", see selection.py
+    rng -> random generator, see makeRng
 
     returns mating pool consisting of array of indices of chromosomes
     belonging to current generation
     """
-    matingPool = []
-    popuPd = pd.DataFrame(np.array(population), columns=["Index", "Fitness"])
-    popuPd["cum_sum"] = popuPd.Fitness.cumsum()
-    popuPd["cum_perc"] = 100*popuPd.cum_sum/popuPd.Fitness.sum()
-
-    for i in range(0, noOfElite):
-        matingPool.append(population[i][0])
-    for i in range(0, len(population) - noOfElite):
-        pieToBePickedInCircle = 100*random.random()
-        for j in range(0, len(population)):
-            if pieToBePickedInCircle <= popuPd.iat[j, 3]:
-                matingPool.append(population[j][0])
-                break
-    return matingPool
+    ranked = np.asarray(population)
+    indices = ranked[:, 0].astype(np.intp)
+    picks = SELECTION_METHODS[method](ranked[:, 1], len(ranked) - noOfElite, makeRng(rng))
+    return np.concatenate((indices[:noOfElite], indices[picks]))
 
 
 ## Coming up with the next generation
 
-def nextGeneration(currentPopulation, cuisineScore, maxQtyToBeOrdered, noOfElite, mutationRate, graphPoints, answer):
+def nextGeneration(currentPopulation, cuisineScore, maxQtyToBeOrdered, noOfElite, mutationRate, graphPoints, answer, menuData, selectionMethod="roulette", rng=None, telemetry=None):
     """
     This function applies genetic operators over current generation to produce 
     new generation
@@ -170,20 +181,35 @@ def nextGeneration(currentPopulation, cuisineScore, maxQtyToBeOrdered, noOfElite
     cuisineScore -> Object consisting of cuisine score as rated by the users
     noOfElite -> no of Elite chromosomes that are to be persisted in next generation
     mutationRate -> rate at which mutation is to take place
+    menuData -> MenuArrays of the menu
+    selectionMethod -> selection engine used to build the mating pool
+    rng -> random generator, see makeRng
+    telemetry -> optional GenerationTelemetry timing every phase
 
     returns new generation of chromosomes
     """
-    populationRanked = rankDishes(currentPopulation, cuisineScore, maxQtyToBeOrdered)
+    rng = makeRng(rng)
+    clock = telemetry.begin() if telemetry is not None else None
+    populationRanked = rankDishes(currentPopulation, cuisineScore, maxQtyToBeOrdered, menuData)
     graphPoints.append(populationRanked[0][1])
     
     if(answer.fitness<populationRanked[0][1]):
-        answer.ans = deepcopy(currentPopulation[populationRanked[0][0]])
+        answer.ans = currentPopulation[populationRanked[0][0]].copy()
         answer.fitness = populationRanked[0][1]
 
-    selectedPopulationPool = selection(populationRanked, noOfElite)
+    if clock is not None:
+        clock.lap("rank")
+    selectedPopulationPool = selection(populationRanked, noOfElite, selectionMethod, rng)
+    if clock is not None:
+        clock.lap("selection")
     populationAfterCrossover = crossover(
-        selectedPopulationPool, currentPopulation, noOfElite)
-    nextGen = mutatePopulation(populationAfterCrossover, noOfElite, mutationRate)
+        selectedPopulationPool, currentPopulation, noOfElite, rng)
+    if clock is not None:
+        clock.lap("crossover")
+    nextGen = mutatePopulation(populationAfterCrossover, noOfElite, mutationRate, rng)
+    if clock is not None:
+        clock.lap("mutation")
+        telemetry.end(clock, populationRanked, nextGen)
     return nextGen
 
 
@@ -292,10 +318,12 @@ class Fitness:
 ## Build a dish
 class Dish:
     """
-    Allele in chromosome consists of this Dish which has
+    A dish ordered by a chromosome, see decodeChromosome
     id -> Dish ID
     qty -> Quantity of this Dish
     """
+    __slots__ = ('id', 'qty')
+
     # Assign the Allele with DishID and Quantity in suggestion
     def __init__(self, id, qty):
         self.id = id
@@ -324,23 +352,21 @@ class Dish:
 
 ## Perform crossover
 
-def breed(chromosome1, chromosome2):
+def breed(chromosome1, chromosome2, rng=None):
     """
     This crossover function performs uniform crossover between
-    two chromosomes
+    two chromosomes, in place
+
+    Also accepts two (pairs x dishes) arrays, breeding each row of
+    chromosome1 with the same row of chromosome2
     """
-    for i in range(0,len(chromosome1)):
-        k = random.random()
-        # print (k)
-        if(k>=0.5):
-            temp = chromosome1[i]
-            chromosome1[i] = chromosome2[i]
-            chromosome2[i] = temp
-    # print (chromosome1)
-    # print (chromosome2)
-    
+    swap = makeRng(rng).random(chromosome1.shape) >= 0.5
+    temp = np.where(swap, chromosome2, chromosome1)
+    chromosome2[...] = np.where(swap, chromosome1, chromosome2)
+    chromosome1[...] = temp
 
-def crossover( matingPool, origChromosomes, noOfElite):
+
+def crossover( matingPool, origChromosomes, noOfElite, rng=None):
     """
     This crossover function performs uniform crossover between
     two chromosomes
@@ -348,67 +374,68 @@ def crossover( matingPool, origChromosomes, noOfElite):
     matingPool -> list consisting of indices from original Chromosomes
     origChromosomes -> consists of list of original Chromosomes
     noOfElite -> number of times we need to perform breed function
+    rng -> random generator, see makeRng
 
-    returns list containing chromosome pool of new generation
+    returns (population x dishes) array containing chromosome pool
+    of new generation: the elites, then the children of each pair,
+    then the middle chromosome of the pool if it could not be paired
     """
+    matingPool = np.asarray(matingPool)
     sizeOfMatingPool = len(matingPool)
-    sizeOfChromosome = len(origChromosomes[0])
-    newChromosome = []
-    # Copy the elite chromosomes and persist them to next generation
-    for i in range(0, noOfElite):
-        newChromosome.append(deepcopy(origChromosomes[matingPool[i]]))
-    LowerPtrForCrossover = noOfElite
-    UpperPtrForCrossover = sizeOfMatingPool-1
-    while (LowerPtrForCrossover<UpperPtrForCrossover):
-        ind1 = matingPool[LowerPtrForCrossover]
-        ind2 = matingPool[UpperPtrForCrossover]
-        tempChromo1 = deepcopy(origChromosomes[ind1])
-        tempChromo2 = deepcopy(origChromosomes[ind2])
-        breed(tempChromo1,tempChromo2)
-        newChromosome.append(tempChromo1)
-        newChromosome.append(tempChromo2)
-        LowerPtrForCrossover+=1
-        UpperPtrForCrossover-=1
-    if(LowerPtrForCrossover==UpperPtrForCrossover):
-        ind1 = matingPool[LowerPtrForCrossover]
-        tempChromo1 = deepcopy(origChromosomes[ind1])
-        newChromosome.append(tempChromo1)
+    noOfPairs = (sizeOfMatingPool - noOfElite)//2
+    # pair the chromosomes from both ends of the mating pool
+    LowerPtrs = matingPool[noOfElite:noOfElite+noOfPairs]
+    UpperPtrs = matingPool[::-1][:noOfPairs]
+    order = np.concatenate((
+        matingPool[:noOfElite],
+        np.column_stack((LowerPtrs, UpperPtrs)).ravel(),
+        matingPool[noOfElite+noOfPairs:sizeOfMatingPool-noOfPairs],
+    )).astype(np.intp)
+    # a single fancy-indexed copy replaces the per chromosome deepcopy
+    newChromosome = np.asarray(origChromosomes)[order]
+    children = newChromosome[noOfElite:noOfElite+2*noOfPairs]
+    children = children.reshape(noOfPairs, 2, newChromosome.shape[1])
+    breed(children[:, 0], children[:, 1], rng)
 
     return newChromosome
 
 
 ## create initial population
-def createInitialPopu(maxDishes, initialPopuSize, menuData):
+def createInitialPopu(maxDishes, initialPopuSize, menuData, rng=None):
     """
     Creates initial set of population
 
     maxDishes -> total number of dishes that are to be ordered
 
     initialPopuSize -> Size of initial population pool
+    rng -> random generator, see makeRng
+
+    returns (initialPopuSize x dishes) array, one chromosome per row
     """
-    population = []
-    for i in range(1, initialPopuSize+1):
-        population.append(createChromosome(maxDishes, menuData))
-    return population
+    noOfDishes = len(menuData)
+    picks = makeRng(rng).integers(0, noOfDishes, size=(initialPopuSize, maxDishes))
+    picks += noOfDishes*np.arange(initialPopuSize)[:, None]
+    population = np.bincount(picks.ravel(), minlength=initialPopuSize*noOfDishes)
+    return population.reshape(initialPopuSize, noOfDishes)
 
 
 ## rank the population
 def rankDishes(population, cuisineScore, MaxQtyToBeOrdered, menuData):
     """
-    Ranks the population using the Fitness class
-    and the method to calculate fitness
+    Ranks the population, evaluating the fitness of all
+    chromosomes at once with populationFitness
 
-    population -> initial population of chromosomes
+    population -> (population x dishes) array of chromosomes
     cuisineScore -> object consisting of score that is rated
                     by users with key as cuisine name
+    menuData -> menu database or MenuArrays built from it
 
     returns array consisting of (chromosome index,fitness) pairs
     in sorted order (chromosome with max fitness at 0th index)
     """
-    fitnessResults = {}
-    for i in range(0,len(population)):
-        fitnessResults[i] = Fitness(population[i], cuisineScore, MaxQtyToBeOrdered).calcFitness(menuData)
-    return sorted(fitnessResults.items(), key=lambda x: x[1], reverse=True)
+    menuArrays = asMenuArrays(menuData)
+    fitness = populationFitness(population, cuisineScore, MaxQtyToBeOrdered, menuArrays)
+    return rankFitness(fitness)
 
 
 class DotDict(dict):
@@ -420,25 +447,59 @@ class DotDict(dict):
         else:
             self[key] = val
 
-def geneticAlgorithm( maxDishes, initialPopulationSize, cuisineScore, noOfElite, mutationRate, generations ):
-    popu = createInitialPopu( maxDishes, initialPopulationSize)
+def geneticAlgorithm( maxDishes, initialPopulationSize, cuisineScore, noOfElite, mutationRate, generations, menuData, selectionMethod="roulette", seed=None,
+                      stagnation=None, targetFitness=None, timeBudget=None, minDiversity=None, verbose=True, progress=None, telemetry=None ):
+    """
+    Runs the genetic algorithm over menuData
+
+    generations -> maximum number of generations, None to rely only
+                   on the other termination conditions
+    seed -> int or numpy Generator threaded through every operator,
+            the same seed and arguments give the same answer
+    stagnation, targetFitness, timeBudget, minDiversity -> optional
+            early termination conditions, see StopCriteria
+    progress -> optional callable(generation, bestFitness) called
+                after every generation
+    telemetry -> optional GenerationTelemetry, see telemetry.py
+
+    returns answer object with
+        ans -> best chromosome found (-1 if none had positive fitness)
+        fitness -> its fitness
+        generations -> number of generations run
+        stopReason -> why the run stopped, see termination.py
+        graphPoints -> best fitness of every generation
+    """
+    stopCriteria = StopCriteria(generations, stagnation, targetFitness, timeBudget, minDiversity)
+    rng = makeRng(seed)
+    menuArrays = asMenuArrays(menuData)
+    popu = createInitialPopu( maxDishes, initialPopulationSize, menuArrays, rng)
 
     graphPoints = []
     answer = DotDict([("ans",-1),("fitness",0)])
-    for i in range(0, generations):
-        popu = nextGeneration( popu, cuisineScore , maxDishes, noOfElite, mutationRate, graphPoints, answer ) 
-
-    lastGenRanked = rankDishes(popu, cuisineScore, maxDishes)
+    stopReason = stopCriteria.beforeGeneration()
+    while stopReason is None:
+        popu = nextGeneration( popu, cuisineScore , maxDishes, noOfElite, mutationRate, graphPoints, answer, menuArrays, selectionMethod, rng, telemetry ) 
+        stopReason = stopCriteria.afterGeneration(graphPoints[-1], popu)
+        if progress is not None:
+            progress(stopCriteria.generation, graphPoints[-1])
+
+    lastGenRanked = rankDishes(popu, cuisineScore, maxDishes, menuArrays)
     graphPoints.append(lastGenRanked[0][1])
 
     if(answer.fitness<lastGenRanked[0][1]):
         answer.ans = popu[lastGenRanked[0][0]].copy()
         answer.fitness = lastGenRanked[0][1]
 
+    answer.generations = stopCriteria.generation
+    answer.stopReason = stopReason
+    answer.graphPoints = graphPoints
+
     # plt.plot(graphPoints)
     # plt.ylabel('Best Fitness')
     # plt.xlabel('Generation')
     # plt.show()
-    print( answer.ans )
-    print("Fitness: %s" %str(answer.fitness))
-    return answer.ans
\ No newline at end of file
+    if verbose:
+        if(answer.fitness>0):
+            print( decodeChromosome(answer.ans, menuArrays) )
+        print("Fitness: %s" %str(answer.fitness))
+    return answer
@@ -0,0 +1,163 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from main.alg.geneticAlgo.fitness import MenuArrays
+from main.alg.geneticAlgo.genetic_algorithm import (
+    DotDict, asMenuArrays, createInitialPopu, nextGeneration, rankDishes)
+from main.alg.geneticAlgo.termination import GENERATIONS
+
+## Island model
+#
+# Several populations evolve independently in a process pool. Every
+# migrationInterval generations the best chromosomes of each island
+# replace the worst ones of the next island (ring topology). The menu
+# arrays are placed once in shared memory; workers attach to it when
+# they start, so only the small population matrices cross processes.
+
+
+class SharedMenu:
+    """
+    Copy of the per-dish arrays and the weights matrix of a MenuArrays
+    in a shared memory block, so workers neither copy nor rebuild them
+
+    descriptor -> picklable description workers use to attach
+    """
+    FIELDS = (("price", np.float64), ("rating", np.float64), ("cuisineIdx", np.int64),
+              ("weights", np.float64))
+
+    def __init__(self, menuArrays):
+        noOfDishes = len(menuArrays)
+        shapes = [(field, dtype, np.shape(getattr(menuArrays, field)))
+                  for field, dtype in self.FIELDS]
+        size = sum(np.dtype(dtype).itemsize*int(np.prod(shape)) for _, dtype, shape in shapes)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        offset = 0
+        for field, dtype, shape in shapes:
+            view = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset)
+            view[:] = getattr(menuArrays, field)
+            offset += view.nbytes
+        self.descriptor = (self.shm.name, noOfDishes, list(menuArrays.cuisines), shapes,
+                           menuArrays.ratingWeight)
+
+    @classmethod
+    def attach(cls, descriptor):
+        """
+        returns (SharedMemory, MenuArrays) reading the shared block,
+        the SharedMemory must be kept alive as long as the arrays are used
+        """
+        name, noOfDishes, cuisines, shapes, ratingWeight = descriptor
+        shm = shared_memory.SharedMemory(name=name)
+        arrays = {}
+        offset = 0
+        for field, dtype, shape in shapes:
+            arrays[field] = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+            offset += arrays[field].nbytes
+        menuArrays = MenuArrays(range(noOfDishes), arrays["price"], arrays["rating"],
+                                arrays["cuisineIdx"], cuisines, arrays["weights"], ratingWeight)
+        return shm, menuArrays
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_workerShm = None
+_workerMenu = None
+
+
+def _initWorker(descriptor):
+    global _workerShm, _workerMenu
+    _workerShm, _workerMenu = SharedMenu.attach(descriptor)
+
+
+def _evolveIsland(population, cuisineScore, maxDishes, noOfElite, mutationRate,
+                  generations, selectionMethod, rng):
+    """
+    Runs generations generations of one island inside a worker
+
+    returns (population sorted by fitness, best chromosome, its fitness,
+    best fitness per generation, rng) so the island can continue later
+    """
+    graphPoints = []
+    answer = DotDict([("ans", -1), ("fitness", 0)])
+    for i in range(0, generations):
+        population = nextGeneration(population, cuisineScore, maxDishes, noOfElite,
+                                    mutationRate, graphPoints, answer, _workerMenu,
+                                    selectionMethod, rng)
+    ranked = rankDishes(population, cuisineScore, maxDishes, _workerMenu)
+    population = population[[index for index, _ in ranked]]
+    if answer.fitness < ranked[0][1]:
+        answer.ans = population[0].copy()
+        answer.fitness = ranked[0][1]
+    return population, answer.ans, answer.fitness, graphPoints, rng
+
+
+def islandGeneticAlgorithm(maxDishes, initialPopulationSize, cuisineScore, noOfElite,
+                           mutationRate, generations, menuData, islands=4,
+                           migrationInterval=10, migrants=2, selectionMethod="roulette",
+                           seed=None, workers=None):
+    """
+    Runs geneticAlgorithm on several islands in parallel processes
+
+    initialPopulationSize -> population size of each island
+    islands -> number of independent populations
+    migrationInterval -> generations between two migrations
+    migrants -> number of elites sent to the next island on migration
+    seed -> int seed, each island gets its own independent stream
+    workers -> number of processes, defaults to one per island
+               (at most the number of cpus)
+
+    returns answer object like geneticAlgorithm, graphPoints holding
+    the best fitness over all islands of every generation
+    """
+    menuArrays = asMenuArrays(menuData)
+    rngs = [np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(islands)]
+    populations = [createInitialPopu(maxDishes, initialPopulationSize, menuArrays, rng)
+                   for rng in rngs]
+    workers = workers or min(islands, os.cpu_count() or 1)
+    migrants = min(migrants, initialPopulationSize)
+
+    answer = DotDict([("ans", -1), ("fitness", 0)])
+    graphPoints = []
+    with SharedMenu(menuArrays) as sharedMenu, ProcessPoolExecutor(
+            max_workers=workers, initializer=_initWorker,
+            initargs=(sharedMenu.descriptor,)) as pool:
+        remaining = generations
+        while remaining > 0:
+            epoch = min(migrationInterval, remaining)
+            futures = [
+                pool.submit(_evolveIsland, populations[i], cuisineScore, maxDishes,
+                            noOfElite, mutationRate, epoch, selectionMethod, rngs[i])
+                for i in range(islands)
+            ]
+            results = [future.result() for future in futures]
+            remaining -= epoch
+
+            epochPoints = []
+            for i, (population, best, fitness, points, rng) in enumerate(results):
+                populations[i], rngs[i] = population, rng
+                epochPoints.append(points)
+                if answer.fitness < fitness:
+                    answer.ans = best
+                    answer.fitness = fitness
+            graphPoints.extend(np.max(epochPoints, axis=0).tolist())
+
+            if remaining > 0 and islands > 1 and migrants > 0:
+                # populations come back sorted, best chromosomes first
+                elites = [population[:migrants].copy() for population in populations]
+                for i in range(islands):
+                    populations[(i + 1) % islands][-migrants:] = elites[i]
+
+    answer.generations = generations
+    answer.stopReason = GENERATIONS
+    answer.graphPoints = graphPoints
+    return answer
@@ -0,0 +1,65 @@
+import numpy as np
+
+## Selection engines
+#
+# Every engine draws the whole mating pool in one batched step from the
+# ranked fitness values of a generation, using the numpy Generator of
+# the run.
+
+
+def selectionWeights(fitness):
+    """
+    Turns fitness values into non-negative wheel weights
+
+    Chromosomes ordering more than the allowed quantity get a negative
+    fitness from calcFitness; they get no share of the wheel instead of
+    shrinking the slices of every chromosome after them. If no chromosome
+    has a positive fitness all of them are equally likely.
+    """
+    weights = np.clip(np.asarray(fitness, dtype=np.float64), 0.0, None)
+    if weights.sum() <= 0:
+        return np.ones_like(weights)
+    return weights
+
+
+def rouletteSelection(fitness, count, rng):
+    """
+    Roulette Wheel selection, one binary search per pick
+
+    returns array of count positions into fitness
+    """
+    cumSum = np.cumsum(selectionWeights(fitness))
+    pies = rng.random(count)*cumSum[-1]
+    return np.minimum(np.searchsorted(cumSum, pies, side="right"), len(cumSum)-1)
+
+
+def stochasticUniversalSampling(fitness, count, rng):
+    """
+    Stochastic Universal Sampling, count evenly spaced pointers on the
+    wheel from a single random offset
+
+    returns array of count positions into fitness
+    """
+    cumSum = np.cumsum(selectionWeights(fitness))
+    pointers = (rng.random() + np.arange(count))*(cumSum[-1]/count)
+    return np.minimum(np.searchsorted(cumSum, pointers, side="right"), len(cumSum)-1)
+
+
+def tournamentSelection(fitness, count, rng, tournamentSize=3):
+    """
+    Tournament selection, the fittest of tournamentSize random
+    chromosomes wins each slot
+
+    returns array of count positions into fitness
+    """
+    fitness = np.asarray(fitness, dtype=np.float64)
+    contestants = rng.integers(0, len(fitness), size=(count, tournamentSize))
+    winners = np.argmax(fitness[contestants], axis=1)
+    return contestants[np.arange(count), winners]
+
+
+SELECTION_METHODS = {
+    "roulette": rouletteSelection,
+    "sus": stochasticUniversalSampling,
+    "tournament": tournamentSelection,
+}
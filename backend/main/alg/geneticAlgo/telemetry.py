@@ -0,0 +1,158 @@
+import json
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+from main.alg.geneticAlgo.termination import populationDiversity
+
+## Telemetry
+#
+# Optional per-generation instrumentation of nextGeneration: time spent
+# ranking, selecting, breeding and mutating, the fitness spread of the
+# ranked population, the diversity of the next one and, when asked for,
+# the peak memory allocated while producing it. Every generation becomes
+# a record dict handed to the sinks (JsonLinesSink, PrometheusExporter
+# or any callable).
+
+PHASES = ("rank", "selection", "crossover", "mutation")
+
+
+class PhaseClock:
+    """
+    Splits the time of one generation into phases
+
+    laps -> seconds spent in every phase lapped so far
+    """
+
+    def __init__(self):
+        self.laps = {}
+        self._last = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.laps[phase] = now - self._last
+        self._last = now
+
+
+class GenerationTelemetry:
+    """
+    Collects one record per generation and passes it to every sink
+
+    sinks -> callables receiving each record
+    trackAllocations -> measure the peak traced memory of every
+                        generation with tracemalloc (slows the run down)
+    keepRecords -> also keep the records in self.records
+    """
+
+    def __init__(self, sinks=(), trackAllocations=False, keepRecords=True):
+        self.sinks = list(sinks)
+        self.trackAllocations = trackAllocations
+        self.keepRecords = keepRecords
+        self.records = []
+        self.generation = 0
+        self._startedTracing = False
+
+    def begin(self):
+        """
+        returns the PhaseClock of a new generation
+        """
+        if self.trackAllocations:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._startedTracing = True
+            tracemalloc.reset_peak()
+        return PhaseClock()
+
+    def end(self, clock, populationRanked, nextGen):
+        """
+        Builds the record of a generation from its clock, the ranked
+        (index, fitness) pairs and the population it produced
+        """
+        fitness = np.fromiter((f for _, f in populationRanked), dtype=np.float64,
+                              count=len(populationRanked))
+        self.generation += 1
+        record = {
+            "generation": self.generation,
+            "seconds": sum(clock.laps.values()),
+            "phases": dict(clock.laps),
+            "best": float(fitness[0]),
+            "mean": float(fitness.mean()),
+            "worst": float(fitness[-1]),
+            "diversity": populationDiversity(nextGen),
+            "allocPeakBytes": tracemalloc.get_traced_memory()[1] if self.trackAllocations else None,
+        }
+        if self.keepRecords:
+            self.records.append(record)
+        for sink in self.sinks:
+            sink(record)
+        return record
+
+    def close(self):
+        """
+        Stops tracemalloc if this object started it
+        """
+        if self._startedTracing:
+            tracemalloc.stop()
+            self._startedTracing = False
+
+
+class JsonLinesSink:
+    """ Writes every record as one json line to stream """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def __call__(self, record):
+        self.stream.write(json.dumps(record) + "\n")
+
+
+class PrometheusExporter:
+    """
+    Aggregates records into Prometheus metrics: counters for the
+    generations run and the seconds spent per phase, gauges for the
+    fitness, diversity and allocations of the latest generation.
+    render() returns them in the text exposition format.
+    """
+
+    def __init__(self, prefix="ga"):
+        self.prefix = prefix
+        self.generations = 0
+        self.phaseSeconds = {phase: 0.0 for phase in PHASES}
+        self.latest = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        with self._lock:
+            self.generations += 1
+            for phase, seconds in record["phases"].items():
+                self.phaseSeconds[phase] = self.phaseSeconds.get(phase, 0.0) + seconds
+            self.latest = record
+
+    def render(self):
+        p = self.prefix
+        with self._lock:
+            lines = [
+                f"# HELP {p}_generations_total Generations evolved.",
+                f"# TYPE {p}_generations_total counter",
+                f"{p}_generations_total {self.generations}",
+                f"# HELP {p}_phase_seconds_total Time spent per genetic operator.",
+                f"# TYPE {p}_phase_seconds_total counter",
+            ]
+            lines += [f'{p}_phase_seconds_total{{phase="{phase}"}} {seconds!r}'
+                      for phase, seconds in self.phaseSeconds.items()]
+            gauges = (
+                ("best_fitness", "best", "Best fitness of the latest generation."),
+                ("mean_fitness", "mean", "Mean fitness of the latest generation."),
+                ("worst_fitness", "worst", "Worst fitness of the latest generation."),
+                ("population_diversity", "diversity", "Fraction of distinct chromosomes."),
+                ("alloc_peak_bytes", "allocPeakBytes", "Peak memory allocated by the latest generation."),
+            )
+            for name, key, help in gauges:
+                value = self.latest.get(key)
+                if value is None:
+                    continue
+                lines += [f"# HELP {p}_{name} {help}", f"# TYPE {p}_{name} gauge",
+                          f"{p}_{name} {float(value)!r}"]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,102 @@
+import time
+
+import numpy as np
+
+## Termination
+#
+# Reasons reported in answer.stopReason by geneticAlgorithm
+GENERATIONS = "generations"
+STAGNATION = "stagnation"
+TARGET = "target"
+TIME = "time"
+DIVERSITY = "diversity"
+
+
+def populationDiversity(population):
+    """
+    returns the fraction of distinct chromosomes in the population,
+    1.0 when all differ and 1/len(population) when all are identical
+    """
+    population = np.ascontiguousarray(population)
+    rows = population.view(np.dtype((np.void, population.dtype.itemsize*population.shape[1])))
+    return len(np.unique(rows))/len(population)
+
+
+class StopCriteria:
+    """
+    Termination conditions of a genetic algorithm run, checked after
+    every generation
+
+    generations -> maximum number of generations, None for no limit
+    stagnation -> stop when the best fitness did not improve for this
+                  many generations
+    targetFitness -> stop as soon as the best fitness reaches it
+    timeBudget -> wall clock seconds; the run stops before starting a
+                  generation that would not finish within the budget
+    minDiversity -> stop when populationDiversity falls below it
+    """
+
+    def __init__(self, generations=None, stagnation=None, targetFitness=None,
+                 timeBudget=None, minDiversity=None):
+        if generations is None and stagnation is None and \
+                targetFitness is None and timeBudget is None:
+            raise ValueError("geneticAlgorithm needs generations, stagnation, "
+                             "targetFitness or timeBudget to terminate")
+        self.generations = generations
+        self.stagnation = stagnation
+        self.targetFitness = targetFitness
+        self.timeBudget = timeBudget
+        self.minDiversity = minDiversity
+        self.start()
+
+    def start(self):
+        self.startTime = time.perf_counter()
+        self.lastTime = self.startTime
+        self.slowestGeneration = 0.0
+        self.generation = 0
+        self.bestFitness = -np.inf
+        self.sinceImprovement = 0
+
+    def elapsed(self):
+        return time.perf_counter() - self.startTime
+
+    def beforeGeneration(self):
+        """
+        returns the reason to stop before running another generation,
+        None to keep going
+        """
+        if self.generations is not None and self.generation >= self.generations:
+            return GENERATIONS
+        if self.timeBudget is not None and \
+                self.elapsed() + self.slowestGeneration > self.timeBudget:
+            return TIME
+        return None
+
+    def afterGeneration(self, bestFitness, population):
+        """
+        Records a finished generation
+
+        bestFitness -> best fitness of the generation
+        population -> population produced by the generation
+
+        returns the reason to stop, None to keep going
+        """
+        now = time.perf_counter()
+        self.slowestGeneration = max(self.slowestGeneration, now - self.lastTime)
+        self.lastTime = now
+        self.generation += 1
+
+        if bestFitness > self.bestFitness:
+            self.bestFitness = bestFitness
+            self.sinceImprovement = 0
+        else:
+            self.sinceImprovement += 1
+
+        if self.targetFitness is not None and self.bestFitness >= self.targetFitness:
+            return TARGET
+        if self.stagnation is not None and self.sinceImprovement >= self.stagnation:
+            return STAGNATION
+        if self.minDiversity is not None and \
+                populationDiversity(population) < self.minDiversity:
+            return DIVERSITY
+        return self.beforeGeneration()
@@ -0,0 +1,279 @@
+import asyncio
+import io
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from urllib.parse import parse_qsl
+
+from main import app, db, catalog, recommendation_cache, request_metrics
+from main.model.model import User
+from main.recommend.recommender import (
+    GAParams, UserSettings, MODES, CACHED_MODES, recommend, recommendation_key)
+from main.recommend.ranking import top_k_params, top_k_recommendation
+
+
+def load_settings(auth_token):
+    """
+    Verifies the token and loads the user's settings, runs on a thread
+    :return: (UserSettings|None, error message|None)
+    """
+    with app.app_context():
+        try:
+            user_id, error = User.verify_auth_token(auth_token)
+            if error:
+                return None, error
+            user = User.load(user_id)
+            if user is None or user.settings is None:
+                return None, 'Provide a valid auth token.'
+            return UserSettings.from_model(user.settings), None
+        finally:
+            db.session.remove()
+
+
+def recommend_in_worker(settns, mode, params, seed):
+    """
+    recommend() on a process pool worker, which picks up dataset
+    changes itself since the parent's catalog watcher is not forked
+    :return: response object
+    """
+    catalog.reload_if_changed()
+    return recommend(catalog, settns, mode, params, seed)
+
+
+class AsyncApp:
+    """
+    ASGI application serving the routes of auth_blueprint
+
+    /recommend is served natively: token checks and database access
+    run on a thread pool, 'ga' recommendations on a process pool, so
+    one event loop holds many concurrent requests while the GA runs.
+    Every other route goes to the Flask app on the thread pool. Native
+    routes record their latency and status in request_metrics like the
+    blueprint's own do.
+
+    flask_app -> WSGI app for the remaining routes
+    threads -> threads for database, token and Flask work
+    processes -> GA worker processes, None for one per CPU
+    """
+
+    def __init__(self, flask_app, threads, processes=None):
+        self.flask_app = flask_app
+        self.threads = threads
+        self.processes = processes
+        self._thread_pool = None
+        self._process_pool = None
+        self.routes = {
+            ('GET', '/recommend'): self.recommend,
+        }
+
+    @property
+    def thread_pool(self):
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(self.threads, thread_name_prefix='asgi')
+        return self._thread_pool
+
+    @property
+    def process_pool(self):
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(self.processes)
+        return self._process_pool
+
+    def shutdown(self):
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown()
+            self._thread_pool = None
+        if self._process_pool is not None:
+            self._process_pool.shutdown()
+            self._process_pool = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        handler = self.routes.get((scope['method'], scope['path']))
+        if handler is None:
+            await self.wsgi(scope, receive, send)
+        else:
+            await self.timed(handler, scope, receive, send)
+
+    async def timed(self, handler, scope, receive, send):
+        started = time.perf_counter()
+        status = []
+
+        async def send_and_record(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+            await send(message)
+
+        try:
+            await handler(scope, receive, send_and_record)
+        finally:
+            request_metrics.observe(scope['method'], scope['path'], status[0] if status else 500,
+                                    time.perf_counter() - started)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def run_sync(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.thread_pool, fn, *args)
+
+    async def respond(self, send, responseObject, status):
+        body = json.dumps(responseObject).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def recommend(self, scope, receive, send):
+        headers = dict(scope['headers'])
+        auth_header = headers.get(b'authorization', b'').decode('latin-1')
+        auth_token = auth_header.split(" ")[0] if auth_header else ''
+        if not auth_token:
+            responseObject = {
+                'status': 'fail',
+                'message': 'Provide a valid auth token.'
+            }
+            await self.respond(send, responseObject, 401)
+            return
+        settns, error = await self.run_sync(load_settings, auth_token)
+        if error:
+            responseObject = {
+                'status': 'fail',
+                'message': error
+            }
+            await self.respond(send, responseObject, 401)
+            return
+
+        query = dict(parse_qsl(scope['query_string'].decode('latin-1')))
+        mode = query.get('mode', app.config['RECOMMEND_MODE'])
+        if mode == 'topk':
+            await self.top_k(send, settns, query)
+            return
+        if mode not in MODES:
+            responseObject = {
+                'status': 'fail',
+                'message': f'Unknown recommendation mode {mode}.'
+            }
+            await self.respond(send, responseObject, 400)
+            return
+
+        params = GAParams.from_config(app.config)
+        key, seed = None, None
+        if mode in CACHED_MODES and recommendation_cache.maxsize > 0:
+            key, seed = recommendation_key(
+                catalog, settns, mode, params, app.config['RECOMMEND_CACHE_SEED_BUCKETS'],
+                recommendation_cache.ttl)
+        responseObject = recommendation_cache.get(key) if key is not None else None
+        if responseObject is None:
+            if mode == 'ga':
+                loop = asyncio.get_running_loop()
+                responseObject = await loop.run_in_executor(
+                    self.process_pool, recommend_in_worker, settns, mode, params, seed)
+            else:
+                responseObject = recommend(catalog, settns, mode, params, seed)
+            if key is not None:
+                recommendation_cache.set(key, responseObject)
+        await self.respond(send, responseObject, 200)
+
+    async def top_k(self, send, settns, query):
+        try:
+            k, diversity = top_k_params(query, app.config)
+        except ValueError as e:
+            responseObject = {
+                'status': 'fail',
+                'message': str(e)
+            }
+            await self.respond(send, responseObject, 400)
+            return
+        await self.respond(send, top_k_recommendation(catalog, settns, k, diversity), 200)
+
+    async def wsgi(self, scope, receive, send):
+        body = bytearray()
+        more_body = True
+        while more_body:
+            message = await receive()
+            body.extend(message.get('body', b''))
+            more_body = message.get('more_body', False)
+        environ = wsgi_environ(scope, bytes(body))
+        status, headers, chunks = await self.run_sync(call_wsgi, self.flask_app, environ)
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': headers,
+        })
+        await send({'type': 'http.response.body', 'body': b''.join(chunks)})
+
+
+def wsgi_environ(scope, body):
+    """
+    :return: WSGI environ for an ASGI http scope
+    """
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = 'HTTP_' + name
+            environ[key] = environ[key] + ',' + value if key in environ else value
+    return environ
+
+
+def call_wsgi(wsgi_app, environ):
+    """
+    :return: (status code, ASGI headers, list of body chunks)
+    """
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = [
+            (name.lower().encode('latin-1'), value.encode('latin-1'))
+            for name, value in headers
+        ]
+
+    result = wsgi_app(environ, start_response)
+    try:
+        chunks = list(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return started['status'], started['headers'], chunks
+
+
+# uvicorn main.asgi:application
+application = AsyncApp(app, app.config['ASGI_THREADS'], app.config['ASGI_PROCESSES'])
@@ -1,12 +1,22 @@
+import hmac
+import logging
+
 from flask import Blueprint
 
-from flask import request, make_response, jsonify
+from flask import request, make_response, jsonify, current_app
 from flask.views import MethodView
 
-from main import bcrypt, db
+from main import db, catalog, recommendation_cache, job_queue, request_metrics
+from main.auth.hashing import HashingBusy
 from main.model.model import User, BadToken, Settings
 
-from main.alg.geneticAlgo.genetic_algorithm import *
+from main.recommend.recommender import (
+    GAParams, UserSettings, MODES, cached_recommend, food_response, macro_targets)
+from main.recommend.jobs import JobQueueFull, job_params
+from main.recommend.ranking import foods_params, top_k_params, top_k_recommendation
+from main.recommend.batch import recommend_users
+
+logger = logging.getLogger(__name__)
 
 
 class UserAPI(MethodView):
@@ -28,9 +38,9 @@ class UserAPI(MethodView):
         else:
             auth_token = ''
         if auth_token:
-            resp = User.decode_auth_token(auth_token)
-            if isinstance(resp, str):
-                user = User.query.filter_by(id=resp).first()
+            resp, error = User.verify_auth_token(auth_token)
+            if not error:
+                user = User.load(resp)
                 responseObject = {
                         'id': user.id,
                         'username': user.fullname,
@@ -39,7 +49,7 @@ class UserAPI(MethodView):
                 return make_response(jsonify(responseObject)), 200
             responseObject = {
                 'status': 'fail',
-                'message': resp
+                'message': error
             }
             return make_response(jsonify(responseObject)), 401
         else:
@@ -68,15 +78,12 @@ class RegisterAPI(MethodView):
                     gender=post_data['gender']
                 )
 
-                # insert the user
+                # store the user with its default settings in one transaction
+                user.settings = Settings(user.id, post_data['preference'], 19.0, 5.0, 2.0)
                 db.session.add(user)
                 db.session.commit()
                 # generate the auth token
                 auth_token = user.encode_auth_token(user.id)
-                settings = Settings(user.id, post_data['preference'], 19.0, 5.0, 2.0)
-                # store user default settings
-                db.session.add(settings)
-                db.session.commit()
 
                 responseObject = {
                     'token': auth_token.decode(),
@@ -87,9 +94,17 @@ class RegisterAPI(MethodView):
                     }
                 }
                 return make_response(jsonify(responseObject)), 201
-                
+
+            except HashingBusy as e:
+                db.session.rollback()
+                responseObject = {
+                    'status': 'fail',
+                    'message': str(e)
+                }
+                return make_response(jsonify(responseObject)), 503
             except Exception as e:
-                print(e)
+                logger.exception('registration failed')
+                db.session.rollback()
                 responseObject = {
                     'status': 'fail',
                     'message': f'Some error occurred. Please try again. {e}'
@@ -114,9 +129,9 @@ class LoginAPI(MethodView):
             user = User.query.filter_by(
                 email=post_data['email']
             ).first()
-            if user and bcrypt.check_password_hash(
-                user.password, post_data['password']
-            ):
+            if user and user.check_password(post_data['password']):
+                if db.session.is_modified(user):
+                    db.session.commit()
                 auth_token = user.encode_auth_token(user.id)
                 if auth_token:
                     responseObject = {
@@ -134,8 +149,14 @@ class LoginAPI(MethodView):
                     'message': 'User does not exist.'
                 }
                 return make_response(jsonify(responseObject)), 404
+        except HashingBusy as e:
+            responseObject = {
+                'status': 'fail',
+                'message': str(e)
+            }
+            return make_response(jsonify(responseObject)), 503
         except Exception as e:
-            print(e)
+            logger.exception('login failed')
             responseObject = {
                 'status': 'fail',
                 'message': 'Try again'
@@ -154,29 +175,27 @@ class LogoutAPI(MethodView):
         else:
             auth_token = ''
         if auth_token:
-            resp = User.decode_auth_token(auth_token)
-            if not isinstance(resp, str):
-                # mark the token as blacklisted
-                blacklist_token = BlacklistToken(token=auth_token)
+            resp, error = User.verify_auth_token(auth_token)
+            if not error:
                 try:
-                    # insert the token
-                    db.session.add(blacklist_token)
-                    db.session.commit()
+                    # mark the token as blacklisted
+                    BadToken.blacklist(auth_token)
                     responseObject = {
                         'status': 'success',
                         'message': 'Successfully logged out.'
                     }
                     return make_response(jsonify(responseObject)), 200
                 except Exception as e:
+                    db.session.rollback()
                     responseObject = {
                         'status': 'fail',
-                        'message': e
+                        'message': str(e)
                     }
                     return make_response(jsonify(responseObject)), 200
             else:
                 responseObject = {
                     'status': 'fail',
-                    'message': resp
+                    'message': error
                 }
                 return make_response(jsonify(responseObject)), 401
         else:
@@ -205,50 +224,39 @@ class RecommendAPI(MethodView):
         else:
             auth_token = ''
         if auth_token:
-            resp = User.decode_auth_token(auth_token)
-            if isinstance(resp, str):
+            resp, error = User.verify_auth_token(auth_token)
+            if not error:
 
-                settns = Settings.query.filter_by(id=resp).first()
+                settns = User.load(resp).settings
                 ## do recommendation here
-                if settns.preference == 'vegan':
-                    menuData = setMenuData('vegan.json')
-                elif settns.preference == 'mixed_food':
-                    menuData = setMenuData('mixed_food.json')
-                elif settns.preference == 'vegetarian':
-                    menuData = setMenuData('vegetarian.json')
-                else:
-                    menuData = setMenuData('mixed_food.json')
-                    
-                # cuisineScore = {settns.preference: 0.90}
-
-                # temp = createInitialPopu(1, 10, menuData)
-                # temp1 = rankDishes(temp, cuisineScore, 2, menuData)
-                # matePool = selection(temp1,2)
-                # newGen = crossover(matePool,temp,5)
-                # newGenAfterMutation = mutatePopulation(newGen, 10, 0.67)
-                # import random
-                # rec = newGenAfterMutation[random.randrange(0, len(newGenAfterMutation))]
-
-                start_point = int(settns.protein_intake + settns.fat_intake + settns.carb_intake)
-
-                rec = random.randrange(start_point, len(menuData))
-                food = menuData[rec]
-                    
-                responseObject = {
-                        'food': food["Food Name"],
-                        'protein':food["Protein (g)"],
-                        'carb':food["Carbohydrate (g)"],
-                        'fat':food["Fat (g)"],
-                        'energy':food["Energy (kJ)"],
-                        'calories':food["Energy (kCal)"],
-                        "water": food["Water (g)"],
-                        "fibre": food["Fibre (g)"]
-                }
-                
+                mode = request.args.get('mode', current_app.config['RECOMMEND_MODE'])
+                if mode == 'topk':
+                    try:
+                        k, diversity = top_k_params(request.args, current_app.config)
+                    except ValueError as e:
+                        responseObject = {
+                            'status': 'fail',
+                            'message': str(e)
+                        }
+                        return make_response(jsonify(responseObject)), 400
+                    responseObject = top_k_recommendation(catalog, settns, k, diversity)
+                    return make_response(jsonify(responseObject)), 200
+                if mode not in MODES:
+                    responseObject = {
+                        'status': 'fail',
+                        'message': f'Unknown recommendation mode {mode}.'
+                    }
+                    return make_response(jsonify(responseObject)), 400
+
+                responseObject = cached_recommend(
+                    recommendation_cache, catalog, settns, mode,
+                    GAParams.from_config(current_app.config),
+                    current_app.config['RECOMMEND_CACHE_SEED_BUCKETS']
+                )
                 return make_response(jsonify(responseObject)), 200
             responseObject = {
                 'status': 'fail',
-                'message': resp
+                'message': error
             }
             return make_response(jsonify(responseObject)), 401
         else:
@@ -259,6 +267,196 @@ class RecommendAPI(MethodView):
             return make_response(jsonify(responseObject)), 401
 
 
+class BatchRecommendAPI(MethodView):
+    """
+    Batch Recommend Resource, admin only
+    """
+    def post(self):
+        # get auth token
+        auth_header = request.headers.get('Authorization')
+        if auth_header:
+            auth_token = auth_header.split(" ")[0]
+        else:
+            auth_token = ''
+        if not auth_token:
+            responseObject = {
+                'status': 'fail',
+                'message': 'Provide a valid auth token.'
+            }
+            return make_response(jsonify(responseObject)), 401
+        resp, error = User.verify_auth_token(auth_token)
+        if error:
+            responseObject = {
+                'status': 'fail',
+                'message': 'Provide a valid auth token.'
+            }
+            return make_response(jsonify(responseObject)), 401
+        user = User.load(resp)
+        if not user or not user.admin:
+            responseObject = {
+                'status': 'fail',
+                'message': 'Batch recommendations require an admin account.'
+            }
+            return make_response(jsonify(responseObject)), 403
+
+        post_data = request.get_json() or {}
+        user_ids = post_data.get('users')
+        mode = post_data.get('mode', current_app.config['RECOMMEND_MODE'])
+        if not isinstance(user_ids, list) or \
+                not all(isinstance(user_id, str) for user_id in user_ids):
+            responseObject = {
+                'status': 'fail',
+                'message': 'Provide a list of user ids.'
+            }
+            return make_response(jsonify(responseObject)), 400
+        if mode not in MODES:
+            responseObject = {
+                'status': 'fail',
+                'message': f'Unknown recommendation mode {mode}.'
+            }
+            return make_response(jsonify(responseObject)), 400
+        batch_max = current_app.config[
+            'RECOMMEND_BATCH_MAX_GA' if mode == 'ga' else 'RECOMMEND_BATCH_MAX']
+        if len(user_ids) > batch_max:
+            responseObject = {
+                'status': 'fail',
+                'message': f'At most {batch_max} users per {mode} batch.'
+            }
+            return make_response(jsonify(responseObject)), 400
+
+        params = GAParams.from_config(current_app.config)
+        responseObject = {
+            'status': 'success',
+            'recommendations': recommend_users(user_ids, mode, params)
+        }
+        return make_response(jsonify(responseObject)), 200
+
+
+class RecommendJobsAPI(MethodView):
+    """
+    Background GA job Resource
+    """
+    def post(self):
+        # get auth token
+        auth_header = request.headers.get('Authorization')
+        if auth_header:
+            auth_token = auth_header.split(" ")[0]
+        else:
+            auth_token = ''
+        if not auth_token:
+            responseObject = {
+                'status': 'fail',
+                'message': 'Provide a valid auth token.'
+            }
+            return make_response(jsonify(responseObject)), 401
+        resp, error = User.verify_auth_token(auth_token)
+        if error:
+            responseObject = {
+                'status': 'fail',
+                'message': error
+            }
+            return make_response(jsonify(responseObject)), 401
+
+        try:
+            params = job_params(request.get_json() or {}, current_app.config)
+        except ValueError as e:
+            responseObject = {
+                'status': 'fail',
+                'message': str(e)
+            }
+            return make_response(jsonify(responseObject)), 400
+        settns = UserSettings.from_model(User.load(resp).settings)
+        try:
+            job = job_queue.submit(resp, settns, params)
+        except JobQueueFull as e:
+            responseObject = {
+                'status': 'fail',
+                'message': str(e)
+            }
+            return make_response(jsonify(responseObject)), 503
+        responseObject = job.to_dict()
+        response = make_response(jsonify(responseObject))
+        response.headers['Location'] = f'/recommend/jobs/{job.id}'
+        return response, 202
+
+    def get(self, job_id):
+        # get auth token
+        auth_header = request.headers.get('Authorization')
+        if auth_header:
+            auth_token = auth_header.split(" ")[0]
+        else:
+            auth_token = ''
+        if not auth_token:
+            responseObject = {
+                'status': 'fail',
+                'message': 'Provide a valid auth token.'
+            }
+            return make_response(jsonify(responseObject)), 401
+        resp, error = User.verify_auth_token(auth_token)
+        if error:
+            responseObject = {
+                'status': 'fail',
+                'message': error
+            }
+            return make_response(jsonify(responseObject)), 401
+
+        job = job_queue.get(job_id, resp)
+        if job is None:
+            responseObject = {
+                'status': 'fail',
+                'message': 'Job not found.'
+            }
+            return make_response(jsonify(responseObject)), 404
+        return make_response(jsonify(job.to_dict())), 200
+
+
+class FoodsAPI(MethodView):
+    """
+    Foods Resource: the k foods closest to the user's macro targets,
+    optionally within ?min_kcal= and ?max_kcal=
+    """
+    def get(self):
+        # get auth token
+        auth_header = request.headers.get('Authorization')
+        if auth_header:
+            auth_token = auth_header.split(" ")[0]
+        else:
+            auth_token = ''
+        if not auth_token:
+            responseObject = {
+                'status': 'fail',
+                'message': 'Provide a valid auth token.'
+            }
+            return make_response(jsonify(responseObject)), 401
+        resp, error = User.verify_auth_token(auth_token)
+        if error:
+            responseObject = {
+                'status': 'fail',
+                'message': error
+            }
+            return make_response(jsonify(responseObject)), 401
+
+        try:
+            k, low, high = foods_params(request.args, current_app.config)
+        except ValueError as e:
+            responseObject = {
+                'status': 'fail',
+                'message': str(e)
+            }
+            return make_response(jsonify(responseObject)), 400
+
+        settns = User.load(resp).settings
+        index = catalog.index(settns.preference)
+        indices, distances = index.closest(macro_targets(settns), k, low, high)
+        responseObject = {
+            'foods': [
+                dict(food_response(index.menu, int(i)), distance=float(d))
+                for i, d in zip(indices, distances)
+            ]
+        }
+        return make_response(jsonify(responseObject)), 200
+
+
 class SettingsAPI(MethodView):
     """
     Settings API
@@ -278,10 +476,10 @@ class SettingsAPI(MethodView):
         else:
             auth_token = ''
         if auth_token:
-            resp = User.decode_auth_token(auth_token)
-            if isinstance(resp, str):
+            resp, error = User.verify_auth_token(auth_token)
+            if not error:
 
-                settns = Settings.query.filter_by(id=resp).first()
+                settns = User.load(resp).settings
 
                 responseObject = {
                         'preference': settns.preference,
@@ -305,7 +503,31 @@ class SettingsAPI(MethodView):
             return make_response(jsonify(responseObject)), 401
 
 
+class MetricsAPI(MethodView):
+    """
+    Metrics Resource, Prometheus text format
+    """
+    def get(self):
+        if not current_app.config['METRICS_ENABLED']:
+            responseObject = {
+                'status': 'fail',
+                'message': 'Not found.'
+            }
+            return make_response(jsonify(responseObject)), 404
+        token = current_app.config['METRICS_TOKEN']
+        if token and not hmac.compare_digest(request.headers.get('Authorization', ''), token):
+            responseObject = {
+                'status': 'fail',
+                'message': 'Provide a valid metrics token.'
+            }
+            return make_response(jsonify(responseObject)), 401
+        response = make_response(request_metrics.render())
+        response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+        return response, 200
+
+
 auth_blueprint = Blueprint('auth', __name__)
+request_metrics.init_blueprint(auth_blueprint, exclude=('/metrics',))
 
 # define the API resources
 registration_view = RegisterAPI.as_view('register_api')
@@ -313,7 +535,11 @@ user_view = UserAPI.as_view('user_api')
 login_view = LoginAPI.as_view('login_api')
 logout_view = LogoutAPI.as_view('logout_api')
 recommend_view = RecommendAPI.as_view('recommend_api')
+batch_recommend_view = BatchRecommendAPI.as_view('batch_recommend_api')
+recommend_jobs_view = RecommendJobsAPI.as_view('recommend_jobs_api')
+foods_view = FoodsAPI.as_view('foods_api')
 settings_view = SettingsAPI.as_view("settings_api")
+metrics_view = MetricsAPI.as_view('metrics_api')
 
 # add Rules for API Endpoints
 auth_blueprint.add_url_rule(
@@ -346,8 +572,38 @@ auth_blueprint.add_url_rule(
     methods=['GET']
 )
 
+auth_blueprint.add_url_rule(
+    '/recommend/batch',
+    view_func=batch_recommend_view,
+    methods=['POST']
+)
+
+auth_blueprint.add_url_rule(
+    '/recommend/jobs',
+    view_func=recommend_jobs_view,
+    methods=['POST']
+)
+
+auth_blueprint.add_url_rule(
+    '/recommend/jobs/<job_id>',
+    view_func=recommend_jobs_view,
+    methods=['GET']
+)
+
+auth_blueprint.add_url_rule(
+    '/foods',
+    view_func=foods_view,
+    methods=['GET']
+)
+
 auth_blueprint.add_url_rule(
     '/settings',
     view_func=settings_view,
     methods=["GET"]
 )
+
+auth_blueprint.add_url_rule(
+    '/metrics',
+    view_func=metrics_view,
+    methods=['GET']
+)
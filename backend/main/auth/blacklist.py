@@ -0,0 +1,190 @@
+import datetime
+import hashlib
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def token_hash(token):
+    """
+    The blacklist stores a sha256 of the token, never the token itself
+    :return: 64 character hex string
+    """
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class BloomFilter:
+    """
+    Probabilistic set of token hashes: no false negatives, false
+    positives at about error_rate while holding up to capacity items
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = max(int(capacity), 1)
+        self.error_rate = error_rate
+        self.size = math.ceil(-self.capacity*math.log(error_rate)/math.log(2)**2)
+        self.hashes = max(1, round(self.size/self.capacity*math.log(2)))
+        self.bits = bytearray((self.size + 7)//8)
+        self.count = 0
+
+    def _positions(self, hashed):
+        # double hashing over two independent halves of the sha256
+        h1 = int(hashed[:16], 16)
+        h2 = int(hashed[16:32], 16) | 1
+        return ((h1 + i*h2) % self.size for i in range(self.hashes))
+
+    def add(self, hashed):
+        for position in self._positions(hashed):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, hashed):
+        return all(self.bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(hashed))
+
+
+class TokenBlacklist:
+    """
+    In-memory front for the bad_token table
+
+    Lookups are answered by a bloom filter and only reach the database
+    when the filter reports a possible hit. Every refresh_interval
+    seconds the filter picks up rows written by other processes: rows
+    blacklisted since the newest one seen, minus overlap seconds because
+    concurrent writers may commit out of order. The filter is rebuilt
+    from the whole table every rebuild_interval seconds, which also
+    bounds how long a row outside the overlap window could be missed.
+    Expired rows are deleted by prune(), either from a background
+    thread, see start_pruner, or by `manage.py prune_tokens`.
+    """
+
+    def __init__(self, model, session, refresh_interval, rebuild_interval, overlap,
+                 capacity, error_rate, timer=time.monotonic):
+        self.model = model
+        self.session = session
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self.overlap = datetime.timedelta(seconds=overlap)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.timer = timer
+        self._lock = threading.Lock()
+        self._bloom = None
+        self._seen_until = None
+        self._built_at = None
+        self._refreshed_at = None
+        self._pruner = None
+
+    def _rows(self, since=None):
+        query = self.session.query(self.model.token_hash, self.model.blacklisted_on)
+        if since is not None:
+            query = query.filter(self.model.blacklisted_on >= since - self.overlap)
+        return query.all()
+
+    def refresh(self, force=False):
+        """
+        Adds rows blacklisted since the last refresh to the filter. A
+        rebuilt filter is only published once it is complete, so
+        concurrent readers never see a partially filled one.
+        :return: the current BloomFilter
+        """
+        now = self.timer()
+        bloom, refreshed_at = self._bloom, self._refreshed_at
+        if bloom is not None and refreshed_at is not None and not force \
+                and now - refreshed_at < self.refresh_interval:
+            return bloom
+        with self._lock:
+            bloom, seen_until = self._bloom, self._seen_until
+            rebuild = bloom is None or now - self._built_at >= self.rebuild_interval
+            rows = self._rows(None if rebuild else seen_until)
+            if not rebuild and bloom.count + len(rows) > bloom.capacity:
+                # grow rather than let the false positive rate climb
+                rebuild = True
+                rows = self._rows()
+            if rebuild:
+                bloom = BloomFilter(max(self.capacity, 2*len(rows)), self.error_rate)
+                seen_until = None
+                self._built_at = now
+            for hashed, blacklisted_on in rows:
+                # rows of the overlap window are read again
+                if hashed not in bloom:
+                    bloom.add(hashed)
+                if seen_until is None or blacklisted_on > seen_until:
+                    seen_until = blacklisted_on
+            self._bloom, self._seen_until, self._refreshed_at = bloom, seen_until, now
+            return bloom
+
+    def contains(self, token):
+        """
+        :return: boolean, True if the token is blacklisted
+        """
+        hashed = token_hash(token)
+        if hashed not in self.refresh():
+            return False
+        return self.model.query.filter_by(token_hash=hashed).first() is not None
+
+    def add(self, token, expires_on):
+        """
+        Blacklists a token until expires_on
+        """
+        self.session.add(self.model(token=token, expires_on=expires_on))
+        self.session.commit()
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(token_hash(token))
+
+    def prune(self, now=None):
+        """
+        Deletes rows whose token has expired anyway and rebuilds the filter
+        :return: number of rows deleted
+        """
+        now = now or datetime.datetime.utcnow()
+        deleted = self.model.query.filter(self.model.expires_on < now) \
+            .delete(synchronize_session=False)
+        self.session.commit()
+        with self._lock:
+            self._bloom = None
+            self._refreshed_at = None
+        return deleted
+
+    def start_pruner(self, interval, context):
+        """
+        Prunes every interval seconds in a daemon thread
+        context -> callable returning the app context the thread runs in,
+                   e.g. app.app_context
+        """
+        if self._pruner is None:
+            self._pruner = TokenPruner(self, interval, context)
+            self._pruner.start()
+        return self._pruner
+
+    def stop_pruner(self):
+        if self._pruner is not None:
+            self._pruner.stop()
+            self._pruner = None
+
+
+class TokenPruner(threading.Thread):
+    """ Background thread deleting expired rows of a TokenBlacklist """
+
+    def __init__(self, blacklist, interval, context):
+        super().__init__(name='token-pruner', daemon=True)
+        self.blacklist = blacklist
+        self.interval = interval
+        self.context = context
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                with self.context():
+                    deleted = self.blacklist.prune()
+                logger.info('Pruned %d expired tokens', deleted)
+            except Exception:
+                logger.exception('Token blacklist prune failed')
+
+    def stop(self):
+        self._stopped.set()
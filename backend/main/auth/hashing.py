@@ -0,0 +1,88 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class HashingBusy(Exception):
+    """ Raised when max_pending hashes are already queued or running """
+
+
+def hash_rounds(pw_hash):
+    """
+    Reads the cost out of a bcrypt hash such as $2b$12$...
+    :return: integer
+    """
+    if isinstance(pw_hash, bytes):
+        pw_hash = pw_hash.decode()
+    return int(pw_hash.split('$')[2])
+
+
+def benchmark_rounds(bcrypt, target_ms, min_rounds=4, max_rounds=16, password='benchmark'):
+    """
+    Picks the highest cost whose hash still takes at most target_ms
+    on this machine, never less than min_rounds
+    :return: (rounds, {rounds: milliseconds})
+    """
+    timings = {}
+    rounds = min_rounds
+    for candidate in range(min_rounds, max_rounds + 1):
+        start = time.perf_counter()
+        bcrypt.generate_password_hash(password, candidate)
+        timings[candidate] = (time.perf_counter() - start)*1000
+        if timings[candidate] > target_ms:
+            break
+        rounds = candidate
+    return rounds, timings
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a bounded pool of worker threads. bcrypt releases the
+    GIL, so at most `workers` hashes burn CPU at once while other requests
+    keep being served. The calling thread still waits for its hash, so
+    max_pending is the backpressure: callers beyond it get HashingBusy
+    right away instead of queueing behind a login burst.
+
+    bcrypt -> flask_bcrypt.Bcrypt instance
+    workers -> hashing threads, keep it below the number of cores
+    max_pending -> hashes allowed to queue or run at once
+    """
+
+    def __init__(self, bcrypt, workers, max_pending):
+        self.bcrypt = bcrypt
+        self.workers = workers
+        self.max_pending = max_pending
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix='bcrypt')
+
+    def _run(self, fn, *args):
+        if not self._pending.acquire(blocking=False):
+            raise HashingBusy('Too many password hashes in flight.')
+        try:
+            future = self._pool.submit(fn, *args)
+        except Exception:
+            self._pending.release()
+            raise
+        future.add_done_callback(lambda f: self._pending.release())
+        return future.result()
+
+    def hash(self, password, rounds):
+        """
+        :return: string
+        """
+        return self._run(self.bcrypt.generate_password_hash, password, rounds).decode()
+
+    def check(self, pw_hash, password):
+        """
+        :return: boolean
+        """
+        return self._run(self.bcrypt.check_password_hash, pw_hash, password)
+
+    def needs_rehash(self, pw_hash, rounds):
+        """
+        :return: boolean, True if pw_hash was made with another cost
+        """
+        return hash_rounds(pw_hash) != rounds
+
+    def shutdown(self):
+        self._pool.shutdown()
@@ -0,0 +1,168 @@
+import statistics
+import time
+import tracemalloc
+
+import numpy as np
+
+from main.alg.geneticAlgo.fitness import MenuArrays
+from main.alg.geneticAlgo.genetic_algorithm import (
+    genInfo, createInitialPopu, rankDishes, selection, crossover,
+    mutatePopulation, geneticAlgorithm)
+
+## GA benchmarks
+#
+# Times the genetic operators and whole runs over synthetic menus so
+# regressions show up as numbers and hardware can be sized. Every
+# measurement is a dict so results can be written as json lines.
+
+DISH_SIZES = (100, 1000, 10000, 100000)
+POPULATION_SIZES = (50, 200)
+OPERATORS = ('createInitialPopu', 'rankDishes', 'selection', 'crossover', 'mutatePopulation')
+
+
+def cuisine_names(count):
+    """
+    The cuisines of genInfo.json, padded with made up ones
+    :return: list of count names
+    """
+    names = list(genInfo['cuisines'])[:count]
+    return names + [f'cuisine{i}' for i in range(len(names), count)]
+
+
+def synthetic_menu(dishes, cuisines=None, seed=0):
+    """
+    Random menu with ratings 1-5 and prices 50-500 over the given
+    number of cuisines (default: those of genInfo.json)
+    :return: (MenuArrays, cuisineScore)
+    """
+    rng = np.random.default_rng(seed)
+    names = cuisine_names(cuisines or len(genInfo['cuisines']))
+    menu = MenuArrays(
+        range(dishes),
+        rng.integers(50, 501, dishes),
+        rng.integers(1, 6, dishes),
+        rng.integers(0, len(names), dishes),
+        names,
+    )
+    score = rng.dirichlet(np.ones(len(names)))
+    return menu, dict(zip(names, score.tolist()))
+
+
+def measure(fn, repeat):
+    """
+    Runs fn repeat times for timing, then once more under tracemalloc
+    :return: (median seconds, peak bytes allocated by one call)
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return statistics.median(timings), peak
+
+
+def benchmark_operators(dishes, population, cuisines=None, max_dishes=10,
+                        elite=2, mutation_rate=0.2, repeat=5, seed=0):
+    """
+    Times each operator of one generation on a population of the
+    given size
+    :return: list of result dicts, one per operator
+    """
+    menu, cuisine_score = synthetic_menu(dishes, cuisines, seed)
+    rng = np.random.default_rng(seed)
+    popu = createInitialPopu(max_dishes, population, menu, rng)
+    ranked = rankDishes(popu, cuisine_score, max_dishes, menu)
+    pool = selection(ranked, elite, rng=rng)
+    children = crossover(pool, popu, elite, rng)
+    calls = dict(
+        createInitialPopu=lambda: createInitialPopu(max_dishes, population, menu, rng),
+        rankDishes=lambda: rankDishes(popu, cuisine_score, max_dishes, menu),
+        selection=lambda: selection(ranked, elite, rng=rng),
+        crossover=lambda: crossover(pool, popu, elite, rng),
+        # mutates in place, so work on a fresh copy each time
+        mutatePopulation=lambda: mutatePopulation(children.copy(), elite, mutation_rate, rng),
+    )
+    results = []
+    for operator in OPERATORS:
+        seconds, peak = measure(calls[operator], repeat)
+        results.append({
+            'benchmark': operator,
+            'dishes': dishes,
+            'population': population,
+            'cuisines': len(menu.cuisines),
+            'seconds': seconds,
+            'chromosomes_per_sec': population/max(seconds, 1e-9),
+            'peak_bytes': peak,
+        })
+    return results
+
+
+def benchmark_run(dishes, population, generations=50, cuisines=None, max_dishes=10,
+                  elite=2, mutation_rate=0.2, seed=0):
+    """
+    Times a full geneticAlgorithm run and records its best fitness
+    after every generation
+    :return: result dict, curve being a list of (seconds, best fitness)
+    """
+    menu, cuisine_score = synthetic_menu(dishes, cuisines, seed)
+    curve = []
+    start = time.perf_counter()
+
+    def progress(generation, best_fitness):
+        curve.append((time.perf_counter() - start, float(best_fitness)))
+
+    answer = geneticAlgorithm(
+        max_dishes, population, cuisine_score, elite, mutation_rate,
+        generations, menu, seed=seed, verbose=False, progress=progress)
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    try:
+        geneticAlgorithm(
+            max_dishes, population, cuisine_score, elite, mutation_rate,
+            generations, menu, seed=seed, verbose=False)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # every generation ranks the population, plus the final ranking
+    evaluated = population*(answer.generations + 1)
+    return {
+        'benchmark': 'geneticAlgorithm',
+        'dishes': dishes,
+        'population': population,
+        'cuisines': len(menu.cuisines),
+        'generations': answer.generations,
+        'seconds': seconds,
+        'chromosomes_per_sec': evaluated/seconds,
+        'peak_bytes': peak,
+        'fitness': float(answer.fitness),
+        'curve': curve,
+    }
+
+
+def run_suite(dish_sizes=DISH_SIZES, population_sizes=POPULATION_SIZES,
+              generations=50, cuisines=None, repeat=5, seed=0):
+    """
+    Operator and full run benchmarks over every menu and population size
+    :return: generator of result dicts
+    """
+    for dishes in dish_sizes:
+        for population in population_sizes:
+            yield from benchmark_operators(
+                dishes, population, cuisines, repeat=repeat, seed=seed)
+            yield benchmark_run(dishes, population, generations, cuisines, seed=seed)
+
+
+def format_result(result):
+    """
+    :return: one line summary of a result dict
+    """
+    return (f"{result['benchmark']:<18} dishes={result['dishes']:<7} "
+            f"population={result['population']:<5} {result['seconds']*1000:10.3f} ms "
+            f"{result['chromosomes_per_sec']:14.0f} chrom/s "
+            f"peak={result['peak_bytes']/2**20:8.2f} MiB")
@@ -0,0 +1,225 @@
+import json
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+
+from main.config import engine_options
+
+## HTTP load test
+#
+# Registers synthetic users, then replays a weighted mix of login,
+# status, settings and recommend requests from several threads and
+# reports throughput and latency percentiles per route. Requests go
+# either to the Flask app in-process (test client) or to a server.
+
+DEFAULT_MIX = dict(login=1, status=3, settings=2, recommend=4)
+PREFERENCES = ('vegan', 'vegetarian', 'mixed_food')
+PASSWORD = 'load-test'
+
+
+class InProcessClient:
+    """ Sends requests to a Flask app through its test client """
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None, token=None):
+        """
+        :return: (status code, decoded json body or None)
+        """
+        headers = dict(Authorization=token) if token else {}
+        response = self.client.open(
+            path, method=method, headers=headers,
+            data=None if body is None else json.dumps(body),
+            content_type='application/json')
+        try:
+            data = json.loads(response.data.decode())
+        except ValueError:
+            data = None
+        return response.status_code, data
+
+
+class HttpClient:
+    """ Sends requests to a running server, e.g. http://127.0.0.1:5000 """
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def request(self, method, path, body=None, token=None):
+        """
+        :return: (status code, decoded json body or None)
+        """
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = token
+        request = urllib.request.Request(
+            self.base_url + path, method=method, headers=headers,
+            data=None if body is None else json.dumps(body).encode())
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                status, raw = response.status, response.read()
+        except urllib.error.HTTPError as e:
+            status, raw = e.code, e.read()
+        try:
+            data = json.loads(raw.decode())
+        except ValueError:
+            data = None
+        return status, data
+
+
+@contextmanager
+def scratch_database(app, db):
+    """
+    Points app at a throwaway SQLite database while the block runs, so
+    in-process load tests never register users in the configured one
+    """
+    saved = {key: app.config.get(key)
+             for key in ('SQLALCHEMY_DATABASE_URI', 'SQLALCHEMY_ENGINE_OPTIONS')}
+    with tempfile.TemporaryDirectory() as directory:
+        uri = 'sqlite:///' + os.path.join(directory, 'load_test.db')
+        app.config.update(SQLALCHEMY_DATABASE_URI=uri, SQLALCHEMY_ENGINE_OPTIONS=engine_options(uri))
+        try:
+            db.create_all()
+            yield
+        finally:
+            db.session.remove()
+            db.get_engine().dispose()
+            app.config.update(saved)
+
+
+def register_users(client, count, prefix=None):
+    """
+    Registers count synthetic users with distinct emails
+    :return: list of dicts with email and token
+    """
+    prefix = prefix or uuid.uuid4().hex[:8]
+    users = []
+    for i in range(count):
+        email = f'loadtest-{prefix}-{i}@example.com'
+        status, data = client.request('POST', '/auth/register', dict(
+            fullname=f'Load Test {i}', email=email, age=30, password=PASSWORD,
+            gender=i % 2, preference=PREFERENCES[i % len(PREFERENCES)]))
+        if status != 201:
+            raise RuntimeError(f'registering {email} failed with {status}: {data}')
+        users.append(dict(email=email, token=data['token']))
+    return users
+
+
+def route_request(route, user, recommend_mode=None):
+    """
+    :return: (method, path, body, token) of one request of route
+    """
+    if route == 'login':
+        return 'POST', '/auth/login', dict(email=user['email'], password=PASSWORD), None
+    if route == 'status':
+        return 'GET', '/status', None, user['token']
+    if route == 'settings':
+        return 'GET', '/settings', None, user['token']
+    if route == 'recommend':
+        path = '/recommend' + (f'?mode={recommend_mode}' if recommend_mode else '')
+        return 'GET', path, None, user['token']
+    raise ValueError(f'unknown route {route}')
+
+
+def percentile(ordered, p):
+    """
+    Nearest-rank percentile of an already sorted list
+    :return: value
+    """
+    if not ordered:
+        return None
+    rank = max(1, math.ceil(p/100.0*len(ordered)))
+    return ordered[rank - 1]
+
+
+def run_load(make_client, users, requests, concurrency, mix=None,
+             recommend_mode=None, seed=0):
+    """
+    Sends requests drawn from mix (route -> weight) from concurrency
+    threads, each with its own client from make_client()
+    :return: report dict, see summarize
+    """
+    mix = mix or DEFAULT_MIX
+    routes = list(mix)
+    weights = [mix[route] for route in routes]
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    remaining = [requests]
+
+    def worker(n):
+        client = make_client()
+        rand = random.Random(seed + n)
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            route = rand.choices(routes, weights)[0]
+            method, path, body, token = route_request(
+                route, rand.choice(users), recommend_mode)
+            start = time.perf_counter()
+            status, _ = client.request(method, path, body, token)
+            latency = time.perf_counter() - start
+            with lock:
+                samples[route].append(latency)
+                if status >= 400:
+                    errors[route] += 1
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(samples, errors, time.perf_counter() - start)
+
+
+def summarize(samples, errors, seconds):
+    """
+    :return: dict with overall throughput and, per route, the request
+             count, error count, throughput and p50/p95/p99 latency in ms
+    """
+    routes = {}
+    for route, latencies in sorted(samples.items()):
+        ordered = sorted(latencies)
+        routes[route] = {
+            'requests': len(ordered),
+            'errors': errors.get(route, 0),
+            'requests_per_sec': len(ordered)/seconds,
+            'p50_ms': percentile(ordered, 50)*1000,
+            'p95_ms': percentile(ordered, 95)*1000,
+            'p99_ms': percentile(ordered, 99)*1000,
+        }
+    total = sum(route['requests'] for route in routes.values())
+    return {
+        'seconds': seconds,
+        'requests': total,
+        'requests_per_sec': total/seconds if seconds else 0.0,
+        'routes': routes,
+    }
+
+
+def format_report(report):
+    """
+    :return: printable table of a report
+    """
+    lines = [f"{report['requests']} requests in {report['seconds']:.2f} s "
+             f"({report['requests_per_sec']:.1f} req/s)",
+             f"{'route':<10} {'requests':>8} {'errors':>6} {'req/s':>9} "
+             f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"]
+    for route, stats in report['routes'].items():
+        lines.append(
+            f"{route:<10} {stats['requests']:>8} {stats['errors']:>6} "
+            f"{stats['requests_per_sec']:>9.1f} {stats['p50_ms']:>9.2f} "
+            f"{stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}")
+    return '\n'.join(lines)
@@ -0,0 +1,385 @@
+import json
+import logging
+import math
+import os
+import threading
+from types import MappingProxyType
+
+import numpy as np
+
+from main.catalog.columnar import ColumnarError, NameTable, map_columns, write_columns
+from main.catalog.nutrient_index import NutrientIndex
+
+logger = logging.getLogger(__name__)
+
+NAME_FIELD = 'Food Name'
+COMPILED_SUFFIX = '.cat'
+NUTRIENT_FIELDS = (
+    'Energy (kJ)',
+    'Energy (kCal)',
+    'Water (g)',
+    'Protein (g)',
+    'Fat (g)',
+    'Carbohydrate (g)',
+    'Fibre (g)',
+    'Ash (g)',
+)
+
+
+class CatalogError(Exception):
+    """ Raised when a menu dataset is missing or malformed """
+
+
+class MenuTable:
+    """
+    Read-only, column oriented view of one menu dataset
+
+    names -> sequence of food names, index matches the dataset order
+    columns -> mapping of nutrient field to a read-only numpy array
+    """
+    __slots__ = ('preference', 'names', 'columns')
+
+    def __init__(self, preference, names, columns):
+        self.preference = preference
+        self.names = names if isinstance(names, NameTable) else tuple(names)
+        for values in columns.values():
+            values.flags.writeable = False
+        self.columns = MappingProxyType(dict(columns))
+
+    @classmethod
+    def from_records(cls, preference, records):
+        """
+        Validates the records of a dataset and packs them into columns
+        :return: MenuTable
+        """
+        if not isinstance(records, list) or not records:
+            raise CatalogError(f'{preference}: expected a non-empty list of foods')
+        names = []
+        values = {field: [] for field in NUTRIENT_FIELDS}
+        for i, record in enumerate(records):
+            if not isinstance(record, dict):
+                raise CatalogError(f'{preference}[{i}]: expected an object')
+            name = record.get(NAME_FIELD)
+            if not isinstance(name, str) or not name:
+                raise CatalogError(f'{preference}[{i}]: missing "{NAME_FIELD}"')
+            names.append(name)
+            for field in NUTRIENT_FIELDS:
+                value = record.get(field)
+                if isinstance(value, bool) or not isinstance(value, (int, float)) \
+                        or not math.isfinite(value):
+                    raise CatalogError(f'{preference}[{i}]: invalid "{field}"')
+                values[field].append(value)
+        columns = {field: np.asarray(column) for field, column in values.items()}
+        return cls(preference, names, columns)
+
+    def __len__(self):
+        return len(self.names)
+
+    def column(self, field):
+        return self.columns[field]
+
+    def record(self, index):
+        """
+        Rebuilds a single food in the same shape as the json dataset
+        :return: dict
+        """
+        food = {NAME_FIELD: self.names[index]}
+        for field, column in self.columns.items():
+            food[field] = column[index].item()
+        return food
+
+
+def load_menu(preference, path):
+    """
+    Reads and validates one json dataset
+    :return: MenuTable
+    """
+    try:
+        with open(path) as menu_data:
+            records = json.load(menu_data)
+    except (OSError, ValueError) as e:
+        raise CatalogError(f'{preference}: could not read {path}: {e}')
+    return MenuTable.from_records(preference, records)
+
+
+def source_description(path):
+    """
+    What a compiled dataset records about the json it was built from
+    :return: dict|None
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return dict(file=os.path.basename(path), size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+
+
+def compile_menu(preference, source_path, path):
+    """
+    Validates a json dataset and writes it in the compiled format
+    :return: MenuTable read from the json
+    """
+    menu = load_menu(preference, source_path)
+    write_columns(path, menu.names, menu.columns, source_description(source_path))
+    return menu
+
+
+def load_compiled(preference, path, source_path=None):
+    """
+    Maps a compiled dataset. It is stale, and None is returned, when the
+    json at source_path changed since it was compiled.
+    :return: MenuTable|None
+    """
+    try:
+        header, names, columns = map_columns(path)
+    except ColumnarError as e:
+        raise CatalogError(f'{preference}: {e}')
+    if source_path is not None:
+        source = source_description(source_path)
+        if source is not None and source != header.get('source'):
+            return None
+    missing = [field for field in NUTRIENT_FIELDS if field not in columns]
+    if missing:
+        raise CatalogError(f'{preference}: {path} has no "{missing[0]}" column')
+    return MenuTable(preference, names, {field: columns[field] for field in NUTRIENT_FIELDS})
+
+
+def cuisine_assignment(tables):
+    """
+    Assigns every food to the strictest dataset that contains it (e.g. a
+    food listed in vegan.json is a 'vegan' dish even when served from
+    mixed_food.json), these act as the GA cuisines.
+    :return: (cuisines, dict of preference -> read-only array of the
+             cuisine index of every food)
+    """
+    cuisines = tuple(sorted(tables, key=lambda preference: len(tables[preference])))
+    names = {preference: list(table.names) for preference, table in tables.items()}
+    cuisine_of = {}
+    for i, preference in reversed(list(enumerate(cuisines))):
+        for name in names[preference]:
+            cuisine_of[name] = i
+    cuisine_index = {}
+    for preference, menu_names in names.items():
+        index = np.fromiter((cuisine_of[name] for name in menu_names),
+                            dtype=np.intp, count=len(menu_names))
+        index.flags.writeable = False
+        cuisine_index[preference] = index
+    return cuisines, cuisine_index
+
+
+class CatalogSnapshot:
+    """
+    Immutable set of menus together with the file signatures they were
+    built from. A snapshot is swapped as a whole, never modified in place.
+    """
+    __slots__ = ('tables', 'indexes', 'cuisines', 'cuisine_index', 'signatures', 'version')
+
+    def __init__(self, tables, signatures, version):
+        self.tables = MappingProxyType(tables)
+        self.indexes = MappingProxyType(
+            {preference: NutrientIndex(table) for preference, table in tables.items()})
+        cuisines, cuisine_index = cuisine_assignment(tables)
+        self.cuisines = cuisines
+        self.cuisine_index = MappingProxyType(cuisine_index)
+        self.signatures = MappingProxyType(signatures)
+        self.version = version
+
+
+def file_signature(path):
+    """
+    Cheap change detector for a dataset file
+    :return: tuple|None
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+class FoodCatalog:
+    """
+    Holds every menu dataset in memory so requests never touch the disk.
+    Datasets are loaded once, either explicitly with load() or on first use,
+    and rebuilt by reload_if_changed() when the files change on disk.
+
+    compiled_directory -> where compile() writes the datasets in the
+                          memory-mapped format; a compiled dataset that
+                          is current is preferred over its json
+    """
+
+    def __init__(self, directory, files, default, compiled_directory=None):
+        self.directory = directory
+        self.files = dict(files)
+        self.default = default
+        self.compiled_directory = compiled_directory
+        self._snapshot = None
+        self._version = 0
+        self._lock = threading.Lock()
+        self._failed_signatures = None
+        self._watcher = None
+
+    def _paths(self):
+        return {
+            preference: os.path.join(self.directory, file_name)
+            for preference, file_name in self.files.items()
+        }
+
+    def compiled_path(self, preference):
+        file_name = os.path.splitext(self.files[preference])[0] + COMPILED_SUFFIX
+        return os.path.join(self.compiled_directory, file_name)
+
+    def _signatures(self):
+        return {
+            preference: (file_signature(path), self.compiled_directory and
+                         file_signature(self.compiled_path(preference)))
+            for preference, path in self._paths().items()
+        }
+
+    def _load(self, preference, path):
+        if self.compiled_directory:
+            compiled_path = self.compiled_path(preference)
+            if os.path.exists(compiled_path):
+                try:
+                    menu = load_compiled(preference, compiled_path, path)
+                except CatalogError as e:
+                    logger.warning('Ignoring compiled dataset, loading the json: %s', e)
+                else:
+                    if menu is not None:
+                        return menu
+                    logger.warning('%s is older than %s, loading the json', compiled_path, path)
+        return load_menu(preference, path)
+
+    def _build(self):
+        # take the signatures before reading so a write racing with the
+        # read is picked up again on the next check
+        signatures = self._signatures()
+        tables = {}
+        for preference, path in self._paths().items():
+            tables[preference] = self._load(preference, path)
+        if self.default not in tables:
+            raise CatalogError(f'default preference {self.default} has no dataset')
+        self._version += 1
+        return CatalogSnapshot(tables, signatures, self._version)
+
+    def load(self):
+        """
+        Loads every dataset, raising CatalogError if any of them is invalid
+        """
+        with self._lock:
+            self._snapshot = self._build()
+        return self
+
+    def compile(self):
+        """
+        Writes every json dataset in the compiled format
+        :return: dict of preference -> compiled file path
+        """
+        if not self.compiled_directory:
+            raise CatalogError('no directory configured for compiled datasets')
+        os.makedirs(self.compiled_directory, exist_ok=True)
+        compiled = {}
+        for preference, path in self._paths().items():
+            compiled[preference] = self.compiled_path(preference)
+            compile_menu(preference, path, compiled[preference])
+        return compiled
+
+    def reload_if_changed(self):
+        """
+        Rebuilds the catalog in the calling thread when a dataset changed on
+        disk and swaps it in. Readers keep using the previous snapshot until
+        the new one is complete; an invalid dataset leaves it in place.
+        :return: boolean, True if a new snapshot was swapped in
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            # nothing served yet, the first lookup reads the current files
+            return False
+        signatures = self._signatures()
+        if signatures == dict(snapshot.signatures) \
+                or signatures == self._failed_signatures:
+            return False
+        with self._lock:
+            try:
+                new_snapshot = self._build()
+            except CatalogError as e:
+                self._failed_signatures = signatures
+                logger.warning('Keeping previous food catalog: %s', e)
+                return False
+            self._failed_signatures = None
+            self._snapshot = new_snapshot
+        logger.info('Reloaded food catalog from %s', self.directory)
+        return True
+
+    def start_watcher(self, interval):
+        """
+        Polls the dataset files every interval seconds in a daemon thread
+        """
+        if self._watcher is None:
+            self._watcher = CatalogWatcher(self, interval)
+            self._watcher.start()
+        return self._watcher
+
+    def stop_watcher(self):
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+
+    @property
+    def snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = self._build()
+                snapshot = self._snapshot
+        return snapshot
+
+    @property
+    def tables(self):
+        return self.snapshot.tables
+
+    @property
+    def version(self):
+        """ Increases every time a new snapshot is swapped in """
+        return self.snapshot.version
+
+    def preferences(self):
+        return tuple(self.tables)
+
+    def get(self, preference):
+        """
+        Returns the menu for a preference, falling back to the default
+        :return: MenuTable
+        """
+        tables = self.tables
+        return tables.get(preference, tables[self.default])
+
+    def index(self, preference):
+        """
+        Returns the nutrient index for a preference, falling back to the
+        default; index.menu is the matching MenuTable
+        :return: NutrientIndex
+        """
+        indexes = self.snapshot.indexes
+        return indexes.get(preference, indexes[self.default])
+
+
+class CatalogWatcher(threading.Thread):
+    """ Background thread reloading a FoodCatalog when its files change """
+
+    def __init__(self, catalog, interval):
+        super().__init__(name='catalog-watcher', daemon=True)
+        self.catalog = catalog
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.catalog.reload_if_changed()
+            except Exception:
+                logger.exception('Food catalog reload failed')
+
+    def stop(self):
+        self._stopped.set()
@@ -0,0 +1,156 @@
+import json
+import os
+import struct
+import tempfile
+from collections.abc import Sequence
+
+import numpy as np
+
+## Compiled catalog format
+#
+# One file per dataset, mapped read-only with np.memmap so every worker
+# process shares the same physical pages and opening a dataset costs the
+# same whatever its size. Layout, all little-endian:
+#
+#   MAGIC                       8 bytes
+#   header length               uint64
+#   header                      utf-8 json, see write_columns
+#   padding to ALIGNMENT
+#   one block per column        n values of the column's dtype
+#   name offsets                n + 1 int64, byte offsets into the blob
+#   name blob                   the utf-8 encoded names back to back
+#
+# Every block starts at a multiple of ALIGNMENT.
+
+MAGIC = b'EATCAT1\n'
+ALIGNMENT = 64
+VERSION = 1
+
+
+class ColumnarError(Exception):
+    """ Raised when a compiled dataset is unreadable """
+
+
+class NameTable(Sequence):
+    """
+    Read-only sequence of strings decoded on access from a utf-8 blob
+    and the n + 1 offsets delimiting its entries
+    """
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        index = int(index)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('name index out of range')
+        start, end = int(self.offsets[index]), int(self.offsets[index + 1])
+        return bytes(self.blob[start:end]).decode('utf-8')
+
+
+def _aligned(offset):
+    return -(-offset//ALIGNMENT)*ALIGNMENT
+
+
+def write_columns(path, names, columns, source=None):
+    """
+    Writes names and columns (field -> 1-d array) to path, replacing it
+    atomically so a reader never maps a half written file
+    source -> json serializable description of the dataset compiled,
+              stored in the header
+    """
+    count = len(names)
+    encoded = [name.encode('utf-8') for name in names]
+    name_offsets = np.zeros(count + 1, dtype='<i8')
+    np.cumsum([len(name) for name in encoded], out=name_offsets[1:])
+    blocks = []
+    for field, values in columns.items():
+        values = np.asarray(values)
+        if values.shape != (count,):
+            raise ColumnarError(f'column {field} has {values.shape} values, expected {count}')
+        blocks.append((field, values.astype(values.dtype.newbyteorder('<'), copy=False)))
+    layout = []
+    position = 0
+    for field, values in blocks:
+        layout.append(dict(field=field, dtype=values.dtype.str, offset=position))
+        position = _aligned(position + values.nbytes)
+    names_layout = dict(offsets=position, blob=_aligned(position + name_offsets.nbytes),
+                        size=int(name_offsets[-1]))
+    header = json.dumps(dict(
+        version=VERSION, count=count, columns=layout, names=names_layout, source=source
+    )).encode('utf-8')
+    data_start = _aligned(len(MAGIC) + 8 + len(header))
+    data = [(entry['offset'], values.tobytes()) for entry, (_, values) in zip(layout, blocks)]
+    data.append((names_layout['offsets'], name_offsets.tobytes()))
+    data.append((names_layout['blob'], b''.join(encoded)))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.catalog-')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            out.write(MAGIC + struct.pack('<Q', len(header)) + header)
+            for offset, raw in data:
+                out.write(b'\0'*(data_start + offset - out.tell()))
+                out.write(raw)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def read_header(path):
+    """
+    Reads only the header of a compiled dataset
+    :return: dict
+    """
+    try:
+        with open(path, 'rb') as compiled:
+            prefix = compiled.read(len(MAGIC) + 8)
+            if len(prefix) != len(MAGIC) + 8 or prefix[:len(MAGIC)] != MAGIC:
+                raise ColumnarError(f'{path} is not a compiled catalog')
+            length, = struct.unpack('<Q', prefix[len(MAGIC):])
+            header = json.loads(compiled.read(length).decode('utf-8'))
+    except (OSError, ValueError) as e:
+        raise ColumnarError(f'could not read {path}: {e}')
+    if header.get('version') != VERSION:
+        raise ColumnarError(f'{path} has format version {header.get("version")}, expected {VERSION}')
+    header['data_start'] = _aligned(len(MAGIC) + 8 + length)
+    return header
+
+
+def map_columns(path):
+    """
+    Maps a compiled dataset without copying it
+    :return: (header, NameTable, dict of field -> read-only array)
+    """
+    header = read_header(path)
+    try:
+        mapped = np.memmap(path, dtype=np.uint8, mode='r')
+    except (OSError, ValueError) as e:
+        raise ColumnarError(f'could not map {path}: {e}')
+    count = header['count']
+    start = header['data_start']
+
+    def block(offset, dtype, length):
+        dtype = np.dtype(dtype)
+        begin = start + offset
+        end = begin + dtype.itemsize*length
+        if end > len(mapped):
+            raise ColumnarError(f'{path} is truncated')
+        return np.asarray(mapped[begin:end]).view(dtype)
+
+    columns = {entry['field']: block(entry['offset'], entry['dtype'], count)
+               for entry in header['columns']}
+    names = header['names']
+    offsets = block(names['offsets'], '<i8', count + 1)
+    blob = block(names['blob'], np.uint8, names['size'])
+    return header, NameTable(offsets, blob), columns
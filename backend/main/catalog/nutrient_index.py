@@ -0,0 +1,140 @@
+import heapq
+
+import numpy as np
+
+MACRO_FIELDS = ('Protein (g)', 'Carbohydrate (g)', 'Fat (g)')
+ENERGY_FIELD = 'Energy (kCal)'
+# nutrients compared when telling foods apart, kJ duplicates kCal
+PROFILE_FIELDS = (
+    'Energy (kCal)', 'Water (g)', 'Protein (g)', 'Fat (g)',
+    'Carbohydrate (g)', 'Fibre (g)', 'Ash (g)',
+)
+
+
+class KDTree:
+    """
+    Static KD-tree over a (n x d) array, splitting at the median of the
+    widest dimension until at most leaf_size points are left. Leaves are
+    contiguous slices of the reordered points so they are scanned with
+    one vectorized distance computation; a dataset smaller than
+    leaf_size is a single leaf.
+    """
+
+    def __init__(self, points, leaf_size=32):
+        points = np.asarray(points, dtype=np.float64)
+        self.leaf_size = max(int(leaf_size), 1)
+        order = np.arange(len(points))
+        # node -> (dim, split, left, right) for splits, (-1, start, end) for leaves
+        self.nodes = []
+        self.root = self._build(points, order, 0, len(points))
+        self.order = order
+        self.points = np.ascontiguousarray(points[order])
+
+    def _build(self, points, order, start, end):
+        node = len(self.nodes)
+        if end - start <= self.leaf_size:
+            self.nodes.append((-1, start, end))
+            return node
+        self.nodes.append(None)
+        chunk = points[order[start:end]]
+        dim = int(np.argmax(chunk.max(axis=0) - chunk.min(axis=0)))
+        order[start:end] = order[start:end][np.argsort(chunk[:, dim], kind='stable')]
+        mid = (start + end)//2
+        split = points[order[mid], dim]
+        left = self._build(points, order, start, mid)
+        right = self._build(points, order, mid, end)
+        self.nodes[node] = (dim, split, left, right)
+        return node
+
+    def __len__(self):
+        return len(self.order)
+
+    def query(self, target, k):
+        """
+        :return: (indices, distances) of the k nearest points, nearest
+                 first, lower index first on ties
+        """
+        target = np.asarray(target, dtype=np.float64)
+        k = min(int(k), len(self))
+        if k <= 0:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        # max-heap of the best k as (-distance², -index)
+        best = []
+        stack = [self.root]
+        while stack:
+            node = self.nodes[stack.pop()]
+            if node[0] == -1:
+                _, start, end = node
+                dist = np.square(self.points[start:end] - target).sum(axis=1)
+                ids = self.order[start:end]
+                nearest = np.lexsort((ids, dist))[:k]
+                for d, i in zip(dist[nearest].tolist(), ids[nearest].tolist()):
+                    if len(best) < k:
+                        heapq.heappush(best, (-d, -i))
+                    elif (-d, -i) > best[0]:
+                        heapq.heapreplace(best, (-d, -i))
+                    else:
+                        # the rest of this leaf is further away
+                        break
+                continue
+            dim, split, left, right = node
+            diff = target[dim] - split
+            near, far = (left, right) if diff < 0 else (right, left)
+            # the far side can only hold closer points if the splitting
+            # plane is within the current k-th distance
+            if len(best) < k or diff*diff <= -best[0][0]:
+                stack.append(far)
+            stack.append(near)
+        best.sort(reverse=True)
+        indices = np.array([-i for _, i in best], dtype=np.intp)
+        distances = np.sqrt([-d for d, _ in best])
+        return indices, distances
+
+
+class NutrientIndex:
+    """
+    Lookup structures for one menu, built once when the catalog loads:
+    a KD-tree over the protein/carb/fat vector of every food and the
+    foods sorted by calories for range queries. Indices refer to menu.
+
+    profiles -> nutrients of every food scaled to zero mean and unit
+                variance, used to measure how alike two foods are
+    """
+
+    def __init__(self, menu, leaf_size=32):
+        self.menu = menu
+        self.macros = np.column_stack([menu.column(field) for field in MACRO_FIELDS]) \
+            .astype(np.float64)
+        self.tree = KDTree(self.macros, leaf_size)
+        kcal = menu.column(ENERGY_FIELD)
+        self.kcal_order = np.argsort(kcal, kind='stable')
+        self.kcal_sorted = np.ascontiguousarray(kcal[self.kcal_order])
+        profiles = np.column_stack([menu.column(field) for field in PROFILE_FIELDS]) \
+            .astype(np.float64)
+        spread = profiles.std(axis=0)
+        spread[spread == 0] = 1.0
+        self.profiles = (profiles - profiles.mean(axis=0))/spread
+
+    def __len__(self):
+        return len(self.kcal_order)
+
+    def kcal_range(self, low=None, high=None):
+        """
+        :return: indices of the foods with low <= kCal <= high, by kCal
+        """
+        start = 0 if low is None else np.searchsorted(self.kcal_sorted, low, side='left')
+        end = len(self) if high is None else np.searchsorted(self.kcal_sorted, high, side='right')
+        return self.kcal_order[start:max(start, end)]
+
+    def closest(self, targets, k=1, low=None, high=None):
+        """
+        Foods nearest to the protein/carb/fat targets, optionally only
+        among those with low <= kCal <= high
+        :return: (indices, distances), nearest first
+        """
+        if low is None and high is None:
+            return self.tree.query(targets, k)
+        candidates = np.sort(self.kcal_range(low, high))
+        dist = np.linalg.norm(self.macros[candidates] - np.asarray(targets, dtype=np.float64), axis=1)
+        order = np.lexsort((candidates, dist))[:max(int(k), 0)]
+        return candidates[order], dist[order]
@@ -3,9 +3,134 @@ import os
 basedir = os.path.abspath(os.path.dirname(__file__))
 
 
+def engine_options(uri):
+    """
+    SQLAlchemy engine options for the database at uri. SQLite gets a
+    connection pool too (Flask-SQLAlchemy would open a new connection
+    per checkout otherwise) and waits for locks via the busy timeout
+    set in SQLITE_PRAGMAS instead of failing with "database is locked".
+    :return: dict for SQLALCHEMY_ENGINE_OPTIONS
+    """
+    options = dict(
+        pool_size=int(os.getenv('DATABASE_POOL_SIZE', 5)),
+        max_overflow=int(os.getenv('DATABASE_MAX_OVERFLOW', 10)),
+        pool_recycle=int(os.getenv('DATABASE_POOL_RECYCLE', 1800)),
+    )
+    if not uri.startswith('sqlite'):
+        options['pool_pre_ping'] = True
+        return options
+    if uri in ('sqlite://', 'sqlite:///:memory:'):
+        # Flask-SQLAlchemy keeps a single shared connection for these
+        return {}
+    from sqlalchemy.pool import QueuePool
+    options.update(
+        poolclass=QueuePool,
+        connect_args=dict(check_same_thread=False),
+    )
+    return options
+
+
 class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'key')
     DEBUG = False
+    # food catalog datasets, keyed by user preference
+    CATALOG_DIR = os.getenv('CATALOG_DIR', os.path.dirname(basedir))
+    CATALOG_FILES = dict(
+        vegan='vegan.json',
+        vegetarian='vegetarian.json',
+        mixed_food='mixed_food.json',
+    )
+    CATALOG_DEFAULT = 'mixed_food'
+    # datasets compiled by `manage.py build_catalog`, memory-mapped in
+    # place of the json when they are current
+    CATALOG_COMPILED_DIR = os.getenv(
+        'CATALOG_COMPILED_DIR', os.path.join(CATALOG_DIR, 'compiled'))
+    CATALOG_PRELOAD = False
+    # seconds between checks for changed datasets, 0 disables the watcher
+    CATALOG_WATCH_INTERVAL = float(os.getenv('CATALOG_WATCH_INTERVAL', 0))
+    # 'random' picks a random food, 'ga' runs the genetic algorithm
+    # under RECOMMEND_GA_BUDGET_MS, 'closest' looks up the food nearest
+    # to the user's macro targets; ?mode= overrides it per request
+    RECOMMEND_MODE = os.getenv('RECOMMEND_MODE', 'random')
+    # ?mode=topk returns k foods matching the user's targets; diversity
+    # in [0, 1] trades closeness to the targets for variety
+    RECOMMEND_TOPK_DEFAULT = 10
+    RECOMMEND_TOPK_MAX = 50
+    RECOMMEND_TOPK_DIVERSITY = 0.3
+    # GET /foods: foods nearest to the user's targets within a kCal range
+    FOODS_DEFAULT_K = 10
+    FOODS_MAX_K = 100
+    RECOMMEND_GA_BUDGET_MS = float(os.getenv('RECOMMEND_GA_BUDGET_MS', 50))
+    RECOMMEND_GA_GENERATIONS = None
+    RECOMMEND_GA_MAX_DISHES = 3
+    RECOMMEND_GA_POPULATION = 30
+    RECOMMEND_GA_ELITE = 2
+    RECOMMEND_GA_MUTATION_RATE = 0.2
+    RECOMMEND_BATCH_MAX = 10000
+    # every distinct profile of a 'ga' batch runs the GA within the
+    # request, larger GA batches go through `manage.py recommend_all`
+    RECOMMEND_BATCH_MAX_GA = 100
+    # background GA jobs (POST /recommend/jobs): worker threads, jobs
+    # allowed to queue before answering 503, seconds results are kept
+    # and how many finished jobs are kept at most
+    RECOMMEND_JOB_WORKERS = int(os.getenv('RECOMMEND_JOB_WORKERS', 2))
+    RECOMMEND_JOB_MAX_PENDING = int(os.getenv('RECOMMEND_JOB_MAX_PENDING', 32))
+    RECOMMEND_JOB_TTL = float(os.getenv('RECOMMEND_JOB_TTL', 600))
+    RECOMMEND_JOB_MAX_FINISHED = int(os.getenv('RECOMMEND_JOB_MAX_FINISHED', 256))
+    RECOMMEND_JOB_GENERATIONS = 100
+    RECOMMEND_JOB_MAX_GENERATIONS = 2000
+    RECOMMEND_JOB_MAX_POPULATION = 1000
+    RECOMMEND_JOB_MAX_DISHES = 50
+    # ASGI serving (main/asgi.py): threads for database and token work,
+    # processes for 'ga' recommendations, None for one per CPU
+    ASGI_THREADS = int(os.getenv('ASGI_THREADS', 32))
+    ASGI_PROCESSES = int(os.getenv('ASGI_PROCESSES', 0)) or None
+    # recommendation results cache, RECOMMEND_CACHE_SIZE = 0 disables it
+    RECOMMEND_CACHE_SIZE = int(os.getenv('RECOMMEND_CACHE_SIZE', 4096))
+    RECOMMEND_CACHE_TTL = float(os.getenv('RECOMMEND_CACHE_TTL', 300))
+    RECOMMEND_CACHE_SEED_BUCKETS = 8
+    # verified auth tokens are trusted without a blacklist query for this
+    # many seconds; a logout in another process takes up to that long to
+    # be seen here. AUTH_TOKEN_CACHE_SIZE = 0 disables the cache.
+    AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', 10000))
+    AUTH_TOKEN_CACHE_TTL = float(os.getenv('AUTH_TOKEN_CACHE_TTL', 60))
+    AUTH_TOKEN_MAX_AGE = 21*24*3600 + 5
+    # logouts from other processes reach the in-memory blacklist filter
+    # within BLACKLIST_REFRESH_INTERVAL seconds
+    BLACKLIST_REFRESH_INTERVAL = float(os.getenv('BLACKLIST_REFRESH_INTERVAL', 5))
+    # rows committed out of order are caught by re-reading the last
+    # BLACKLIST_REFRESH_OVERLAP seconds, and by a full rebuild every
+    # BLACKLIST_REBUILD_INTERVAL seconds.
+    BLACKLIST_REFRESH_OVERLAP = float(os.getenv('BLACKLIST_REFRESH_OVERLAP', 60))
+    BLACKLIST_REBUILD_INTERVAL = float(os.getenv('BLACKLIST_REBUILD_INTERVAL', 600))
+    # seconds between deletions of expired rows by a background thread of
+    # every process, 0 disables it: then schedule `manage.py prune_tokens`
+    # (e.g. hourly from cron) or the bad_token table grows without bound
+    BLACKLIST_PRUNE_INTERVAL = float(os.getenv('BLACKLIST_PRUNE_INTERVAL', 0))
+    BLACKLIST_BLOOM_CAPACITY = 100000
+    BLACKLIST_BLOOM_ERROR_RATE = 0.001
+    # bcrypt cost, `python manage.py bcrypt_rounds` suggests one for this
+    # machine. Stored hashes are upgraded on login when it changes.
+    BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))
+    # hashing threads, half the cores so a login burst leaves the rest to
+    # the GA and other requests. Requests still wait for their hash;
+    # BCRYPT_MAX_PENDING is what sheds load, answering 503 beyond it.
+    BCRYPT_WORKERS = int(os.getenv('BCRYPT_WORKERS', max(1, (os.cpu_count() or 1)//2)))
+    BCRYPT_MAX_PENDING = int(os.getenv('BCRYPT_MAX_PENDING', 64))
+    # GET /metrics answers 404 unless METRICS_ENABLED=1; with a
+    # METRICS_TOKEN, scrapers must send it as the Authorization header
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', '0') == '1'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # applied to every new SQLite connection, see main/model/sqlite.py.
+    # WAL lets readers run alongside the single writer and the busy
+    # timeout (ms) makes concurrent writers wait instead of failing.
+    SQLITE_PRAGMAS = dict(
+        journal_mode='WAL',
+        synchronous='NORMAL',
+        busy_timeout=int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)),
+        foreign_keys='ON',
+    )
 
 
 class DevelopmentConfig(Config):
@@ -13,19 +138,30 @@ class DevelopmentConfig(Config):
     # SQLALCHEMY_DATABASE_URI = postgres_local_base
     DEBUG = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'eatright.db')
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    CATALOG_WATCH_INTERVAL = float(os.getenv('CATALOG_WATCH_INTERVAL', 2))
+    BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', 10))
+    METRICS_ENABLED = True
 
 
 class TestingConfig(Config):
     DEBUG = True
     TESTING = True
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'eatright.db')
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'eatright_test.db')
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
     PRESERVE_CONTENT_ON_EXCEPTION = False
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    BCRYPT_LOG_ROUNDS = 4
+    METRICS_ENABLED = True
 
 
 class ProductionConfig(Config):
     DEBUG = False
+    SQLALCHEMY_DATABASE_URI = os.getenv(
+        'DATABASE_URL', 'sqlite:///' + os.path.join(basedir, 'eatright.db'))
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    CATALOG_PRELOAD = True
+    CATALOG_WATCH_INTERVAL = float(os.getenv('CATALOG_WATCH_INTERVAL', 30))
+    BLACKLIST_PRUNE_INTERVAL = float(os.getenv('BLACKLIST_PRUNE_INTERVAL', 3600))
 
 config_by_name = dict(
     dev=DevelopmentConfig,
@@ -0,0 +1,209 @@
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(f'{name}="{value}"' for name, value in labels)
+    return '{' + pairs + '}'
+
+
+class Histogram:
+    """
+    Prometheus style histogram, one series per label tuple
+
+    buckets -> increasing upper bounds, +Inf is implied
+    """
+
+    def __init__(self, name, help, label_names, buckets):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0]*len(self.buckets), 0, 0.0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            series[1] += 1
+            series[2] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, (counts, count, total) in sorted(self._series.items()):
+                named = list(zip(self.label_names, labels))
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket'
+                                 f'{format_labels(named + [("le", bound)])} {bucket_count}')
+                lines.append(f'{self.name}_bucket{format_labels(named + [("le", "+Inf")])} {count}')
+                lines.append(f'{self.name}_count{format_labels(named)} {count}')
+                lines.append(f'{self.name}_sum{format_labels(named)} {total!r}')
+        return lines
+
+
+class Counter:
+    """ Prometheus style counter, one series per label tuple """
+
+    def __init__(self, name, help, label_names):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self._series = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, labels, value=1):
+        with self._lock:
+            self._series[labels] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._series.items()):
+                lines.append(f'{self.name}{format_labels(zip(self.label_names, labels))} {value!r}')
+        return lines
+
+
+class RequestMetrics:
+    """
+    Request level metrics of a blueprint: latency, status codes, the
+    database queries and their time per request and the time spent in
+    bcrypt and JWT. Queries and auth timings are attributed to the
+    request being served on the calling thread.
+
+    Requests served outside the blueprint, like the native /recommend
+    of the ASGI app, report their latency and status through observe()
+    and are left out of the per request query metrics.
+    """
+
+    def __init__(self):
+        self.latency = Histogram(
+            'http_request_duration_seconds', 'Request latency.',
+            ('method', 'route'), LATENCY_BUCKETS)
+        self.responses = Counter(
+            'http_responses_total', 'Responses by status code.', ('method', 'route', 'status'))
+        self.queries = Histogram(
+            'db_queries_per_request', 'Database queries issued by one request.',
+            ('route',), QUERY_BUCKETS)
+        self.query_time = Histogram(
+            'db_query_duration_seconds_per_request', 'Database time of one request.',
+            ('route',), LATENCY_BUCKETS)
+        self.auth_time = Histogram(
+            'auth_operation_duration_seconds', 'Time spent hashing passwords and handling JWTs.',
+            ('operation',), LATENCY_BUCKETS)
+        self.collectors = []
+        self.exclude = frozenset()
+
+    def init_blueprint(self, blueprint, exclude=()):
+        """
+        exclude -> routes left out of the metrics, e.g. the scrape itself
+        """
+        self.exclude = frozenset(exclude)
+        blueprint.before_request(self.before_request)
+        blueprint.after_request(self.after_request)
+
+    def before_request(self):
+        if request.url_rule is not None and request.url_rule.rule in self.exclude:
+            return
+        g.metrics_started = time.perf_counter()
+        g.metrics_queries = 0
+        g.metrics_query_time = 0.0
+
+    def after_request(self, response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        self.observe(request.method, route, response.status_code, time.perf_counter() - started)
+        self.queries.observe((route,), g.pop('metrics_queries', 0))
+        self.query_time.observe((route,), g.pop('metrics_query_time', 0.0))
+        return response
+
+    def observe(self, method, route, status, seconds):
+        """
+        Records the latency and status code of one request
+        """
+        self.latency.observe((method, route), seconds)
+        self.responses.inc((method, route, str(status)))
+
+    @contextmanager
+    def timed(self, operation):
+        """
+        Records the time of the enclosed block as an auth operation
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.auth_time.observe((operation,), time.perf_counter() - start)
+
+    def watch_queries(self):
+        """
+        Counts every SQL statement run during a request of the blueprint
+        """
+        @event.listens_for(Engine, 'before_cursor_execute')
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+        @event.listens_for(Engine, 'after_cursor_execute')
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            started = conn.info.get('metrics_started')
+            if not started:
+                return
+            elapsed = time.perf_counter() - started.pop()
+            if has_request_context() and 'metrics_started' in g:
+                g.metrics_queries += 1
+                g.metrics_query_time += elapsed
+
+    def add_collector(self, collector):
+        """
+        collector -> callable returning extra exposition lines
+        """
+        self.collectors.append(collector)
+
+    def render(self):
+        """
+        :return: every metric in the Prometheus text format
+        """
+        lines = []
+        for metric in (self.latency, self.responses, self.queries, self.query_time, self.auth_time):
+            lines += metric.render()
+        for collector in self.collectors:
+            lines += collector()
+        return '\n'.join(lines) + '\n'
+
+
+def cache_collector(caches):
+    """
+    caches -> dict of name -> TTLCache
+    :return: collector exposing the stats() of every cache
+    """
+    def collect():
+        lines = []
+        for stat, kind in (('hits', 'counter'), ('misses', 'counter'),
+                           ('evictions', 'counter'), ('expirations', 'counter'),
+                           ('size', 'gauge')):
+            suffix = '_total' if kind == 'counter' else ''
+            name = f'cache_{stat}{suffix}'
+            lines += [f'# HELP {name} TTLCache {stat}.', f'# TYPE {name} {kind}']
+            for cache_name, cache in sorted(caches.items()):
+                lines.append(f'{name}{{cache="{cache_name}"}} {cache.stats()[stat]}')
+        return lines
+    return collect
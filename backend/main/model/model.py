@@ -1,31 +1,86 @@
 import jwt
+import time
 import uuid
 import datetime
-from main import db, bcrypt, app
+from main import db, app, password_hasher, request_metrics, token_cache, blacklist_cache
+from main.auth.blacklist import TokenBlacklist, token_hash
+
+BAD_TOKEN = 'Token is bad. Please log in again.'
+EXPIRED_TOKEN = 'Signature expired. Please log in again.'
+INVALID_TOKEN = 'Invalid token. Please log in again.'
+
+
+def token_str(auth_token):
+    if isinstance(auth_token, bytes):
+        return auth_token.decode()
+    return str(auth_token)
+
 
 class BadToken(db.Model):
 
     __tablename__ = "bad_token"
 
     id = db.Column(db.Integer, autoincrement=True, primary_key=True)
-    token = db.Column(db.String, unique=True)
+    token_hash = db.Column(db.String(64), unique=True, index=True, nullable=False)
     blacklisted_on = db.Column(db.DateTime, nullable=False)
+    expires_on = db.Column(db.DateTime, index=True, nullable=False)
 
-    def __init__(self, token):
-        self.token = token
-        self.blacklisted_on = datetime.datetime.now()
+    def __init__(self, token, expires_on=None):
+        self.token_hash = token_hash(token_str(token))
+        # utc so processes on other hosts agree, TokenBlacklist.refresh
+        # reads new rows by this column
+        self.blacklisted_on = datetime.datetime.utcnow()
+        self.expires_on = expires_on or datetime.datetime.utcnow() + \
+            datetime.timedelta(seconds=app.config.get('AUTH_TOKEN_MAX_AGE'))
     
     def __repr__(self):
-        return f'<token: {self.token}>'
+        return f'<token: {self.token_hash}>'
     
     @staticmethod
-    def check_token(auth_token):
-        res = BadToken.query.filter_by(token=str(auth_token)).first()
-        if res:
+    def check_token(auth_token, expires_in=None):
+        """
+        Checks the blacklist, remembering blacklisted tokens in process
+        :param expires_in: seconds until the token expires
+        :return: boolean
+        """
+        token = token_str(auth_token)
+        if blacklist_cache.get(token):
+            return True
+        if token_blacklist.contains(token):
+            blacklist_cache.set(token, True, expires_in)
             return True
         else:
             return False
 
+    @staticmethod
+    def blacklist(auth_token):
+        """
+        Stores the token in the blacklist until it expires and drops it
+        from the verified token cache of this process
+        """
+        token = token_str(auth_token)
+        try:
+            payload = jwt.decode(token, app.config.get('SECRET_KEY'),
+                                 options={'verify_exp': False})
+            expires_on = datetime.datetime.utcfromtimestamp(payload['exp'])
+        except (jwt.InvalidTokenError, KeyError):
+            expires_on = None
+        token_blacklist.add(token, expires_on)
+        token_cache.pop(token)
+        blacklist_cache.set(token, True)
+
+
+token_blacklist = TokenBlacklist(
+    BadToken, db.session,
+    app.config.get('BLACKLIST_REFRESH_INTERVAL'),
+    app.config.get('BLACKLIST_REBUILD_INTERVAL'),
+    app.config.get('BLACKLIST_REFRESH_OVERLAP'),
+    app.config.get('BLACKLIST_BLOOM_CAPACITY'),
+    app.config.get('BLACKLIST_BLOOM_ERROR_RATE')
+)
+if app.config.get('BLACKLIST_PRUNE_INTERVAL'):
+    token_blacklist.start_pruner(app.config['BLACKLIST_PRUNE_INTERVAL'], app.app_context)
+
 class User(db.Model):
     """ User Model for storing user related details """
     __tablename__ = "users"
@@ -38,18 +93,43 @@ class User(db.Model):
     registered_on = db.Column(db.DateTime, nullable=False)
     admin = db.Column(db.Boolean, nullable=False, default=False)
     gender = db.Column(db.Integer)
+    settings = db.relationship('Settings', uselist=False, backref='user',
+                               cascade='all, delete-orphan')
 
     def __init__(self, fullname, email, age, password, gender, admin=False):
         self.id = str(uuid.uuid4())
         self.fullname = fullname
         self.email = email
         self.age = age
-        self.password = bcrypt.generate_password_hash(
-            password, app.config.get('BCRYPT_LOG_ROUNDS')
-        ).decode()
+        with request_metrics.timed('bcrypt'):
+            self.password = password_hasher.hash(
+                password, app.config.get('BCRYPT_LOG_ROUNDS'))
         self.gender = gender
         self.registered_on = datetime.datetime.now()
         self.admin = admin
+
+    def check_password(self, password):
+        """
+        Checks the password and upgrades the stored hash when
+        BCRYPT_LOG_ROUNDS changed since it was made; the caller commits
+        :return: boolean
+        """
+        with request_metrics.timed('bcrypt'):
+            if not password_hasher.check(self.password, password):
+                return False
+            rounds = app.config.get('BCRYPT_LOG_ROUNDS')
+            if password_hasher.needs_rehash(self.password, rounds):
+                self.password = password_hasher.hash(password, rounds)
+        return True
+
+    @staticmethod
+    def load(user_id):
+        """
+        Loads the user together with its settings in a single query
+        :return: User|None
+        """
+        return User.query.options(db.joinedload(User.settings)) \
+            .filter_by(id=user_id).first()
     
     def encode_auth_token(self, user_id):
         """
@@ -58,15 +138,17 @@ class User(db.Model):
         """
         try:
             payload = {
-                'exp': datetime.datetime.utcnow() + datetime.timedelta(days=21, seconds=5),
+                'exp': datetime.datetime.utcnow() + datetime.timedelta(
+                    seconds=app.config.get('AUTH_TOKEN_MAX_AGE')),
                 'iat': datetime.datetime.utcnow(),
                 'sub': user_id
             }
-            return jwt.encode(
-                payload,
-                app.config.get('SECRET_KEY'),
-                algorithm='HS256'
-            )
+            with request_metrics.timed('jwt'):
+                return jwt.encode(
+                    payload,
+                    app.config.get('SECRET_KEY'),
+                    algorithm='HS256'
+                )
         except Exception as e:
             return e
 
@@ -77,23 +159,40 @@ class User(db.Model):
         :param auth_token:
         :return: integer|string
         """
+        user_id, error = User.verify_auth_token(auth_token)
+        return error or user_id
+
+    @staticmethod
+    def verify_auth_token(auth_token):
+        """
+        Decodes the auth token and checks the blacklist. Verified tokens
+        are cached for AUTH_TOKEN_CACHE_TTL seconds, never past their exp.
+        :param auth_token:
+        :return: (user id, None) or (None, error message)
+        """
+        token = token_str(auth_token)
+        user_id = token_cache.get(token)
+        if user_id is not None:
+            return user_id, None
         try:
-            payload = jwt.decode(auth_token, app.config.get('SECRET_KEY'))
-            is_blacklisted_token = BadToken.check_token(auth_token)
-            if is_blacklisted_token:
-                return 'Token is bad. Please log in again.'
-            else:
-                return payload['sub']
+            with request_metrics.timed('jwt'):
+                payload = jwt.decode(token, app.config.get('SECRET_KEY'))
         except jwt.ExpiredSignatureError:
-            return 'Signature expired. Please log in again.'
+            return None, EXPIRED_TOKEN
         except jwt.InvalidTokenError:
-            return 'Invalid token. Please log in again.'
+            return None, INVALID_TOKEN
+        expires_in = payload['exp'] - time.time()
+        if BadToken.check_token(token, expires_in):
+            return None, BAD_TOKEN
+        if expires_in > 0:
+            token_cache.set(token, payload['sub'], min(token_cache.ttl, expires_in))
+        return payload['sub'], None
 
 class Settings(db.Model):
      
     __tablename__ = "settings"
 
-    id = db.Column(db.String(255), primary_key=True)
+    id = db.Column(db.String(255), db.ForeignKey('users.id'), primary_key=True)
     preference = db.Column(db.String(255))
     protein_intake = db.Column(db.Float)
     carb_intake = db.Column(db.Float)
@@ -0,0 +1,20 @@
+import sqlite3
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+def enable_sqlite_pragmas(app):
+    """
+    Runs the SQLITE_PRAGMAS of the app config on every new SQLite
+    connection, whichever engine opened it
+    """
+    @event.listens_for(Engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        for name, value in app.config.get('SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+    return set_pragmas
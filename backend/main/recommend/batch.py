@@ -0,0 +1,70 @@
+from collections import OrderedDict
+
+from main import catalog
+from main.model.model import Settings
+from main.recommend.recommender import (
+    ga_recommendation, random_recommendation, food_response, recommend)
+
+QUERY_CHUNK = 500
+
+
+def settings_profile(settns):
+    """
+    Users with the same profile get the same GA recommendation
+    :return: tuple (preference, protein, carb, fat)
+    """
+    return (settns.preference, settns.protein_intake,
+            settns.carb_intake, settns.fat_intake)
+
+
+def group_by_profile(settings):
+    """
+    :return: OrderedDict of profile -> list of Settings rows
+    """
+    groups = OrderedDict()
+    for settns in settings:
+        groups.setdefault(settings_profile(settns), []).append(settns)
+    return groups
+
+
+def recommend_for_settings(catalog, settings, mode, params, seed=None):
+    """
+    Computes a recommendation for every Settings row. In 'ga' mode the
+    genetic algorithm runs once per profile and its menu arrays are
+    shared by every user of the profile, 'closest' is also computed once
+    per profile; 'random' mode still draws one food per user.
+    :return: dict of user id -> response object
+    """
+    recommendations = {}
+    for profile, members in group_by_profile(settings).items():
+        menu = catalog.get(profile[0])
+        if mode == 'ga':
+            rec, answer = ga_recommendation(catalog, menu, members[0], params, seed)
+            food = food_response(menu, rec)
+            for settns in members:
+                recommendations[settns.id] = food
+        elif mode == 'closest':
+            food = recommend(catalog, members[0], mode, params)
+            for settns in members:
+                recommendations[settns.id] = food
+        else:
+            for settns in members:
+                recommendations[settns.id] = food_response(
+                    menu, random_recommendation(menu, settns))
+    return recommendations
+
+
+def recommend_users(user_ids, mode, params, seed=None):
+    """
+    Loads the settings of all users in bulk and recommends
+    for each of them, users without settings map to None
+    :return: dict of user id -> response object|None
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    settings = []
+    # keep each IN list under SQLite's bound parameter limit
+    for start in range(0, len(user_ids), QUERY_CHUNK):
+        chunk = user_ids[start:start + QUERY_CHUNK]
+        settings.extend(Settings.query.filter(Settings.id.in_(chunk)).all())
+    recommendations = recommend_for_settings(catalog, settings, mode, params, seed)
+    return {user_id: recommendations.get(user_id) for user_id in user_ids}
@@ -0,0 +1,195 @@
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from main.alg.geneticAlgo.genetic_algorithm import geneticAlgorithm
+from main.recommend.recommender import ga_menu
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class JobQueueFull(Exception):
+    """ Raised when max_pending jobs are already queued or running """
+
+
+def job_params(post_data, config):
+    """
+    Validates the GA settings of a job request, missing ones default
+    to the RECOMMEND_GA_* config
+    :return: dict of GA settings
+    :raises ValueError: with a message for the client
+    """
+    limits = dict(
+        maxDishes=(1, config['RECOMMEND_JOB_MAX_DISHES'], config['RECOMMEND_GA_MAX_DISHES']),
+        populationSize=(2, config['RECOMMEND_JOB_MAX_POPULATION'], config['RECOMMEND_GA_POPULATION']),
+        noOfElite=(0, config['RECOMMEND_JOB_MAX_POPULATION'], config['RECOMMEND_GA_ELITE']),
+        generations=(1, config['RECOMMEND_JOB_MAX_GENERATIONS'], config['RECOMMEND_JOB_GENERATIONS']),
+    )
+    params = {}
+    for name, (low, high, default) in limits.items():
+        value = post_data.get(name, default)
+        if not isinstance(value, int) or isinstance(value, bool) or not low <= value <= high:
+            raise ValueError(f'{name} must be an integer between {low} and {high}.')
+        params[name] = value
+    if params['noOfElite'] >= params['populationSize']:
+        raise ValueError('noOfElite must be smaller than populationSize.')
+    mutation_rate = post_data.get('mutationRate', config['RECOMMEND_GA_MUTATION_RATE'])
+    if not isinstance(mutation_rate, (int, float)) or isinstance(mutation_rate, bool) \
+            or not 0 <= mutation_rate <= 1:
+        raise ValueError('mutationRate must be a number between 0 and 1.')
+    params['mutationRate'] = float(mutation_rate)
+    return params
+
+
+class GAJob:
+    """
+    One background genetic algorithm run and its progress
+    """
+
+    def __init__(self, user_id, settns, params):
+        self.id = str(uuid.uuid4())
+        self.user_id = user_id
+        self.settns = settns
+        self.params = params
+        self.status = QUEUED
+        self.generation = 0
+        self.best_fitness = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def progress(self, generation, best_fitness):
+        self.generation = generation
+        self.best_fitness = float(best_fitness)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'progress': {
+                'generation': self.generation,
+                'generations': self.params['generations'],
+                'bestFitness': self.best_fitness
+            },
+            'result': self.result,
+            'error': self.error
+        }
+
+
+class GAJobQueue:
+    """
+    Runs GA jobs on a bounded pool of worker threads. At most
+    max_pending jobs may be queued or running, submit() raises
+    JobQueueFull beyond that. Finished jobs are kept for ttl seconds,
+    and only the max_finished most recent of them.
+
+    catalog -> FoodCatalog the menus come from
+    workers -> worker threads
+    max_pending -> jobs allowed to queue or run at once
+    ttl -> seconds a finished job stays pollable
+    max_finished -> finished jobs kept at most, oldest dropped first
+    """
+
+    def __init__(self, catalog, workers, max_pending, ttl, max_finished=256, timer=time.time):
+        self.catalog = catalog
+        self.workers = workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.max_finished = max_finished
+        self.timer = timer
+        self._jobs = {}
+        # ids of finished jobs, oldest first
+        self._finished = deque()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def submit(self, user_id, settns, params):
+        """
+        settns -> detached UserSettings of the user
+        params -> dict with maxDishes, populationSize, noOfElite,
+                  mutationRate and generations
+        :return: the queued GAJob
+        """
+        job = GAJob(user_id, settns, params)
+        with self._lock:
+            self._expire()
+            if self._pending >= self.max_pending:
+                raise JobQueueFull('Too many recommendation jobs queued, try again later.')
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='ga-job')
+            self._pending += 1
+            self._jobs[job.id] = job
+        self._pool.submit(self._run, job)
+        return job
+
+    def get(self, job_id, user_id):
+        """
+        :return: GAJob|None, only the user who submitted a job sees it
+        """
+        with self._lock:
+            self._expire()
+            job = self._jobs.get(job_id)
+        if job is None or job.user_id != user_id:
+            return None
+        return job
+
+    def _expire(self):
+        now = self.timer()
+        finished = self._finished
+        while finished and (len(finished) > self.max_finished
+                            or now - self._jobs[finished[0]].finished_at > self.ttl):
+            del self._jobs[finished.popleft()]
+
+    def _run(self, job):
+        job.status = RUNNING
+        try:
+            job.result = self.evolve(job)
+            job.status = DONE
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = self.timer()
+            with self._lock:
+                self._pending -= 1
+                self._finished.append(job.id)
+                self._expire()
+
+    def evolve(self, job):
+        """
+        :return: result object with the best chromosome and its dishes
+        """
+        params = job.params
+        menu = self.catalog.get(job.settns.preference)
+        menu_arrays, cuisine_score = ga_menu(self.catalog, menu, job.settns)
+        answer = geneticAlgorithm(
+            params['maxDishes'], params['populationSize'], cuisine_score,
+            params['noOfElite'], params['mutationRate'], params['generations'],
+            menu_arrays, verbose=False, progress=job.progress
+        )
+        chromosome = answer.ans if isinstance(answer.ans, np.ndarray) else None
+        dishes = [] if chromosome is None else [
+            {'food': menu.names[i], 'qty': int(chromosome[i])}
+            for i in np.flatnonzero(chromosome)
+        ]
+        return {
+            'fitness': float(answer.fitness),
+            'generations': answer.generations,
+            'graphPoints': [float(point) for point in answer.graphPoints],
+            'chromosome': None if chromosome is None else chromosome.tolist(),
+            'dishes': dishes
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
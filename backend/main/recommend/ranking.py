@@ -0,0 +1,98 @@
+import numpy as np
+
+from main.recommend.recommender import food_response, macro_targets
+
+# only the most relevant CANDIDATE_FACTOR*k foods are re-ranked
+CANDIDATE_FACTOR = 5
+
+
+def relevance(index, settns):
+    """
+    Scores every food of the index by how close its protein, carb and
+    fat are to the user's targets in one vectorized pass
+    :return: array in (0, 1], 1 meaning the targets are met exactly
+    """
+    distance = np.linalg.norm(index.macros - macro_targets(settns), axis=1)
+    return 1.0/(1.0 + distance)
+
+
+def mmr(profiles, scores, k, diversity):
+    """
+    Maximal marginal relevance: greedily picks the food maximizing
+    (1 - diversity)*score - diversity*(similarity to the foods already
+    picked), so near duplicates of a pick drop down the list.
+    diversity 0 is a plain top-k by score.
+    :return: array of k indices, in pick order
+    """
+    k = min(int(k), len(scores))
+    pool = np.argsort(-scores, kind='stable')[:k*CANDIDATE_FACTOR]
+    pool_scores = scores[pool]
+    pool_profiles = profiles[pool]
+    max_similarity = np.zeros(len(pool))
+    available = np.ones(len(pool), dtype=bool)
+    picked = []
+    for _ in range(k):
+        marginal = (1.0 - diversity)*pool_scores - diversity*max_similarity
+        marginal[~available] = -np.inf
+        # argmax keeps the first maximum, the most relevant on ties
+        j = int(np.argmax(marginal))
+        picked.append(pool[j])
+        available[j] = False
+        similarity = 1.0/(1.0 + np.linalg.norm(pool_profiles - pool_profiles[j], axis=1))
+        np.maximum(max_similarity, similarity, out=max_similarity)
+    return np.array(picked, dtype=np.intp)
+
+
+def top_k_params(args, config):
+    """
+    Parses k and diversity of a topk request, missing ones default to
+    the RECOMMEND_TOPK_* config
+    :return: (k, diversity)
+    :raises ValueError: with a message for the client
+    """
+    max_k = config['RECOMMEND_TOPK_MAX']
+    message = f'k must be between 1 and {max_k}, diversity between 0 and 1.'
+    try:
+        k = int(args.get('k', config['RECOMMEND_TOPK_DEFAULT']))
+        diversity = float(args.get('diversity', config['RECOMMEND_TOPK_DIVERSITY']))
+    except (TypeError, ValueError):
+        raise ValueError(message)
+    if not 1 <= k <= max_k or not 0 <= diversity <= 1:
+        raise ValueError(message)
+    return k, diversity
+
+
+def foods_params(args, config):
+    """
+    Parses k, min_kcal and max_kcal of a foods request, a missing k
+    defaults to FOODS_DEFAULT_K and a missing bound to no bound
+    :return: (k, low, high)
+    :raises ValueError: with a message for the client
+    """
+    max_k = config['FOODS_MAX_K']
+    message = f'k must be an integer between 1 and {max_k}, min_kcal and max_kcal numbers.'
+    try:
+        k = int(args.get('k', config['FOODS_DEFAULT_K']))
+        low, high = (None if args.get(name) is None else float(args.get(name))
+                     for name in ('min_kcal', 'max_kcal'))
+    except (TypeError, ValueError):
+        raise ValueError(message)
+    if not 1 <= k <= max_k or not all(np.isfinite(bound) for bound in (low, high) if bound is not None):
+        raise ValueError(message)
+    return k, low, high
+
+
+def top_k_recommendation(catalog, settns, k, diversity):
+    """
+    The k foods of the user's preference that best match their targets,
+    re-ranked for diversity
+    :return: response object
+    """
+    index = catalog.index(settns.preference)
+    scores = relevance(index, settns)
+    return {
+        'foods': [
+            dict(food_response(index.menu, int(i)), score=float(scores[i]))
+            for i in mmr(index.profiles, scores, k, diversity)
+        ]
+    }
@@ -0,0 +1,223 @@
+import random
+import time
+import zlib
+from collections import namedtuple
+
+import numpy as np
+
+from main.alg.geneticAlgo.fitness import MenuArrays
+from main.alg.geneticAlgo.genetic_algorithm import geneticAlgorithm
+from main.catalog.catalog import cuisine_assignment
+from main.catalog.nutrient_index import MACRO_FIELDS
+
+# share of the cuisine score given to the user's own preference, the
+# rest is split between the other catalog datasets
+PREFERRED_CUISINE_SCORE = 0.9
+# weight of the mean macro closeness of an order in the GA fitness,
+# large enough that closeness to the targets outweighs the cuisine mix
+MACRO_RATING_WEIGHT = 10.0
+
+# 'random' picks a random food, 'ga' runs the genetic algorithm and
+# 'closest' serves the food nearest to the user's macro targets
+MODES = ('random', 'ga', 'closest')
+# modes whose results are cached; 'random' is meant to change every time
+CACHED_MODES = ('ga', 'closest')
+# cached modes whose result depends on the seed and GA parameters
+SEEDED_MODES = ('ga',)
+
+
+class UserSettings(namedtuple('UserSettings', [
+        'id', 'preference', 'protein_intake', 'carb_intake', 'fat_intake'])):
+    """ Detached, picklable copy of a Settings row """
+
+    @classmethod
+    def from_model(cls, settns):
+        return cls(settns.id, settns.preference, settns.protein_intake,
+                   settns.carb_intake, settns.fat_intake)
+
+
+class GAParams(namedtuple('GAParams', [
+        'max_dishes', 'population', 'elite', 'mutation_rate',
+        'generations', 'budget_ms'])):
+    """ Genetic algorithm settings used to serve recommendations """
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config.get('RECOMMEND_GA_MAX_DISHES'),
+            config.get('RECOMMEND_GA_POPULATION'),
+            config.get('RECOMMEND_GA_ELITE'),
+            config.get('RECOMMEND_GA_MUTATION_RATE'),
+            config.get('RECOMMEND_GA_GENERATIONS'),
+            config.get('RECOMMEND_GA_BUDGET_MS'),
+        )
+
+
+def macro_targets(settns):
+    """
+    :return: array of the user's protein, carb and fat intake
+    """
+    return np.array(
+        [settns.protein_intake, settns.carb_intake, settns.fat_intake],
+        dtype=np.float64
+    )
+
+
+def macro_vectors(menu):
+    """
+    :return: (foods x 3) array of protein, carb and fat per food
+    """
+    return np.column_stack([menu.column(field) for field in MACRO_FIELDS])
+
+
+def food_cuisines(catalog, menu):
+    """
+    The GA cuisine of every food of menu, precomputed per catalog
+    snapshot, see catalog.cuisine_assignment
+    :return: (cuisines, array of cuisine index per food)
+    """
+    snapshot = catalog.snapshot
+    if snapshot.tables.get(menu.preference) is menu:
+        return list(snapshot.cuisines), snapshot.cuisine_index[menu.preference]
+    # menu of a snapshot swapped out since it was handed out
+    cuisines, cuisine_index = cuisine_assignment(
+        dict(snapshot.tables, **{menu.preference: menu}))
+    return list(cuisines), cuisine_index[menu.preference]
+
+
+def ga_menu(catalog, menu, settns):
+    """
+    Describes the foods of menu the way the genetic algorithm expects
+    dishes: a food is rated by how close its macros are to the user's
+    intake targets (1 for the closest food down to 0 for the furthest,
+    by rank) and costs its calories. The mean rating of an order is part
+    of its fitness, see MACRO_RATING_WEIGHT.
+    :return: (MenuArrays, cuisineScore)
+    """
+    cuisines, cuisine_idx = food_cuisines(catalog, menu)
+    distance = np.linalg.norm(macro_vectors(menu) - macro_targets(settns), axis=1)
+    rank = np.empty(len(menu))
+    rank[np.argsort(distance, kind='stable')] = np.arange(len(menu))
+    menu_arrays = MenuArrays(
+        range(len(menu)),
+        menu.column('Energy (kCal)'),
+        1.0 - rank/max(len(menu) - 1, 1),
+        cuisine_idx,
+        cuisines,
+        ratingWeight=MACRO_RATING_WEIGHT,
+    )
+    others = (1.0 - PREFERRED_CUISINE_SCORE)/max(len(cuisines) - 1, 1)
+    cuisine_score = {cuisine: others for cuisine in cuisines}
+    cuisine_score[menu.preference] = PREFERRED_CUISINE_SCORE
+    return menu_arrays, cuisine_score
+
+
+def random_recommendation(menu, settns, rand=random):
+    """
+    Picks a random food past the user's intake total
+    :return: index into menu
+    """
+    start_point = int(settns.protein_intake + settns.fat_intake + settns.carb_intake)
+    return rand.randrange(min(start_point, len(menu) - 1), len(menu))
+
+
+def ga_recommendation(catalog, menu, settns, params, seed=None):
+    """
+    Runs the genetic algorithm in anytime mode: it evolves until
+    params.budget_ms is spent (or params.generations are done) and the
+    best chromosome found so far is used.
+    :return: (index into menu, answer of geneticAlgorithm)
+    """
+    menu_arrays, cuisine_score = ga_menu(catalog, menu, settns)
+    answer = geneticAlgorithm(
+        params.max_dishes, params.population, cuisine_score, params.elite,
+        params.mutation_rate, params.generations, menu_arrays, seed=seed,
+        timeBudget=params.budget_ms/1000.0 if params.budget_ms else None,
+        verbose=False
+    )
+    # ans stays -1 when no chromosome had a positive fitness
+    qty = answer.ans if isinstance(answer.ans, np.ndarray) else np.zeros(len(menu), dtype=int)
+    chosen = np.flatnonzero(qty) if qty.any() else np.arange(len(menu))
+    # most ordered food of the best order, closest to the targets on ties
+    best = chosen[np.lexsort((-menu_arrays.rating[chosen], -qty[chosen]))[0]]
+    return int(best), answer
+
+
+def food_response(menu, index):
+    """
+    :return: response object describing one food
+    """
+    food = menu.record(index)
+    return {
+        'food': food["Food Name"],
+        'protein': food["Protein (g)"],
+        'carb': food["Carbohydrate (g)"],
+        'fat': food["Fat (g)"],
+        'energy': food["Energy (kJ)"],
+        'calories': food["Energy (kCal)"],
+        "water": food["Water (g)"],
+        "fibre": food["Fibre (g)"]
+    }
+
+
+def recommend(catalog, settns, mode, params, seed=None):
+    """
+    Computes one recommendation, mode being one of MODES
+    :return: response object
+    """
+    if mode == 'closest':
+        index = catalog.index(settns.preference)
+        indices, distances = index.closest(macro_targets(settns))
+        return food_response(index.menu, int(indices[0]))
+    menu = catalog.get(settns.preference)
+    if mode == 'ga':
+        # anytime genetic algorithm, bounded by params.budget_ms
+        rec, answer = ga_recommendation(catalog, menu, settns, params, seed)
+    else:
+        rec = random_recommendation(menu, settns, random.Random(seed))
+    return food_response(menu, rec)
+
+
+def seed_bucket(user_id, buckets):
+    """
+    Spreads users over a fixed number of seeds so users sharing the same
+    settings still get some variety while results stay cacheable
+    :return: integer in [0, buckets)
+    """
+    return zlib.crc32(str(user_id).encode()) % max(buckets, 1)
+
+
+def recommendation_key(catalog, settns, mode, params, buckets, ttl, now=None):
+    """
+    Everything a recommendation depends on: the settings profile, mode
+    and catalog version, plus for SEEDED_MODES the GA parameters and the
+    seed. The seed combines the user's bucket with the current ttl
+    window, so cached results rotate every ttl seconds instead of
+    pinning a user to one answer. Other modes are deterministic and
+    share one entry per profile.
+    :return: (cache key, seed or None)
+    """
+    key = (settns.preference, settns.protein_intake, settns.carb_intake,
+           settns.fat_intake, mode, catalog.version)
+    if mode not in SEEDED_MODES:
+        return key, None
+    now = time.time() if now is None else now
+    window = int(now // ttl) if ttl > 0 else 0
+    seed = window*max(buckets, 1) + seed_bucket(settns.id, buckets)
+    return key + (params, seed), seed
+
+
+def cached_recommend(cache, catalog, settns, mode, params, buckets):
+    """
+    recommend() behind a TTLCache keyed on recommendation_key(), modes
+    outside CACHED_MODES are always computed afresh
+    :return: response object
+    """
+    if cache.maxsize <= 0 or mode not in CACHED_MODES:
+        return recommend(catalog, settns, mode, params)
+    key, seed = recommendation_key(catalog, settns, mode, params, buckets, cache.ttl)
+    food = cache.get(key)
+    if food is None:
+        food = recommend(catalog, settns, mode, params, seed=seed)
+        cache.set(key, food)
+    return food
@@ -1,11 +1,19 @@
+import contextlib
+import json
 import os
 import unittest
 
 from flask_migrate import Migrate, MigrateCommand
 from flask_script import Manager
 
-from main import app, db
+from main import app, db, bcrypt, catalog
+from main.auth.hashing import benchmark_rounds
+from main.benchmark.ga_benchmark import run_suite, format_result
+from main.benchmark.load_test import (
+	InProcessClient, HttpClient, register_users, run_load, format_report, scratch_database)
 from main.model import model
+from main.recommend.batch import recommend_for_settings
+from main.recommend.recommender import GAParams
 
 
 app.app_context().push()
@@ -20,6 +28,91 @@ manager.add_command('db', MigrateCommand)
 def run():
 	app.run()
 
+@manager.option('-H', '--host', dest='host', default='127.0.0.1')
+@manager.option('-p', '--port', dest='port', type=int, default=5000)
+def run_asgi(host='127.0.0.1', port=5000):
+	""" Serves the app through main.asgi, requires uvicorn """
+	try:
+		import uvicorn
+	except ImportError:
+		print('run_asgi requires uvicorn: pip install uvicorn')
+		return 1
+	from main.asgi import application
+	uvicorn.run(application, host=host, port=port)
+
+@manager.option('-m', '--mode', dest='mode', default=None)
+@manager.option('-o', '--output', dest='output', default='recommendations.jsonl')
+def recommend_all(mode=None, output='recommendations.jsonl'):
+	""" Precomputes a recommendation for every user as json lines """
+	mode = mode or app.config['RECOMMEND_MODE']
+	params = GAParams.from_config(app.config)
+	settings = model.Settings.query.all()
+	recommendations = recommend_for_settings(catalog, settings, mode, params)
+	with open(output, 'w') as out:
+		for user_id, food in recommendations.items():
+			out.write(json.dumps(dict(id=user_id, **food)) + '\n')
+	print(f'{len(recommendations)} recommendations written to {output}')
+
+@manager.command
+def build_catalog():
+	""" Compiles the json datasets into memory-mappable files """
+	for preference, path in catalog.compile().items():
+		print(f'{preference}: {len(catalog.get(preference))} foods -> {path}')
+
+@manager.option('-t', '--target-ms', dest='target_ms', type=float, default=250)
+def bcrypt_rounds(target_ms=250):
+	""" Suggests BCRYPT_LOG_ROUNDS for a target hash time on this machine """
+	rounds, timings = benchmark_rounds(bcrypt, target_ms)
+	for candidate, ms in timings.items():
+		print(f'{candidate:>2} rounds: {ms:8.1f} ms')
+	print(f'BCRYPT_LOG_ROUNDS={rounds}')
+
+@manager.option('-d', '--dishes', dest='dishes', default='100,1000,10000,100000')
+@manager.option('-p', '--population', dest='population', default='50,200')
+@manager.option('-g', '--generations', dest='generations', type=int, default=50)
+@manager.option('-c', '--cuisines', dest='cuisines', type=int, default=None)
+@manager.option('-o', '--output', dest='output', default=None)
+def benchmark_ga(dishes='100,1000,10000,100000', population='50,200', generations=50,
+		cuisines=None, output=None):
+	""" Benchmarks the GA operators and full runs on synthetic menus """
+	results = run_suite(
+		[int(size) for size in dishes.split(',')],
+		[int(size) for size in population.split(',')],
+		generations, cuisines)
+	out = open(output, 'w') if output else None
+	try:
+		for result in results:
+			print(format_result(result))
+			if out:
+				out.write(json.dumps(result) + '\n')
+	finally:
+		if out:
+			out.close()
+
+@manager.option('-n', '--users', dest='users', type=int, default=20)
+@manager.option('-r', '--requests', dest='requests', type=int, default=1000)
+@manager.option('-c', '--concurrency', dest='concurrency', type=int, default=8)
+@manager.option('-u', '--url', dest='url', default=None)
+@manager.option('-m', '--mode', dest='mode', default=None)
+def load_test(users=20, requests=1000, concurrency=8, url=None, mode=None):
+	""" Load tests the API in-process on a throwaway database, or the server at --url """
+	if url:
+		make_client = lambda: HttpClient(url)
+		database = contextlib.nullcontext()
+	else:
+		make_client = lambda: InProcessClient(app)
+		database = scratch_database(app, db)
+	with database:
+		registered = register_users(make_client(), users)
+		report = run_load(make_client, registered, requests, concurrency, recommend_mode=mode)
+	print(format_report(report))
+
+@manager.command
+def prune_tokens():
+	""" Deletes blacklisted tokens that have expired anyway """
+	deleted = model.token_blacklist.prune()
+	print(f'{deleted} expired tokens pruned')
+
 @manager.command
 def test():
 	""" Runs the unit tests """
@@ -0,0 +1,33 @@
+from flask_testing import TestCase
+
+from main import app, db, token_cache, blacklist_cache
+
+
+class DatabaseTestCase(TestCase):
+    """
+    Tests against a fresh in-memory database and empty token caches
+
+    app_config -> overrides applied on top of TestingConfig, undone
+                  once the test is over
+    """
+
+    app_config = {}
+
+    def create_app(self):
+        app.config.from_object('main.config.TestingConfig')
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+        app.config.update(self.app_config)
+        return app
+
+    def setUp(self):
+        db.create_all()
+        token_cache.clear()
+        blacklist_cache.clear()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        if self.app_config:
+            # only once the in-memory database is gone
+            app.config.from_object('main.config.TestingConfig')
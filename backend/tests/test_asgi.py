@@ -0,0 +1,110 @@
+import asyncio
+import json
+import unittest
+
+from main import app, db, catalog, recommendation_cache, request_metrics
+from main.asgi import AsyncApp
+from main.model.model import User, Settings
+from tests.helpers import DatabaseTestCase
+
+
+def http_scope(method, path, token=None, query=b''):
+    headers = [(b'content-type', b'application/json')]
+    if token:
+        headers.append((b'authorization', token.encode()))
+    return {
+        'type': 'http', 'method': method, 'path': path,
+        'query_string': query, 'headers': headers,
+    }
+
+
+class TestAsyncApp(DatabaseTestCase):
+
+    app_config = dict(RECOMMEND_GA_BUDGET_MS=None, RECOMMEND_GA_GENERATIONS=3)
+
+    def setUp(self):
+        super().setUp()
+        recommendation_cache.clear()
+        user = User('Malea', 'malea@gmail.com', 30, '123456', 1)
+        user.settings = Settings(user.id, 'vegan', 19.0, 5.0, 2.0)
+        db.session.add(user)
+        db.session.commit()
+        self.token = user.encode_auth_token(user.id).decode()
+        self.asgi = AsyncApp(app, 4, 1)
+
+    def tearDown(self):
+        self.asgi.shutdown()
+        super().tearDown()
+
+    def request(self, scope, body=b''):
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(self.asgi(scope, receive, send))
+        start, response = messages
+        return start['status'], json.loads(response['body'].decode())
+
+    def test_recommend_matches_flask(self):
+        # cached modes are seeded, so both servers compute the same answer
+        for mode in (b'ga', b'closest'):
+            status, food = self.request(
+                http_scope('GET', '/recommend', self.token, b'mode=' + mode))
+            self.assertEqual(status, 200)
+            recommendation_cache.clear()
+            expected = self.client.get(
+                '/recommend?mode=' + mode.decode(), headers=dict(Authorization=self.token))
+            self.assertEqual(food, json.loads(expected.data.decode()))
+        status, food = self.request(http_scope('GET', '/recommend', self.token, b'mode=random'))
+        self.assertEqual(status, 200)
+        self.assertIn(food['food'], catalog.get('vegan').names)
+
+    def test_recommend_topk(self):
+        status, data = self.request(
+            http_scope('GET', '/recommend', self.token, b'mode=topk&k=3'))
+        expected = self.client.get('/recommend?mode=topk&k=3', headers=dict(Authorization=self.token))
+        self.assertEqual((status, data), (200, json.loads(expected.data.decode())))
+        # both servers reject a malformed k the same way
+        status, data = self.request(
+            http_scope('GET', '/recommend', self.token, b'mode=topk&k=abc'))
+        expected = self.client.get('/recommend?mode=topk&k=abc', headers=dict(Authorization=self.token))
+        self.assertEqual((status, data), (400, json.loads(expected.data.decode())))
+
+    def test_recommend_errors(self):
+        status, _ = self.request(http_scope('GET', '/recommend'))
+        self.assertEqual(status, 401)
+        status, _ = self.request(http_scope('GET', '/recommend', 'garbage'))
+        self.assertEqual(status, 401)
+        status, _ = self.request(http_scope('GET', '/recommend', self.token, b'mode=best'))
+        self.assertEqual(status, 400)
+
+    def test_recommend_is_measured(self):
+        def count(series):
+            matching = [line for line in request_metrics.render().splitlines()
+                        if line.startswith(series + ' ')]
+            return float(matching[0].rsplit(' ', 1)[1]) if matching else 0.0
+
+        ok = 'http_responses_total{method="GET",route="/recommend",status="200"}'
+        denied = 'http_responses_total{method="GET",route="/recommend",status="401"}'
+        latency = 'http_request_duration_seconds_count{method="GET",route="/recommend"}'
+        before = [count(series) for series in (ok, denied, latency)]
+        self.request(http_scope('GET', '/recommend', self.token, b'mode=closest'))
+        self.request(http_scope('GET', '/recommend'))
+        after = [count(series) for series in (ok, denied, latency)]
+        self.assertEqual([b - a for a, b in zip(before, after)], [1, 1, 2])
+
+    def test_other_routes_go_to_flask(self):
+        status, profile = self.request(http_scope('GET', '/status', self.token))
+        self.assertEqual((status, profile['username']), (200, 'Malea'))
+        body = json.dumps(dict(email='malea@gmail.com', password='123456')).encode()
+        status, data = self.request(http_scope('POST', '/auth/login'), body)
+        self.assertEqual(status, 200)
+        self.assertTrue(data['token'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import datetime
+import unittest
+from unittest import mock
+
+from main import app, db
+from main.auth.blacklist import BloomFilter, TokenBlacklist, TokenPruner, token_hash
+from main.model.model import BadToken
+from tests.helpers import DatabaseTestCase
+
+
+class FakeTimer:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestBloomFilter(unittest.TestCase):
+
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(1000, 0.01)
+        hashes = [token_hash(str(i)) for i in range(1000)]
+        for hashed in hashes:
+            bloom.add(hashed)
+        self.assertTrue(all(hashed in bloom for hashed in hashes))
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bloom.add(token_hash(str(i)))
+        false_positives = sum(
+            token_hash(f'other{i}') in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class TestTokenBlacklist(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.timer = FakeTimer()
+        self.blacklist = TokenBlacklist(BadToken, db.session, 5, 600, 60, 4, 0.01, self.timer)
+
+    def test_stores_hash_only(self):
+        self.blacklist.add('secret-token', None)
+        row = BadToken.query.one()
+        self.assertEqual(row.token_hash, token_hash('secret-token'))
+        self.assertNotIn('secret-token', repr(row))
+
+    def test_misses_skip_database(self):
+        self.blacklist.add('a', None)
+        self.assertTrue(self.blacklist.contains('a'))
+        with mock.patch.object(BadToken, 'query') as query:
+            self.assertFalse(self.blacklist.contains('b'))
+            query.filter_by.assert_not_called()
+
+    def test_refresh_picks_up_other_writers(self):
+        self.assertFalse(self.blacklist.contains('a'))
+        db.session.add(BadToken(token='a'))
+        db.session.commit()
+        # written elsewhere, visible once the refresh interval passes
+        self.assertFalse(self.blacklist.contains('a'))
+        self.timer.now += 5
+        self.assertTrue(self.blacklist.contains('a'))
+
+    def blacklisted(self, token, seconds_ago):
+        row = BadToken(token=token)
+        row.blacklisted_on -= datetime.timedelta(seconds=seconds_ago)
+        db.session.add(row)
+        db.session.commit()
+
+    def test_refresh_rereads_overlap(self):
+        self.blacklisted('newer', 0)
+        self.assertTrue(self.blacklist.contains('newer'))
+        # an older logout committing after a newer one is not skipped
+        self.blacklisted('late', 30)
+        self.timer.now += 5
+        self.assertTrue(self.blacklist.contains('late'))
+
+    def test_rebuild_catches_rows_outside_overlap(self):
+        self.blacklisted('newer', 0)
+        self.assertTrue(self.blacklist.contains('newer'))
+        self.blacklisted('very-late', 120)
+        self.timer.now += 5
+        self.assertFalse(self.blacklist.contains('very-late'))
+        self.timer.now += 600
+        self.assertTrue(self.blacklist.contains('very-late'))
+
+    def test_add_does_not_prune(self):
+        past = datetime.datetime.utcnow() - datetime.timedelta(seconds=1)
+        self.blacklist.add('old', past)
+        self.timer.now += 10**6
+        self.blacklist.add('new', None)
+        self.assertEqual(BadToken.query.count(), 2)
+
+    def test_filter_grows(self):
+        for i in range(10):
+            db.session.add(BadToken(token=str(i)))
+        db.session.commit()
+        self.assertTrue(all(self.blacklist.contains(str(i)) for i in range(10)))
+        self.assertGreaterEqual(self.blacklist.refresh().capacity, 10)
+
+    def test_prune_expired(self):
+        past = datetime.datetime.utcnow() - datetime.timedelta(seconds=1)
+        self.blacklist.add('old', past)
+        self.blacklist.add('new', None)
+        self.assertEqual(self.blacklist.prune(), 1)
+        self.assertFalse(self.blacklist.contains('old'))
+        self.assertTrue(self.blacklist.contains('new'))
+
+    def test_pruner_prunes_until_stopped(self):
+        past = datetime.datetime.utcnow() - datetime.timedelta(seconds=1)
+        self.blacklist.add('old', past)
+        pruner = TokenPruner(self.blacklist, 3600, app.app_context)
+        pruner._stopped.wait = mock.Mock(side_effect=[False, True])
+        pruner.run()
+        self.assertEqual(BadToken.query.count(), 0)
+        self.assertEqual(pruner._stopped.wait.call_count, 2)
+
+    def test_pruner_survives_failures(self):
+        pruner = TokenPruner(self.blacklist, 3600, app.app_context)
+        pruner._stopped.wait = mock.Mock(side_effect=[False, False, True])
+        with mock.patch.object(self.blacklist, 'prune', side_effect=[RuntimeError('down'), 0]) as prune, \
+                self.assertLogs('main.auth.blacklist', 'ERROR'):
+            pruner.run()
+        self.assertEqual(prune.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
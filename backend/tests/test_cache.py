@@ -0,0 +1,48 @@
+import unittest
+
+from main.cache import TTLCache
+
+
+class FakeTimer:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def setUp(self):
+        self.timer = FakeTimer()
+        self.cache = TTLCache(2, 10, timer=self.timer)
+
+    def test_lru_eviction(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.cache.set('c', 3)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+    def test_ttl_expiry(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2, ttl=1)
+        self.timer.now = 5
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('a'), 1)
+        self.timer.now = 10
+        self.assertIsNone(self.cache.get('a'))
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['expirations']), (1, 2, 2))
+
+    def test_disabled(self):
+        cache = TTLCache(0, 10)
+        cache.set('a', 1)
+        self.assertIsNone(cache.get('a'))
+
+
+if __name__ == '__main__':
+    unittest.main()
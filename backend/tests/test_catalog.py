@@ -0,0 +1,162 @@
+import unittest
+import json
+import os
+import mmap
+import tempfile
+
+import numpy as np
+
+from main.config import Config
+from main.catalog.catalog import FoodCatalog, CatalogError, load_menu, load_compiled
+from main.catalog.columnar import NameTable
+
+
+def write_menu(directory, file_name, records):
+    with open(os.path.join(directory, file_name), 'w') as menu_data:
+        json.dump(records, menu_data)
+
+
+class TestFoodCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog = FoodCatalog(
+            Config.CATALOG_DIR, Config.CATALOG_FILES, Config.CATALOG_DEFAULT)
+
+    def test_records_match_json(self):
+        for preference, file_name in Config.CATALOG_FILES.items():
+            with open(os.path.join(Config.CATALOG_DIR, file_name)) as menu_data:
+                records = json.load(menu_data)
+            menu = self.catalog.get(preference)
+            self.assertEqual(len(menu), len(records))
+            for i in (0, len(records) - 1):
+                self.assertEqual(menu.record(i), records[i])
+
+    def test_unknown_preference_uses_default(self):
+        self.assertIs(self.catalog.get('carnivore'),
+                      self.catalog.get(Config.CATALOG_DEFAULT))
+
+    def test_tables_are_read_only(self):
+        menu = self.catalog.get('vegan')
+        with self.assertRaises(ValueError):
+            menu.column('Protein (g)')[0] = 100.0
+        with self.assertRaises(TypeError):
+            menu.columns['Protein (g)'] = None
+
+    def test_invalid_dataset(self):
+        with tempfile.TemporaryDirectory() as directory:
+            write_menu(directory, 'bad.json', [{'Food Name': 'Rice'}])
+            with self.assertRaises(CatalogError):
+                load_menu('bad', os.path.join(directory, 'bad.json'))
+            with self.assertRaises(CatalogError):
+                load_menu('missing', os.path.join(directory, 'missing.json'))
+
+
+class TestCatalogReload(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.food = {
+            'Food Name': 'Rice', 'Energy (kJ)': 500, 'Energy (kCal)': 120,
+            'Water (g)': 68.0, 'Protein (g)': 2.7, 'Fat (g)': 0.3,
+            'Carbohydrate (g)': 28.0, 'Fibre (g)': 0.4, 'Ash (g)': 0.5
+        }
+        write_menu(self.directory.name, 'menu.json', [self.food])
+        self.catalog = FoodCatalog(
+            self.directory.name, dict(menu='menu.json'), 'menu')
+
+    def tearDown(self):
+        self.catalog.stop_watcher()
+        self.directory.cleanup()
+
+    def test_reload_swaps_snapshot(self):
+        old_menu = self.catalog.get('menu')
+        self.assertFalse(self.catalog.reload_if_changed())
+        write_menu(self.directory.name, 'menu.json',
+                   [self.food, dict(self.food, **{'Food Name': 'Beans'})])
+        self.assertTrue(self.catalog.reload_if_changed())
+        self.assertEqual(len(self.catalog.get('menu')), 2)
+        # menus handed out earlier are left untouched
+        self.assertEqual(len(old_menu), 1)
+
+    def test_invalid_file_keeps_snapshot(self):
+        self.catalog.get('menu')
+        with open(os.path.join(self.directory.name, 'menu.json'), 'w') as menu_data:
+            menu_data.write('[{"Food Name": ')
+        self.assertFalse(self.catalog.reload_if_changed())
+        self.assertEqual(self.catalog.get('menu').record(0), self.food)
+
+
+class TestCompiledCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.compiled = os.path.join(self.directory.name, 'compiled')
+        self.catalog = FoodCatalog(
+            Config.CATALOG_DIR, Config.CATALOG_FILES, Config.CATALOG_DEFAULT, self.compiled)
+        self.paths = self.catalog.compile()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_compiled_matches_json(self):
+        json_catalog = FoodCatalog(
+            Config.CATALOG_DIR, Config.CATALOG_FILES, Config.CATALOG_DEFAULT)
+        for preference in Config.CATALOG_FILES:
+            menu = self.catalog.get(preference)
+            expected = json_catalog.get(preference)
+            self.assertIsInstance(menu.names, NameTable)
+            self.assertEqual(list(menu.names), list(expected.names))
+            for i in range(len(expected)):
+                self.assertEqual(menu.record(i), expected.record(i))
+
+    def test_columns_are_memory_mapped(self):
+        column = self.catalog.get('vegan').column('Protein (g)')
+        base = column
+        while isinstance(base, np.ndarray):
+            base = base.base
+        self.assertIsInstance(base, mmap.mmap)
+        with self.assertRaises(ValueError):
+            column[0] = 100.0
+
+    def test_stale_compiled_file_is_ignored(self):
+        with tempfile.TemporaryDirectory() as directory:
+            food = {
+                'Food Name': 'Rice', 'Energy (kJ)': 500, 'Energy (kCal)': 120,
+                'Water (g)': 68.0, 'Protein (g)': 2.7, 'Fat (g)': 0.3,
+                'Carbohydrate (g)': 28.0, 'Fibre (g)': 0.4, 'Ash (g)': 0.5
+            }
+            write_menu(directory, 'menu.json', [food])
+            catalog = FoodCatalog(directory, dict(menu='menu.json'), 'menu', directory)
+            catalog.compile()
+            write_menu(directory, 'menu.json', [food, dict(food, **{'Food Name': 'Beans'})])
+            self.assertIsNone(load_compiled(
+                'menu', catalog.compiled_path('menu'), os.path.join(directory, 'menu.json')))
+            self.assertEqual(len(catalog.get('menu')), 2)
+            self.assertNotIsInstance(catalog.get('menu').names, NameTable)
+
+    def test_corrupt_compiled_file(self):
+        with open(self.paths['vegan'], 'r+b') as compiled:
+            compiled.write(b'garbage!')
+        with self.assertRaises(CatalogError):
+            load_compiled('vegan', self.paths['vegan'])
+        # the catalog falls back to the json instead of failing
+        menu = self.catalog.get('vegan')
+        self.assertNotIsInstance(menu.names, NameTable)
+        json_menu = load_menu('vegan', os.path.join(Config.CATALOG_DIR, Config.CATALOG_FILES['vegan']))
+        self.assertEqual(menu.record(0), json_menu.record(0))
+
+    def test_name_table(self):
+        names = ['Rice', 'Crème brûlée', '']
+        encoded = [name.encode('utf-8') for name in names]
+        offsets = np.cumsum([0] + [len(name) for name in encoded])
+        table = NameTable(offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8))
+        self.assertEqual(len(table), 3)
+        self.assertEqual(list(table), names)
+        self.assertEqual(table[-2], 'Crème brûlée')
+        self.assertEqual(table[1:], names[1:])
+        with self.assertRaises(IndexError):
+            table[3]
+
+
+if __name__ == '__main__':
+    unittest.main()
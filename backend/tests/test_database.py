@@ -0,0 +1,81 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from flask_testing import TestCase
+
+from main import app, db
+from main.config import engine_options
+
+
+class TestEngineOptions(unittest.TestCase):
+
+    def test_server_database_is_pooled(self):
+        options = engine_options('postgresql://localhost/eatright')
+        self.assertTrue(options['pool_pre_ping'])
+        self.assertIn('pool_size', options)
+
+    def test_sqlite_file_is_pooled(self):
+        options = engine_options('sqlite:////tmp/eatright.db')
+        self.assertEqual(options['poolclass'].__name__, 'QueuePool')
+        self.assertFalse(options['connect_args']['check_same_thread'])
+
+    def test_sqlite_memory_keeps_defaults(self):
+        self.assertEqual(engine_options('sqlite://'), {})
+
+
+class TestSqlitePragmas(TestCase):
+
+    def create_app(self):
+        self.directory = tempfile.TemporaryDirectory()
+        uri = 'sqlite:///' + os.path.join(self.directory.name, 'test.db')
+        app.config.from_object('main.config.TestingConfig')
+        app.config['SQLALCHEMY_DATABASE_URI'] = uri
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(uri)
+        return app
+
+    def setUp(self):
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        db.get_engine().dispose()
+        self.directory.cleanup()
+
+    def test_pragmas_applied(self):
+        pragmas = {
+            name: db.session.execute(f'PRAGMA {name}').scalar()
+            for name in ('journal_mode', 'synchronous', 'busy_timeout', 'foreign_keys')
+        }
+        # synchronous NORMAL is reported as 1
+        self.assertEqual(pragmas, dict(
+            journal_mode='wal', synchronous=1, busy_timeout=5000, foreign_keys=1))
+
+    def test_concurrent_writers(self):
+        from main.model.model import BadToken
+        errors = []
+
+        def logout(n):
+            with app.app_context():
+                try:
+                    for i in range(10):
+                        db.session.add(BadToken(token=f'{n}-{i}'))
+                        db.session.commit()
+                except Exception as e:
+                    errors.append(e)
+                finally:
+                    db.session.remove()
+
+        threads = [threading.Thread(target=logout, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(BadToken.query.count(), 40)
+
+
+if __name__ == '__main__':
+    unittest.main()
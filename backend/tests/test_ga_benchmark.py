@@ -0,0 +1,36 @@
+import unittest
+
+from main.benchmark.ga_benchmark import (
+    OPERATORS, synthetic_menu, benchmark_operators, benchmark_run, run_suite)
+
+
+class TestGABenchmark(unittest.TestCase):
+
+    def test_synthetic_menu(self):
+        menu, cuisine_score = synthetic_menu(500, cuisines=5, seed=1)
+        self.assertEqual(len(menu), 500)
+        self.assertEqual(menu.cuisines[:3], ['mixed_food', 'vegetarian', 'vegan'])
+        self.assertEqual(set(cuisine_score), set(menu.cuisines))
+        self.assertAlmostEqual(sum(cuisine_score.values()), 1.0)
+        self.assertTrue(menu.rating.min() >= 1 and menu.rating.max() <= 5)
+
+    def test_operators(self):
+        results = benchmark_operators(200, 20, repeat=2)
+        self.assertEqual([result['benchmark'] for result in results], list(OPERATORS))
+        self.assertTrue(all(result['seconds'] > 0 for result in results))
+        self.assertGreater(results[0]['peak_bytes'], 0)
+
+    def test_run_curve(self):
+        result = benchmark_run(200, 20, generations=5)
+        self.assertEqual(result['generations'], 5)
+        self.assertEqual(len(result['curve']), 5)
+        times = [point[0] for point in result['curve']]
+        self.assertEqual(times, sorted(times))
+
+    def test_suite(self):
+        results = list(run_suite([50], [10, 20], generations=2, repeat=1))
+        self.assertEqual(len(results), 2*(len(OPERATORS) + 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,251 @@
+import io
+import json
+import unittest
+import random
+
+import numpy as np
+
+from main.alg.geneticAlgo.genetic_algorithm import (
+    genInfo, Fitness, createInitialPopu, rankDishes, decodeChromosome,
+    crossover, mutate, selection, geneticAlgorithm)
+from main.alg.geneticAlgo.fitness import MenuArrays, buildMenuArrays, populationFitness
+from main.alg.geneticAlgo.selection import rouletteSelection, stochasticUniversalSampling
+from main.alg.geneticAlgo.island import SharedMenu, islandGeneticAlgorithm
+from main.alg.geneticAlgo.telemetry import (
+    PHASES, GenerationTelemetry, JsonLinesSink, PrometheusExporter)
+
+
+def synthetic_menu(noOfDishes, seed=0):
+    rand = random.Random(seed)
+    menuData = {}
+    for i in range(noOfDishes):
+        menuData[f'dish{i}'] = {
+            'cuisine': rand.choice(genInfo['cuisines']),
+            'rating': rand.randint(1, 5),
+            'price': rand.randint(50, 500)
+        }
+    return menuData
+
+
+CUISINE_SCORE = {'mixed_food': 0.5, 'vegetarian': 0.3, 'vegan': 0.2}
+
+
+class TestFitness(unittest.TestCase):
+
+    def setUp(self):
+        self.menuData = synthetic_menu(30)
+        self.population = createInitialPopu(6, 40, self.menuData, rng=1)
+
+    def test_matches_scalar_fitness(self):
+        menuArrays = buildMenuArrays(self.menuData, genInfo['cuisines'])
+        for maxQty in (4, 6):
+            expected = [
+                Fitness(decodeChromosome(chromosome, menuArrays), CUISINE_SCORE,
+                        maxQty).calcFitness(self.menuData)
+                for chromosome in self.population
+            ]
+            fitness = populationFitness(self.population, CUISINE_SCORE, maxQty, menuArrays)
+            for got, want in zip(fitness, expected):
+                self.assertAlmostEqual(got, want)
+
+    def test_rating_weight_separates_single_cuisine_orders(self):
+        menuArrays = buildMenuArrays(self.menuData, genInfo['cuisines'])
+        oneCuisine = MenuArrays(menuArrays.ids, menuArrays.price, menuArrays.rating,
+                                np.zeros(len(menuArrays), dtype=int), ['vegan'])
+        weighted = MenuArrays(menuArrays.ids, menuArrays.price, menuArrays.rating,
+                              np.zeros(len(menuArrays), dtype=int), ['vegan'], ratingWeight=1.0)
+        # 1-dish orders only differ by the rating of that dish
+        single = np.eye(len(menuArrays), dtype=int)
+        self.assertEqual(len(set(populationFitness(single, {'vegan': 1.0}, 6, oneCuisine))), 1)
+        fitness = populationFitness(single, {'vegan': 1.0}, 6, weighted)
+        self.assertEqual(int(np.argmax(fitness)), int(np.argmax(menuArrays.rating)))
+
+    def test_rank_dishes_sorted(self):
+        ranked = rankDishes(self.population, CUISINE_SCORE, 6, self.menuData)
+        self.assertEqual(sorted(i for i, _ in ranked), list(range(40)))
+        values = [f for _, f in ranked]
+        self.assertEqual(values, sorted(values, reverse=True))
+
+    def test_empty_chromosome_has_zero_fitness(self):
+        empty = np.zeros((1, len(self.menuData)), dtype=int)
+        ranked = rankDishes(empty, CUISINE_SCORE, 6, self.menuData)
+        self.assertEqual(ranked, [(0, 0.0)])
+
+
+class TestOperators(unittest.TestCase):
+
+    def setUp(self):
+        self.menuData = synthetic_menu(25)
+        self.population = createInitialPopu(5, 11, self.menuData, rng=2)
+
+    def test_initial_population(self):
+        self.assertEqual(self.population.shape, (11, 25))
+        self.assertTrue((self.population.sum(axis=1) == 5).all())
+
+    def test_crossover(self):
+        matingPool = [3, 0, 1, 2, 4, 5, 6, 7, 8, 9, 10]
+        before = self.population.copy()
+        newPopu = crossover(matingPool, self.population, 2)
+        self.assertEqual(newPopu.shape, before.shape)
+        np.testing.assert_array_equal(self.population, before)
+        np.testing.assert_array_equal(newPopu[:2], before[[3, 0]])
+        # every gene of a child comes from one of its two parents
+        for child, (p1, p2) in ((newPopu[2], (1, 10)), (newPopu[3], (1, 10))):
+            self.assertTrue(((child == before[p1]) | (child == before[p2])).all())
+        np.testing.assert_array_equal(newPopu[-1], before[6])
+
+    def test_mutate_scrambles_in_place(self):
+        individual = np.arange(25)
+        mutated = mutate(individual, 1.0)
+        self.assertIs(mutated, individual)
+        self.assertEqual(sorted(mutated), list(range(25)))
+
+    def test_genetic_algorithm(self):
+        answer = geneticAlgorithm(5, 20, CUISINE_SCORE, 2, 0.2, 10, self.menuData,
+                                  verbose=False)
+        self.assertEqual(answer.ans.shape, (25,))
+        self.assertTrue((answer.ans >= 0).all())
+        self.assertEqual(answer.generations, 10)
+        self.assertEqual(answer.stopReason, 'generations')
+        self.assertEqual(len(answer.graphPoints), 11)
+
+    def test_seed_replays_run(self):
+        runs = [
+            geneticAlgorithm(5, 20, CUISINE_SCORE, 2, 0.5, 15, self.menuData, seed=7,
+                             verbose=False)
+            for _ in range(2)
+        ]
+        np.testing.assert_array_equal(runs[0].ans, runs[1].ans)
+
+
+class TestTermination(unittest.TestCase):
+
+    def setUp(self):
+        self.menuData = synthetic_menu(25)
+
+    def run_ga(self, generations=None, **criteria):
+        return geneticAlgorithm(5, 20, CUISINE_SCORE, 2, 0.2, generations,
+                                self.menuData, seed=11, verbose=False, **criteria)
+
+    def test_needs_a_limit(self):
+        with self.assertRaises(ValueError):
+            self.run_ga()
+
+    def test_stagnation(self):
+        answer = self.run_ga(stagnation=3)
+        self.assertEqual(answer.stopReason, 'stagnation')
+        best = answer.graphPoints[:answer.generations]
+        self.assertTrue(max(best[-3:]) <= max(best[:-3]))
+
+    def test_target_fitness(self):
+        answer = self.run_ga(500, targetFitness=-100.0)
+        self.assertEqual((answer.stopReason, answer.generations), ('target', 1))
+
+    def test_time_budget(self):
+        answer = self.run_ga(timeBudget=0.05)
+        self.assertEqual(answer.stopReason, 'time')
+        self.assertGreater(answer.generations, 0)
+
+    def test_diversity_collapse(self):
+        answer = self.run_ga(500, minDiversity=1.01)
+        self.assertEqual((answer.stopReason, answer.generations), ('diversity', 1))
+
+
+class TestSelection(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = np.random.default_rng(3)
+        self.ranked = [(4, 3.0), (0, 1.0), (2, 0.0), (1, -1.5), (3, -2.0)]
+
+    def test_elites_lead_mating_pool(self):
+        for method in ('roulette', 'sus', 'tournament'):
+            matingPool = selection(self.ranked, 2, method, self.rng)
+            self.assertEqual(len(matingPool), 5)
+            self.assertEqual(list(matingPool[:2]), [4, 0])
+
+    def test_negative_fitness_not_selected(self):
+        for method in ('roulette', 'sus'):
+            matingPool = selection(self.ranked * 200, 0, method, self.rng)
+            self.assertEqual(set(matingPool), {4, 0})
+
+    def test_roulette_proportions(self):
+        counts = np.bincount(selection(self.ranked * 2000, 0, 'roulette', self.rng))
+        self.assertAlmostEqual(counts[4]/counts.sum(), 0.75, delta=0.02)
+
+    def test_pointer_at_end_of_wheel(self):
+        # rng.random()*cumSum[-1] may round up to cumSum[-1] itself
+        class EdgeRng:
+            def random(self, size=None):
+                return 1.0 if size is None else np.ones(size)
+        self.assertEqual(list(rouletteSelection([0.1, 0.2, 0.3], 3, EdgeRng())), [2, 2, 2])
+        self.assertEqual(stochasticUniversalSampling([0.1, 0.2, 0.3], 3, EdgeRng())[-1], 2)
+
+    def test_all_infeasible_is_uniform(self):
+        ranked = [(0, -1.0), (1, -2.0)]
+        counts = np.bincount(selection(ranked * 2000, 0, 'roulette', self.rng))
+        self.assertAlmostEqual(counts[0]/counts.sum(), 0.5, delta=0.03)
+
+
+class TestTelemetry(unittest.TestCase):
+
+    def setUp(self):
+        self.menuData = synthetic_menu(30)
+
+    def run_ga(self, telemetry=None):
+        return geneticAlgorithm(5, 20, CUISINE_SCORE, 2, 0.2, 6, self.menuData,
+                                seed=3, verbose=False, telemetry=telemetry)
+
+    def test_records(self):
+        lines = io.StringIO()
+        exporter = PrometheusExporter()
+        telemetry = GenerationTelemetry([JsonLinesSink(lines), exporter], trackAllocations=True)
+        answer = self.run_ga(telemetry)
+        telemetry.close()
+        self.assertEqual(len(telemetry.records), 6)
+        for record, best in zip(telemetry.records, answer.graphPoints):
+            self.assertEqual(set(record['phases']), set(PHASES))
+            self.assertEqual(record['best'], best)
+            self.assertTrue(record['best'] >= record['mean'] >= record['worst'])
+            self.assertTrue(0 < record['diversity'] <= 1)
+            self.assertGreater(record['allocPeakBytes'], 0)
+        self.assertEqual([json.loads(line) for line in lines.getvalue().splitlines()],
+                         telemetry.records)
+        metrics = exporter.render()
+        self.assertIn('ga_generations_total 6', metrics)
+        self.assertIn('ga_phase_seconds_total{phase="crossover"}', metrics)
+
+    def test_does_not_change_the_run(self):
+        plain = self.run_ga()
+        traced = self.run_ga(GenerationTelemetry())
+        self.assertEqual(plain.graphPoints, traced.graphPoints)
+
+
+class TestIslandModel(unittest.TestCase):
+
+    def setUp(self):
+        self.menuData = synthetic_menu(40)
+
+    def test_shared_menu(self):
+        menuArrays = buildMenuArrays(self.menuData, genInfo['cuisines'])
+        with SharedMenu(menuArrays) as sharedMenu:
+            shm, attached = SharedMenu.attach(sharedMenu.descriptor)
+            np.testing.assert_array_equal(attached.weights, menuArrays.weights)
+            np.testing.assert_array_equal(attached.price, menuArrays.price)
+            # the worker reads the weights from the shared block, not a copy
+            self.assertFalse(attached.weights.flags.owndata)
+            del attached
+            shm.close()
+
+    def test_islands_replay_with_seed(self):
+        runs = [
+            islandGeneticAlgorithm(5, 20, CUISINE_SCORE, 2, 0.2, 6, self.menuData,
+                                   islands=3, migrationInterval=2, seed=5, workers=2)
+            for _ in range(2)
+        ]
+        self.assertEqual(len(runs[0].graphPoints), 6)
+        self.assertEqual(runs[0].fitness, max(runs[0].graphPoints + [runs[0].fitness]))
+        np.testing.assert_array_equal(runs[0].ans, runs[1].ans)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import json
+import threading
+import unittest
+
+from main import app, db, bcrypt
+from main.auth.hashing import HashingBusy, PasswordHasher, benchmark_rounds, hash_rounds
+from main.model.model import User
+from tests.helpers import DatabaseTestCase
+
+
+class TestPasswordHasher(unittest.TestCase):
+
+    def setUp(self):
+        self.hasher = PasswordHasher(bcrypt, 2, 2)
+
+    def tearDown(self):
+        self.hasher.shutdown()
+
+    def test_hash_and_check(self):
+        pw_hash = self.hasher.hash('secret', 4)
+        self.assertEqual(hash_rounds(pw_hash), 4)
+        self.assertTrue(self.hasher.check(pw_hash, 'secret'))
+        self.assertFalse(self.hasher.check(pw_hash, 'wrong'))
+        self.assertTrue(self.hasher.needs_rehash(pw_hash, 5))
+
+    def test_busy_when_full(self):
+        release = threading.Event()
+        started = threading.Barrier(3)
+
+        def slow():
+            started.wait()
+            release.wait()
+
+        threads = [threading.Thread(target=self.hasher._run, args=(slow,)) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        started.wait()
+        with self.assertRaises(HashingBusy):
+            self.hasher.hash('secret', 4)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertTrue(self.hasher.check(self.hasher.hash('secret', 4), 'secret'))
+
+    def test_benchmark_rounds(self):
+        rounds, timings = benchmark_rounds(bcrypt, 0, max_rounds=6)
+        self.assertEqual(rounds, 4)
+        self.assertEqual(list(timings), [4])
+
+
+class TestRehashOnLogin(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        db.session.add(User('Malea', 'malea@gmail.com', 30, '123456', 1))
+        db.session.commit()
+
+    def tearDown(self):
+        app.config['BCRYPT_LOG_ROUNDS'] = 4
+        super().tearDown()
+
+    def login(self, password='123456'):
+        return self.client.post(
+            '/auth/login',
+            data=json.dumps(dict(email='malea@gmail.com', password=password)),
+            content_type='application/json'
+        )
+
+    def test_rehash_when_cost_changes(self):
+        app.config['BCRYPT_LOG_ROUNDS'] = 5
+        self.assertEqual(self.login().status_code, 200)
+        db.session.expunge_all()
+        user = User.query.one()
+        self.assertEqual(hash_rounds(user.password), 5)
+        self.assertEqual(self.login().status_code, 200)
+
+    def test_wrong_password(self):
+        self.assertEqual(self.login('wrong').status_code, 404)
+        self.assertEqual(hash_rounds(User.query.one().password), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import json
+import threading
+import time
+import unittest
+
+from main import db, catalog
+from main.config import Config
+from main.model.model import User, Settings
+from main.recommend.jobs import GAJobQueue, JobQueueFull, job_params, DONE
+from main.recommend.recommender import UserSettings
+from tests.helpers import DatabaseTestCase
+
+
+class TestJobParams(unittest.TestCase):
+
+    def setUp(self):
+        self.config = {key: getattr(Config, key) for key in dir(Config) if key.isupper()}
+
+    def test_defaults(self):
+        params = job_params({}, self.config)
+        self.assertEqual(params['generations'], Config.RECOMMEND_JOB_GENERATIONS)
+        self.assertEqual(params['populationSize'], Config.RECOMMEND_GA_POPULATION)
+
+    def test_limits(self):
+        for post_data in ({'generations': 10**6}, {'populationSize': '30'},
+                          {'noOfElite': 30, 'populationSize': 30}, {'mutationRate': 2}):
+            with self.assertRaises(ValueError):
+                job_params(post_data, self.config)
+
+
+class TestGAJobQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.settns = UserSettings('user', 'vegan', 19.0, 5.0, 2.0)
+        self.params = dict(maxDishes=3, populationSize=20, noOfElite=2,
+                           mutationRate=0.2, generations=5)
+
+    def test_back_pressure(self):
+        queue = GAJobQueue(catalog, 1, 2, 60)
+        release = threading.Event()
+        evolve = queue.evolve
+        queue.evolve = lambda job: release.wait() and evolve(job)
+        jobs = [queue.submit('user', self.settns, self.params) for _ in range(2)]
+        with self.assertRaises(JobQueueFull):
+            queue.submit('user', self.settns, self.params)
+        release.set()
+        queue.shutdown()
+        self.assertEqual([job.status for job in jobs], [DONE, DONE])
+        self.assertEqual(jobs[0].generation, 5)
+        self.assertEqual(queue.submit('user', self.settns, self.params).user_id, 'user')
+        queue.shutdown()
+
+    def test_finished_jobs_expire(self):
+        now = [0.0]
+        queue = GAJobQueue(catalog, 1, 2, 60, timer=lambda: now[0])
+        job = queue.submit('user', self.settns, self.params)
+        queue.shutdown()
+        self.assertIs(queue.get(job.id, 'user'), job)
+        self.assertIsNone(queue.get(job.id, 'someone-else'))
+        now[0] += 61
+        self.assertIsNone(queue.get(job.id, 'user'))
+
+    def test_finished_jobs_capped(self):
+        queue = GAJobQueue(catalog, 1, 4, 60, max_finished=2)
+        jobs = []
+        for _ in range(3):
+            jobs.append(queue.submit('user', self.settns, self.params))
+            queue.shutdown()
+        self.assertIsNone(queue.get(jobs[0].id, 'user'))
+        self.assertEqual([queue.get(job.id, 'user') for job in jobs[1:]], jobs[1:])
+
+
+class TestRecommendJobsAPI(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        user = User('Malea', 'malea@gmail.com', 30, '123456', 1)
+        user.settings = Settings(user.id, 'vegan', 19.0, 5.0, 2.0)
+        db.session.add(user)
+        db.session.commit()
+        self.token = user.encode_auth_token(user.id).decode()
+
+    def test_submit_and_poll(self):
+        response = self.client.post(
+            '/recommend/jobs',
+            data=json.dumps(dict(generations=5, populationSize=20)),
+            content_type='application/json',
+            headers=dict(Authorization=self.token)
+        )
+        self.assertEqual(response.status_code, 202)
+        job_id = json.loads(response.data.decode())['id']
+        self.assertEqual(response.headers['Location'], f'/recommend/jobs/{job_id}')
+        deadline = time.time() + 10
+        while True:
+            response = self.client.get(
+                f'/recommend/jobs/{job_id}', headers=dict(Authorization=self.token))
+            job = json.loads(response.data.decode())
+            if job['status'] == DONE or time.time() > deadline:
+                break
+            time.sleep(0.01)
+        self.assertEqual(job['status'], DONE)
+        self.assertEqual(job['progress']['generation'], 5)
+        self.assertEqual(len(job['result']['chromosome']), len(catalog.get('vegan')))
+
+    def test_invalid_and_unknown(self):
+        response = self.client.post(
+            '/recommend/jobs', data=json.dumps(dict(generations=0)),
+            content_type='application/json', headers=dict(Authorization=self.token))
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/recommend/jobs/nope', headers=dict(Authorization=self.token))
+        self.assertEqual(response.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
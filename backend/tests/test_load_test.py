@@ -0,0 +1,48 @@
+import unittest
+
+from main import app, db
+from main.benchmark.load_test import (
+    DEFAULT_MIX, InProcessClient, percentile, register_users, run_load, format_report,
+    scratch_database)
+from main.model.model import User
+from tests.helpers import DatabaseTestCase
+
+
+class TestPercentile(unittest.TestCase):
+
+    def test_nearest_rank(self):
+        ordered = list(range(1, 101))
+        self.assertEqual(percentile(ordered, 50), 50)
+        self.assertEqual(percentile(ordered, 99), 99)
+        self.assertEqual(percentile([7], 95), 7)
+        self.assertIsNone(percentile([], 50))
+
+
+class TestLoadTest(DatabaseTestCase):
+
+    def test_in_process(self):
+        users = register_users(InProcessClient(app), 3)
+        self.assertEqual(len(users), 3)
+        report = run_load(lambda: InProcessClient(app), users, 60, 1)
+        self.assertEqual(report['requests'], 60)
+        self.assertEqual(set(report['routes']), set(DEFAULT_MIX))
+        for stats in report['routes'].values():
+            self.assertEqual(stats['errors'], 0)
+            self.assertLessEqual(stats['p50_ms'], stats['p99_ms'])
+        self.assertIn('recommend', format_report(report))
+
+    def test_scratch_database(self):
+        # the outer block stands in for the configured file database
+        with scratch_database(app, db):
+            configured = app.config['SQLALCHEMY_DATABASE_URI']
+            with scratch_database(app, db):
+                users = register_users(InProcessClient(app), 2)
+                report = run_load(lambda: InProcessClient(app), users, 20, 2)
+                self.assertEqual(sum(stats['errors'] for stats in report['routes'].values()), 0)
+            self.assertEqual(app.config['SQLALCHEMY_DATABASE_URI'], configured)
+            # the synthetic users went to the throwaway database only
+            self.assertEqual(User.query.count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import json
+import unittest
+
+from main import app, db
+from main.metrics import Counter, Histogram
+from main.model.model import User, Settings
+from tests.helpers import DatabaseTestCase
+
+
+class TestPrometheusFormat(unittest.TestCase):
+
+    def test_histogram(self):
+        histogram = Histogram('latency_seconds', 'Latency.', ('route',), (0.1, 1.0))
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(('/a',), value)
+        lines = histogram.render()
+        self.assertIn('latency_seconds_bucket{route="/a",le="0.1"} 1', lines)
+        self.assertIn('latency_seconds_bucket{route="/a",le="1.0"} 2', lines)
+        self.assertIn('latency_seconds_bucket{route="/a",le="+Inf"} 3', lines)
+        self.assertIn('latency_seconds_count{route="/a"} 3', lines)
+        self.assertIn('latency_seconds_sum{route="/a"} 5.55', lines)
+
+    def test_counter(self):
+        counter = Counter('responses_total', 'Responses.', ('status',))
+        counter.inc(('200',))
+        counter.inc(('200',))
+        self.assertIn('responses_total{status="200"} 2.0', counter.render())
+
+
+class TestMetricsEndpoint(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        user = User('Malea', 'malea@gmail.com', 30, '123456', 1)
+        user.settings = Settings(user.id, 'vegan', 19.0, 5.0, 2.0)
+        db.session.add(user)
+        db.session.commit()
+        self.token = user.encode_auth_token(user.id).decode()
+
+    def metrics(self):
+        response = self.client.get('/metrics')
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        return response.data.decode().splitlines()
+
+    def count(self, lines, prefix):
+        matching = [line for line in lines if line.startswith(prefix + ' ')]
+        return float(matching[0].rsplit(' ', 1)[1]) if matching else 0.0
+
+    def test_request_metrics(self):
+        before = self.metrics()
+        self.client.get('/settings', headers=dict(Authorization=self.token))
+        self.client.post(
+            '/auth/login', data=json.dumps(dict(email='malea@gmail.com', password='123456')),
+            content_type='application/json')
+        after = self.metrics()
+        for series, increase in (
+                ('http_responses_total{method="GET",route="/settings",status="200"}', 1),
+                ('http_request_duration_seconds_count{method="GET",route="/settings"}', 1),
+                ('db_queries_per_request_count{route="/settings"}', 1),
+                ('auth_operation_duration_seconds_count{operation="bcrypt"}', 1)):
+            self.assertEqual(self.count(after, series) - self.count(before, series), increase)
+        # the settings request loads the user and its settings in one query
+        self.assertGreaterEqual(self.count(after, 'db_queries_per_request_sum{route="/settings"}'), 1)
+        self.assertTrue(any(line.startswith('cache_hits_total{cache="token"}') for line in after))
+
+    def test_scrapes_are_not_counted(self):
+        self.metrics()
+        lines = self.metrics()
+        self.assertFalse(any('route="/metrics"' in line for line in lines))
+
+    def test_disabled(self):
+        app.config['METRICS_ENABLED'] = False
+        try:
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
+        finally:
+            app.config['METRICS_ENABLED'] = True
+
+    def test_token(self):
+        app.config['METRICS_TOKEN'] = 'scraper-secret'
+        try:
+            self.assertEqual(self.client.get('/metrics').status_code, 401)
+            response = self.client.get('/metrics', headers=dict(Authorization='wrong'))
+            self.assertEqual(response.status_code, 401)
+            response = self.client.get('/metrics', headers=dict(Authorization='scraper-secret'))
+            self.assertEqual(response.status_code, 200)
+        finally:
+            app.config['METRICS_TOKEN'] = None
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import json
+import unittest
+
+import numpy as np
+
+from main import db
+from main.config import Config
+from main.catalog.catalog import FoodCatalog
+from main.catalog.nutrient_index import KDTree
+from main.model.model import User, Settings
+from main.recommend.recommender import GAParams, UserSettings, macro_vectors, recommend
+from tests.helpers import DatabaseTestCase
+
+
+def brute_force(points, target, k):
+    dist = np.linalg.norm(points - target, axis=1)
+    order = np.lexsort((np.arange(len(points)), dist))[:k]
+    return order, dist[order]
+
+
+class TestKDTree(unittest.TestCase):
+
+    def test_matches_brute_force(self):
+        rng = np.random.default_rng(0)
+        points = rng.uniform(0, 50, size=(300, 3))
+        for leaf_size in (1, 4, 32, 1000):
+            tree = KDTree(points, leaf_size)
+            for target in rng.uniform(-10, 60, size=(20, 3)):
+                for k in (1, 7, 300, 500):
+                    indices, distances = tree.query(target, k)
+                    expected, expected_distances = brute_force(points, target, k)
+                    np.testing.assert_array_equal(indices, expected)
+                    np.testing.assert_allclose(distances, expected_distances)
+
+    def test_ties_prefer_lower_index(self):
+        points = np.zeros((10, 3))
+        indices, _ = KDTree(points, 2).query(np.ones(3), 4)
+        self.assertEqual(indices.tolist(), [0, 1, 2, 3])
+
+
+class TestNutrientIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog = FoodCatalog(
+            Config.CATALOG_DIR, Config.CATALOG_FILES, Config.CATALOG_DEFAULT)
+        self.index = self.catalog.index('mixed_food')
+        self.kcal = self.index.menu.column('Energy (kCal)')
+
+    def test_kcal_range(self):
+        indices = self.index.kcal_range(100, 200)
+        expected = np.flatnonzero((self.kcal >= 100) & (self.kcal <= 200))
+        self.assertEqual(sorted(indices.tolist()), expected.tolist())
+        self.assertTrue(np.all(np.diff(self.kcal[indices]) >= 0))
+        self.assertEqual(len(self.index.kcal_range(200, 100)), 0)
+
+    def test_closest_in_range(self):
+        target = np.array([19.0, 5.0, 2.0])
+        indices, _ = self.index.closest(target, 5, low=100, high=200)
+        in_range = np.flatnonzero((self.kcal >= 100) & (self.kcal <= 200))
+        expected, _ = brute_force(macro_vectors(self.index.menu)[in_range], target, 5)
+        self.assertEqual(indices.tolist(), in_range[expected].tolist())
+
+    def test_closest_mode(self):
+        settns = UserSettings('user', 'vegan', 19.0, 5.0, 2.0)
+        food = recommend(self.catalog, settns, 'closest', GAParams(3, 20, 2, 0.2, 5, None))
+        menu = self.catalog.get('vegan')
+        best, _ = brute_force(macro_vectors(menu), np.array([19.0, 5.0, 2.0]), 1)
+        self.assertEqual(food['food'], menu.names[best[0]])
+
+
+class TestFoodsAPI(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        user = User('Malea', 'malea@gmail.com', 30, '123456', 1)
+        user.settings = Settings(user.id, 'vegetarian', 19.0, 5.0, 2.0)
+        db.session.add(user)
+        db.session.commit()
+        self.token = user.encode_auth_token(user.id).decode()
+
+    def test_foods_in_range(self):
+        response = self.client.get(
+            '/foods?k=3&min_kcal=50&max_kcal=150', headers=dict(Authorization=self.token))
+        foods = json.loads(response.data.decode())['foods']
+        self.assertEqual(len(foods), 3)
+        self.assertTrue(all(50 <= food['calories'] <= 150 for food in foods))
+        distances = [food['distance'] for food in foods]
+        self.assertEqual(distances, sorted(distances))
+
+    def test_invalid_k(self):
+        response = self.client.get('/foods?k=0', headers=dict(Authorization=self.token))
+        self.assertEqual(response.status_code, 400)
+
+    def test_malformed_params(self):
+        for query in ('k=abc', 'k=2.5', 'min_kcal=abc', 'max_kcal=', 'max_kcal=nan'):
+            response = self.client.get(f'/foods?{query}', headers=dict(Authorization=self.token))
+            self.assertEqual(response.status_code, 400, query)
+            self.assertEqual(json.loads(response.data.decode())['status'], 'fail')
+
+    def test_recommend_closest(self):
+        response = self.client.get('/recommend?mode=closest', headers=dict(Authorization=self.token))
+        self.assertEqual(response.status_code, 200)
+        nearest = self.client.get('/foods?k=1', headers=dict(Authorization=self.token))
+        self.assertEqual(json.loads(response.data.decode())['food'],
+                         json.loads(nearest.data.decode())['foods'][0]['food'])
+
+
+if __name__ == '__main__':
+    unittest.main()
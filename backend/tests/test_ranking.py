@@ -0,0 +1,94 @@
+import json
+import unittest
+
+import numpy as np
+
+from main import app, db
+from main.config import Config
+from main.catalog.catalog import FoodCatalog
+from main.model.model import User, Settings
+from main.recommend.ranking import mmr, relevance, top_k_params, top_k_recommendation
+from main.recommend.recommender import UserSettings
+from tests.helpers import DatabaseTestCase
+
+
+class TestMMR(unittest.TestCase):
+
+    def test_no_diversity_is_top_k(self):
+        scores = np.array([0.1, 0.9, 0.5, 0.9, 0.7])
+        profiles = np.zeros((5, 2))
+        self.assertEqual(mmr(profiles, scores, 3, 0.0).tolist(), [1, 3, 4])
+
+    def test_skips_near_duplicates(self):
+        scores = np.array([1.0, 0.99, 0.8])
+        profiles = np.array([[0.0, 0.0], [0.0, 0.01], [5.0, 5.0]])
+        self.assertEqual(mmr(profiles, scores, 2, 0.5).tolist(), [0, 2])
+        self.assertEqual(mmr(profiles, scores, 2, 0.0).tolist(), [0, 1])
+
+    def test_k_larger_than_menu(self):
+        self.assertEqual(len(mmr(np.zeros((3, 2)), np.ones(3), 10, 0.3)), 3)
+
+
+class TestTopK(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog = FoodCatalog(
+            Config.CATALOG_DIR, Config.CATALOG_FILES, Config.CATALOG_DEFAULT)
+        self.settns = UserSettings('user', 'vegan', 19.0, 5.0, 2.0)
+
+    def test_preference_and_order(self):
+        foods = top_k_recommendation(self.catalog, self.settns, 5, 0.0)['foods']
+        vegan = self.catalog.get('vegan')
+        self.assertTrue(all(food['food'] in vegan.names for food in foods))
+        scores = relevance(self.catalog.index('vegan'), self.settns)
+        self.assertEqual([food['score'] for food in foods], sorted(scores, reverse=True)[:5])
+
+    def test_diversity_spreads_results(self):
+        index = self.catalog.index('mixed_food')
+        settns = self.settns._replace(preference='mixed_food')
+        scores = relevance(index, settns)
+
+        def spread(diversity):
+            picked = mmr(index.profiles, scores, 10, diversity)
+            distances = np.linalg.norm(
+                index.profiles[picked][:, None] - index.profiles[picked][None], axis=2)
+            return distances.sum()
+
+        self.assertGreater(spread(0.5), spread(0.0))
+
+
+class TestTopKAPI(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        user = User('Malea', 'malea@gmail.com', 30, '123456', 1)
+        user.settings = Settings(user.id, 'vegetarian', 19.0, 5.0, 2.0)
+        db.session.add(user)
+        db.session.commit()
+        self.token = user.encode_auth_token(user.id).decode()
+
+    def test_topk(self):
+        response = self.client.get(
+            '/recommend?mode=topk&k=4&diversity=0.5', headers=dict(Authorization=self.token))
+        self.assertEqual(response.status_code, 200)
+        foods = json.loads(response.data.decode())['foods']
+        self.assertEqual(len(foods), 4)
+        self.assertEqual(len({food['food'] for food in foods}), 4)
+        response = self.client.get(
+            '/recommend?mode=topk&diversity=2', headers=dict(Authorization=self.token))
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(
+            '/recommend?mode=topk&k=abc', headers=dict(Authorization=self.token))
+        self.assertEqual(response.status_code, 400)
+
+    def test_top_k_params(self):
+        self.assertEqual(top_k_params({}, app.config), (
+            app.config['RECOMMEND_TOPK_DEFAULT'], app.config['RECOMMEND_TOPK_DIVERSITY']))
+        self.assertEqual(top_k_params(dict(k='3', diversity='0.5'), app.config), (3, 0.5))
+        for args in (dict(k='abc'), dict(k='0'), dict(diversity='nan')):
+            with self.assertRaises(ValueError):
+                top_k_params(args, app.config)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+import unittest
+import json
+import random
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from main import db
+from main.config import Config
+from main.cache import TTLCache
+from main.catalog.catalog import FoodCatalog
+from main.recommend.recommender import (
+    GAParams, food_cuisines, ga_menu, ga_recommendation, macro_targets, macro_vectors,
+    random_recommendation, cached_recommend, recommendation_key)
+from main.recommend.batch import group_by_profile, recommend_for_settings
+from main.model.model import User
+from main.alg.geneticAlgo.fitness import populationFitness
+from main.alg.geneticAlgo.genetic_algorithm import createInitialPopu
+from tests.helpers import DatabaseTestCase
+
+UserSettings = namedtuple(
+    'UserSettings', ['id', 'preference', 'protein_intake', 'carb_intake', 'fat_intake'])
+
+
+class TestRecommender(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog = FoodCatalog(
+            Config.CATALOG_DIR, Config.CATALOG_FILES, Config.CATALOG_DEFAULT)
+        self.settns = UserSettings('user', 'vegetarian', 19.0, 5.0, 2.0)
+        self.menu = self.catalog.get(self.settns.preference)
+        self.params = GAParams(3, 20, 2, 0.2, None, 30)
+
+    def test_ga_menu_cuisines(self):
+        menu_arrays, cuisine_score = ga_menu(self.catalog, self.menu, self.settns)
+        self.assertEqual(len(menu_arrays), len(self.menu))
+        vegan = set(self.catalog.get('vegan').names)
+        for name, idx in zip(self.menu.names, menu_arrays.cuisineIdx):
+            cuisine = menu_arrays.cuisines[idx]
+            self.assertEqual(cuisine, 'vegan' if name in vegan else 'vegetarian')
+        self.assertEqual(max(cuisine_score, key=cuisine_score.get), 'vegetarian')
+
+    def test_ga_fitness_varies_within_one_cuisine(self):
+        settns = self.settns._replace(preference='vegan')
+        menu = self.catalog.get('vegan')
+        menu_arrays, cuisine_score = ga_menu(self.catalog, menu, settns)
+        self.assertEqual(len(set(menu_arrays.cuisineIdx.tolist())), 1)
+        population = createInitialPopu(3, 200, menu_arrays, rng=0)
+        fitness = populationFitness(population, cuisine_score, 3, menu_arrays)
+        self.assertGreater(len(set(fitness.round(9).tolist())), 100)
+
+    def test_ga_closer_than_random(self):
+        params = self.params._replace(generations=20, budget_ms=None)
+        ga, rand, best = [], [], []
+        for preference in ('vegan', 'vegetarian', 'mixed_food'):
+            for targets in ((19.0, 5.0, 2.0), (5.0, 30.0, 3.0), (10.0, 10.0, 10.0)):
+                settns = UserSettings('user', preference, *targets)
+                menu = self.catalog.get(preference)
+                distance = np.linalg.norm(macro_vectors(menu) - macro_targets(settns), axis=1)
+                for seed in range(2):
+                    ga.append(distance[ga_recommendation(self.catalog, menu, settns, params, seed)[0]])
+                    rand.append(distance[random_recommendation(menu, settns, random.Random(seed))])
+                    best.append(distance.min())
+        self.assertLess(np.mean(ga), np.mean(rand))
+        # close to the nearest food, not just better than chance
+        self.assertLess(np.mean(ga), 1.2*np.mean(best))
+
+    def test_cuisines_precomputed_per_snapshot(self):
+        cuisines, cuisine_idx = food_cuisines(self.catalog, self.menu)
+        self.assertIs(cuisine_idx, self.catalog.snapshot.cuisine_index['vegetarian'])
+        # a menu handed out before a reload is still mapped
+        old_menu = self.catalog.get('vegetarian')
+        self.catalog.load()
+        self.assertIsNot(self.catalog.get('vegetarian'), old_menu)
+        self.assertEqual(food_cuisines(self.catalog, old_menu)[1].tolist(), cuisine_idx.tolist())
+
+    def test_ga_respects_budget(self):
+        start = time.perf_counter()
+        rec, answer = ga_recommendation(self.catalog, self.menu, self.settns, self.params)
+        self.assertLess(time.perf_counter() - start, 0.2)
+        self.assertEqual(answer.stopReason, 'time')
+        self.assertTrue(0 <= rec < len(self.menu))
+
+    def test_ga_seed_replays(self):
+        params = self.params._replace(generations=5, budget_ms=None)
+        recs = [
+            ga_recommendation(self.catalog, self.menu, self.settns, params, seed=4)[0]
+            for _ in range(2)
+        ]
+        self.assertEqual(recs[0], recs[1])
+
+    def test_random_within_menu(self):
+        settns = self.settns._replace(protein_intake=500.0)
+        self.assertEqual(random_recommendation(self.menu, settns), len(self.menu) - 1)
+
+    def test_cached_recommend(self):
+        cache = TTLCache(16, 60)
+        params = self.params._replace(generations=3, budget_ms=None)
+        first = cached_recommend(cache, self.catalog, self.settns, 'ga', params, 1)
+        # same profile, and a single seed bucket shared by everyone
+        other = self.settns._replace(id='someone-else')
+        self.assertIs(cached_recommend(cache, self.catalog, other, 'ga', params, 1), first)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        # random recommendations are never cached
+        cached_recommend(cache, self.catalog, self.settns, 'random', params, 1)
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (1, 1, 1))
+
+    def test_seed_rotates_with_ttl_window(self):
+        params = self.params._replace(generations=3, budget_ms=None)
+        key, seed = recommendation_key(self.catalog, self.settns, 'ga', params, 8, 60, now=30)
+        same = recommendation_key(self.catalog, self.settns, 'ga', params, 8, 60, now=59)
+        later = recommendation_key(self.catalog, self.settns, 'ga', params, 8, 60, now=61)
+        self.assertEqual(same, (key, seed))
+        self.assertNotEqual(later[1], seed)
+        self.assertNotEqual(later[0], key)
+
+    def test_closest_key_ignores_seed(self):
+        params = self.params
+        key, seed = recommendation_key(self.catalog, self.settns, 'closest', params, 8, 60, now=30)
+        other = self.settns._replace(id='someone else')
+        self.assertIsNone(seed)
+        self.assertEqual(recommendation_key(self.catalog, other, 'closest', params, 8, 60, now=90),
+                         (key, None))
+
+
+class TestBatchRecommendation(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog = FoodCatalog(
+            Config.CATALOG_DIR, Config.CATALOG_FILES, Config.CATALOG_DEFAULT)
+        self.settings = [
+            UserSettings('a', 'vegan', 19.0, 5.0, 2.0),
+            UserSettings('b', 'mixed_food', 19.0, 5.0, 2.0),
+            UserSettings('c', 'vegan', 19.0, 5.0, 2.0),
+        ]
+        self.params = GAParams(3, 20, 2, 0.2, 5, None)
+
+    def test_groups_by_profile(self):
+        groups = group_by_profile(self.settings)
+        self.assertEqual([[s.id for s in members] for members in groups.values()],
+                         [['a', 'c'], ['b']])
+
+    def test_ga_batch(self):
+        recommendations = recommend_for_settings(
+            self.catalog, self.settings, 'ga', self.params, seed=1)
+        self.assertEqual(set(recommendations), {'a', 'b', 'c'})
+        self.assertEqual(recommendations['a'], recommendations['c'])
+        self.assertIn(recommendations['a']['food'], self.catalog.get('vegan').names)
+
+
+class TestBatchRecommendAPI(DatabaseTestCase):
+
+    app_config = dict(RECOMMEND_BATCH_MAX_GA=2)
+
+    def setUp(self):
+        super().setUp()
+        admin = User('Admin', 'admin@gmail.com', 30, '123456', 1, admin=True)
+        db.session.add(admin)
+        db.session.commit()
+        self.token = admin.encode_auth_token(admin.id).decode()
+
+    def batch(self, users, mode):
+        return self.client.post(
+            '/recommend/batch', data=json.dumps(dict(users=users, mode=mode)),
+            content_type='application/json', headers=dict(Authorization=self.token))
+
+    def test_ga_batch_limit(self):
+        users = ['a', 'b', 'c']
+        response = self.batch(users, 'ga')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('At most 2 users per ga batch', response.json['message'])
+        self.assertEqual(self.batch(users, 'random').status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
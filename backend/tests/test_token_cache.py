@@ -0,0 +1,35 @@
+import unittest
+from unittest import mock
+
+from main import db
+from main.model.model import User, BadToken, BAD_TOKEN
+from tests.helpers import DatabaseTestCase
+
+
+class TestTokenCache(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User('Malea', 'malea@gmail.com', 30, '123456', 1)
+        db.session.add(self.user)
+        db.session.commit()
+        self.token = self.user.encode_auth_token(self.user.id).decode()
+
+    def test_verified_token_is_cached(self):
+        with mock.patch.object(BadToken, 'check_token', wraps=BadToken.check_token) as check:
+            for _ in range(3):
+                self.assertEqual(User.verify_auth_token(self.token), (self.user.id, None))
+            self.assertEqual(check.call_count, 1)
+
+    def test_blacklist_invalidates_cache(self):
+        User.verify_auth_token(self.token)
+        BadToken.blacklist(self.token)
+        self.assertEqual(User.verify_auth_token(self.token), (None, BAD_TOKEN))
+        # blacklisted tokens are answered without a query afterwards
+        with mock.patch.object(BadToken, 'query') as query:
+            self.assertEqual(User.decode_auth_token(self.token), BAD_TOKEN)
+            query.filter_by.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
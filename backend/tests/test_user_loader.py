@@ -0,0 +1,64 @@
+import json
+import unittest
+
+from sqlalchemy import event
+
+from main import db
+from main.model.model import User
+from tests.helpers import DatabaseTestCase
+
+
+class TestUserLoader(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.statements = []
+        event.listen(db.engine, 'before_cursor_execute', self.count)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self.count)
+        super().tearDown()
+
+    def count(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    def register(self):
+        return self.client.post(
+            '/auth/register',
+            data=json.dumps(dict(
+                fullname='Malea', email='malea@gmail.com', age=30,
+                password='123456', gender=1, preference='vegan'
+            )),
+            content_type='application/json'
+        )
+
+    def test_register_single_transaction(self):
+        response = self.register()
+        self.assertEqual(response.status_code, 201)
+        user = User.load(json.loads(response.data.decode())['profile']['id'])
+        self.assertEqual(user.settings.preference, 'vegan')
+        self.assertIs(user.settings.user, user)
+        inserts = [s for s in self.statements if s.startswith('INSERT')]
+        self.assertEqual(len(inserts), 2)
+
+    def test_load_single_query(self):
+        user_id = json.loads(self.register().data.decode())['profile']['id']
+        db.session.expunge_all()
+        del self.statements[:]
+        settns = User.load(user_id).settings
+        self.assertEqual(settns.protein_intake, 19.0)
+        self.assertEqual(len(self.statements), 1)
+
+    def test_settings_view(self):
+        token = json.loads(self.register().data.decode())['token']
+        db.session.expunge_all()
+        del self.statements[:]
+        response = self.client.get('/settings', headers=dict(Authorization=token))
+        self.assertEqual(json.loads(response.data.decode())['preference'], 'vegan')
+        selects = [s for s in self.statements if s.startswith('SELECT')]
+        # the bad_token blacklist filter is loaded once, the user in one query
+        self.assertEqual(len([s for s in selects if 'users' in s]), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()